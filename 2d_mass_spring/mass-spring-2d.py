@@ -5,18 +5,62 @@ website: http://www.vclab.ca
 license: BSD
 """
 
-import pygame, sys
-import matplotlib.pyplot as plt
-import numpy as np
+import pygame, sys, os, time
 
-# import sim_rk4 as Simulation
 import sim as Simulation
+import sim_rk4
 import util
+from session import Session, replay, identical
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common import fixedstep, options, scheduler as frame_clock
+from common.capture import FrameRecorder
+from common.profiling import profiler as prof
+from common.dirty import DirtyScreen
+
+
+def make_sim(title, integrator):
+    # scipy's dop853 (sim.py), or one of the fixed step methods of sim_rk4.py
+    if integrator == 'dop853':
+        return Simulation.Simulation(title)
+    return sim_rk4.Simulation(title, integrator)
+
+def replay_all(title, paths):
+    # re-runs recorded sessions as fast as they compute, no window
+    ok = True
+    for path in paths:
+        start = time.perf_counter()
+        session, diverged, end = replay(path, lambda integrator: make_sim(title, integrator))
+        elapsed = time.perf_counter() - start
+        same = identical(session, end)
+        ok = ok and same
+        if end is None:
+            verdict = 'the journal has no end state to compare with'
+        else:
+            verdict = 'bit-identical end state' if same else 'DIFFERENT end state'
+        print(f"{path}: {session.sim.cur_time:.1f} s simulated in {elapsed:.3f} s, {verdict}")
+        if diverged is not None:
+            print(f"  command {diverged} came at a different simulation time than recorded")
+        if session.monitor:
+            print(session.monitor.report())
+    return ok
+
+def extra(parser):
+    parser.add_argument('--integrator', choices=('dop853',) + fixedstep.METHODS, default='dop853',
+                        help='dop853 through scipy, or a fixed step method without the scipy call overhead')
+    parser.add_argument('--journal', metavar='PATH',
+                        help='write every command that changes the simulation to a journal for replaying it later')
+    parser.add_argument('--replay', metavar='PATH', nargs='+',
+                        help='replay recorded journals without a window, at full speed, and check the end states')
 
 
 def main():
     # sim title
     title = 'Mass-Spring System'
+    opts = options.parse(title, extra=extra)
+
+    if opts.replay:
+        sys.exit(0 if replay_all(title, opts.replay) else 1)
 
     # initializing pygame
     pygame.init()
@@ -44,12 +88,23 @@ def main():
     screen = pygame.display.set_mode((win_width, win_height))
     pygame.display.set_caption(title)
 
+    # in dirty rect mode only the regions that changed are redrawn
+    dirty_screen = None
+    if opts.dirty:
+        dirty_screen = DirtyScreen(screen, util.WHITE, my_group.sprites())
+
+    recorder = None
+    if opts.record:
+        recorder = FrameRecorder(opts.record, screen.get_size(), fps=30)
+
     # setting up simulation
-    sim = Simulation.Simulation(title)
-    # sim.init(state=np.array([200,200,0,0], dtype='float32'), mass=100., k=.01, l=200.) Try some other values
-    sim.init(state=np.array([200,200,0,0], dtype='float32'), mass=10., k=10, l=200.)
-    sim.set_time(0.0)
-    sim.set_dt(0.1)
+    sim = make_sim(title, opts.integrator)
+    session = Session(sim, adaptive=opts.adaptive, drift=opts.drift, on_drift=opts.on_drift,
+                      journal_path=opts.journal)
+    scheduler = session.scheduler
+
+    if opts.headless:
+        session.resume()
 
     print ('--------------------------------')
     print ('Usage:')
@@ -67,25 +122,33 @@ def main():
     y_axis.set_pos(util.to_screen(0, 0, win_width, win_height))
 
 
+    frame = 0
     while True:
         # 30 fps
-        clock.tick(30)
+        with prof.phase('clock.tick'):
+            frame_time = frame_clock.tick(clock, 30, opts.headless)
 
         # update sprite x, y position using values
-        # returned from the simulation
-        ball.set_pos(util.to_screen(sim.state[0], sim.state[1], win_width, win_height))
-
-        event = pygame.event.poll()
+        # returned from the simulation, interpolated between physics steps
+        with prof.phase('sprites'):
+            ball_x, ball_y = sim.state[0], sim.state[1]
+            if not sim.paused and scheduler.current is not None:
+                ball_x, ball_y = scheduler.interpolate()
+            ball.set_pos(util.to_screen(ball_x, ball_y, win_width, win_height))
+
+        with prof.phase('event.poll'):
+            event = pygame.event.poll()
         if event.type == pygame.QUIT:
+            session.close()
             pygame.quit()
             sys.exit(0)
 
         if event.type == pygame.KEYDOWN and event.key == pygame.K_p:
-            sim.pause()
+            session.pause()
             continue
         elif event.type == pygame.KEYDOWN and event.key == pygame.K_r:
             if not ball.picked:
-                sim.resume()
+                session.resume()
             continue
         elif event.type == pygame.KEYDOWN and event.key == pygame.K_q:
             break
@@ -96,33 +159,59 @@ def main():
         elif event.type == pygame.MOUSEMOTION:
             if ball.picked:
                 x, y = util.from_screen(event.pos[0], event.pos[1], win_width, win_height)
-                sim.set_state(np.array([x, y, 0, 0], dtype='float32'))
+                session.drag(x, y)
         elif event.type == pygame.MOUSEBUTTONUP and event.button == 1:
             if ball.picked:
                 ball.picked = False
-                sim.set_state(np.array([x, y, 0, 0], dtype='float32'))
+                session.release(x, y)
         else:
             pass
 
         # clear the background, and draw the sprites
-        screen.fill(util.WHITE)
-        my_group.update()
-        my_group.draw(screen)
-        text.draw("Time = %f" % sim.cur_time, screen, (10,10))
-        text.draw("x = %f" % sim.state[0], screen, (10,40))
-        text.draw("y = %f" % sim.state[1], screen, (10,70))
-        if ball.picked:
-            text.draw("Picked. (Simulation disabled)", screen, (10,100))
-        pygame.display.flip()
+        with prof.phase('sprites'):
+            my_group.update()
+        with prof.phase('draw'):
+            if opts.dirty:
+                dirty_screen.begin()
+            else:
+                screen.fill(util.WHITE)
+                my_group.draw(screen)
+        with prof.phase('text'):
+            hud = [text.draw_readout("Time = ", sim.cur_time, screen, (10,10)),
+                   text.draw_readout("x = ", sim.state[0], screen, (10,40)),
+                   text.draw_readout("y = ", sim.state[1], screen, (10,70))]
+            if ball.picked:
+                hud.append(text.draw("Picked. (Simulation disabled)", screen, (10,100)))
+        with prof.phase('display'):
+            if opts.dirty:
+                for r in hud:
+                    dirty_screen.mark(r)
+                dirty_screen.end()
+            else:
+                pygame.display.flip()
+        if recorder:
+            with prof.phase('capture'):
+                recorder.capture(screen)
+        frame += 1
+        if opts.frames and frame >= opts.frames:
+            break
 
         # update simulation
-        if not sim.paused:
-            sim.step()
-        elif not ball.picked and event.type == pygame.KEYDOWN and event.key == pygame.K_SPACE:
-                sim.step()
-        else:
-            pass
+        with prof.phase('integration'):
+            if not sim.paused:
+                session.advance(frame_time)
+            elif not ball.picked and event.type == pygame.KEYDOWN and event.key == pygame.K_SPACE:
+                    session.single_step()
+            else:
+                pass
+        if sim.paused:
+            session.settle()
     
+    if recorder:
+        recorder.close()
+    session.close()
+    if session.monitor:
+        print(session.monitor.report())
     pygame.quit()
     sys.exit(0)
 
@@ -0,0 +1,145 @@
+"""
+The mass-spring simulation of mass-spring-2d.py together with its fixed
+timestep scheduler and drift monitor, driven by commands: pause, resume,
+drag, release, step and advance by a frame.  The front end turns mouse and
+keyboard input into these commands.  With a journal every command is
+written down with the simulation time, and replay() applies a recorded
+session again, without a window or a clock, as fast as it computes.
+"""
+
+import os
+import sys
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common import invariants, journal
+from common.scheduler import FixedTimestep
+
+# initial conditions of mass-spring-2d.py
+# (try some other values, e.g. mass=100., k=.01)
+SETUP = {'state': [200, 200, 0, 0], 'mass': 10., 'k': 10, 'l': 200., 'dt': 0.1, 'fps': 30}
+
+class Session:
+
+    def __init__(self, sim, setup=SETUP, adaptive=False, drift=None, on_drift='warn', journal_path=None):
+        self.sim = sim
+        self.setup = dict(setup)
+        sim.init(state=np.array(setup['state'], dtype='float32'), mass=setup['mass'], k=setup['k'], l=setup['l'])
+        sim.set_time(0.0)
+        sim.set_dt(setup['dt'])
+
+        # drift of the conserved quantities, checked after every physics step
+        self.on_drift = on_drift
+        self.monitor = None
+        if drift is not None:
+            self.monitor = invariants.DriftMonitor(self.invariants, ('energy', 'angular momentum'),
+                                                   drift or None, on_drift)
+            self.monitor.reset()
+
+        # physics runs in fixed steps of sim.dt, at the same pace as the old
+        # one step per frame at 30 fps, but no longer tied to the frame rate
+        self.scheduler = FixedTimestep(sim.dt, speed=setup['fps']*sim.dt, adaptive=adaptive)
+
+        self.journal = None
+        if journal_path:
+            self.journal = journal.Journal(journal_path, model='mass-spring-2d', engine=type(sim).__module__,
+                                           integrator=getattr(sim, 'method', 'dop853'),
+                                           setup=self.setup, adaptive=adaptive, drift=drift, on_drift=on_drift)
+
+    def invariants(self):
+        # energy, and angular momentum about the anchor (the spring force is central)
+        sim = self.sim
+        pos, vel = sim.state[0:2], sim.state[2:4]
+        e, e_scale = invariants.springs(pos, vel, [sim.mass], [sim.k], [sim.l])
+        l, l_scale = invariants.angular_momentum(pos, vel, [sim.mass])
+        return np.concatenate([e, l]), np.concatenate([e_scale, l_scale])
+
+    def record(self, kind, *args):
+        if self.journal is not None:
+            self.journal.record(kind, self.sim.cur_time, *args)
+
+    # ---- commands, each one is journaled before it is applied ----
+
+    def pause(self):
+        self.record('pause')
+        self.sim.pause()
+
+    def resume(self):
+        self.record('resume')
+        self.sim.resume()
+
+    def drag(self, x, y):
+        # the mass is held at x, y
+        self.record('drag', x, y)
+        self.sim.set_state(np.array([x, y, 0, 0], dtype='float32'))
+
+    def release(self, x, y):
+        self.record('release', x, y)
+        self.sim.set_state(np.array([x, y, 0, 0], dtype='float32'))
+        if self.monitor:
+            self.monitor.reset()
+
+    def single_step(self):
+        # one step of sim.dt while paused
+        self.record('step')
+        self.sim.step()
+
+    def advance(self, frame_time):
+        # the physics steps for a frame of frame_time seconds
+        self.record('advance', frame_time)
+        self.scheduler.advance(frame_time, self.step, lambda: self.sim.state[0:2])
+
+    def settle(self):
+        # While paused the scheduler forgets its accumulated time.  Only the
+        # accumulator matters for the physics, so only a reset that clears
+        # it is journaled.
+        if self.scheduler.accumulator:
+            self.record('settle')
+        self.scheduler.reset(self.sim.state[0:2])
+
+    COMMANDS = {'pause': pause, 'resume': resume, 'drag': drag, 'release': release,
+                'step': single_step, 'advance': advance, 'settle': settle}
+
+    # ----
+
+    def step(self, dt):
+        # the scheduler asks for larger steps when catching up
+        sim = self.sim
+        base_dt = sim.dt
+        sim.set_dt(dt)
+        sim.step()
+        sim.set_dt(base_dt)
+        if self.monitor and not self.monitor.check() and self.on_drift == 'downshift':
+            sim.set_dt(self.monitor.downshift(sim.dt))
+            self.scheduler.set_dt(sim.dt)
+
+    def end(self):
+        return {'time': float(self.sim.cur_time), 'state': journal.floats(self.sim.state)}
+
+    def close(self):
+        if self.journal is not None:
+            self.journal.close(**self.end())
+
+def replay(path, make_sim):
+    """
+    Applies the session recorded in path to a new Simulation, made by
+    make_sim(integrator) for the integrator of the recording.  Returns
+    the session, the index of the first command given at a different
+    simulation time than when it was recorded (None if there is none) and
+    the end record of the journal.
+    """
+    header, commands, end = journal.load(path)
+    if header.get('model') != 'mass-spring-2d':
+        raise ValueError(f"{path} is not a journal of the mass-spring simulation")
+    sim = make_sim(header.get('integrator', 'dop853'))
+    session = Session(sim, header['setup'], header['adaptive'], header['drift'], header['on_drift'])
+    diverged = None
+    for i, (kind, t, *args) in enumerate(commands):
+        if diverged is None and sim.cur_time != t:
+            diverged = i
+        Session.COMMANDS[kind](session, *args)
+    return session, diverged, end
+
+def identical(session, end):
+    # bit for bit the same final time and state as the recording
+    return end is not None and session.end() == end
@@ -5,6 +5,7 @@ website: http://www.vclab.ca
 license: BSD
 """
 
+import math
 import numpy as np
 from scipy.integrate import ode
 
@@ -21,18 +22,25 @@ class Simulation:
         self.ode_solver = None  # this will be our ode solver instance
 
     def f(self, t, st):
-        
-        x, y, vx, vy = st
-        r = np.sqrt(x**2 + y**2)
-        
+        return self.f_into(t, st, np.empty(4))
+
+    def f_into(self, t, st, out):
+        # Same as f, but writes the derivatives into out so that
+        # fixed step integrators can reuse their buffers.
+        x = st[0]
+        y = st[1]
+        r = math.sqrt(x*x + y*y)
+
         # The derivatives of position are just the velocities.
-        dxdt = vx
-        dydt = vy
+        out[0] = st[2]
+        out[1] = st[3]
         # Force: F = -k*(r - l) * (x/r, y/r), so acceleration = F/m.
-        ax = -self.k * (r - self.l) * (x / r) / self.mass
-        ay = -self.k * (r - self.l) * (y / r) / self.mass
+        # At the anchor the spring has no direction, and no force.
+        s = -self.k * (r - self.l) / (r * self.mass) if r > 0 else 0.
+        out[2] = s * x
+        out[3] = s * y
 
-        return [dxdt, dydt, ax, ay]
+        return out
 
     def init(self, state, mass, k, l):
         self.state = np.array(state, dtype=np.float32)
@@ -6,6 +6,7 @@ license: BSD
 """
 
 import pygame
+from collections import OrderedDict
 
 # set up the colors
 BLACK = (0, 0, 0, 255)
@@ -18,9 +19,9 @@ def load_image(name):
     image = pygame.image.load(name)
     return image
 
-class MyCircle(pygame.sprite.Sprite):
+class MyCircle(pygame.sprite.DirtySprite):
     def __init__(self, color, width, height, alpha=255):
-        pygame.sprite.Sprite.__init__(self)
+        pygame.sprite.DirtySprite.__init__(self)
 
         self.image = pygame.Surface([width, height], flags=pygame.SRCALPHA)
         self.rect = self.image.get_rect()
@@ -32,15 +33,18 @@ class MyCircle(pygame.sprite.Sprite):
         self.picked = False
 
     def set_pos(self, pos):
+        old = self.rect.topleft
         self.rect.x = pos[0] - self.rect.width//2
         self.rect.y = pos[1] - self.rect.height//2
+        if self.rect.topleft != old:
+            self.dirty = 1
 
     def update(self):
         pass
 
-class MyRect(pygame.sprite.Sprite):
+class MyRect(pygame.sprite.DirtySprite):
     def __init__(self, color, width, height, alpha=255):
-        pygame.sprite.Sprite.__init__(self)
+        pygame.sprite.DirtySprite.__init__(self)
 
         self.image = pygame.Surface([width, height], flags=pygame.SRCALPHA)
         self.rect = self.image.get_rect()
@@ -49,8 +53,11 @@ class MyRect(pygame.sprite.Sprite):
         self.picked = False
 
     def set_pos(self, pos):
+        old = self.rect.topleft
         self.rect.x = pos[0] - self.rect.width//2
         self.rect.y = pos[1] - self.rect.height//2
+        if self.rect.topleft != old:
+            self.dirty = 1
 
     def update(self):
         pass
@@ -61,14 +68,75 @@ def to_screen(x, y, win_width, win_height):
 def from_screen(x, y, win_width, win_height):
     return x - win_width//2, win_height//2 - y
 
-class MyText():
-    def __init__(self, color, background=WHITE, antialias=True, fontname="comicsansms", fontsize=16):
+# SysFont lookups are slow, so fonts are shared by every MyText
+fonts = {}
+
+def get_font(fontname, fontsize):
+    font = fonts.get((fontname, fontsize))
+    if font is None:
         pygame.font.init()
-        self.font = pygame.font.SysFont(fontname, fontsize)
+        font = pygame.font.SysFont(fontname, fontsize)
+        fonts[(fontname, fontsize)] = font
+    return font
+
+class GlyphAtlas():
+    # Characters rendered one at a time and reused, for readouts whose
+    # string changes every frame (so caching whole strings does not help).
+    def __init__(self, font, color, background, antialias):
+        self.font = font
         self.color = color
         self.background = background
         self.antialias = antialias
-    
+        self.glyphs = {}
+
+    def glyph(self, ch):
+        g = self.glyphs.get(ch)
+        if g is None:
+            g = self.font.render(ch, self.antialias, self.color, self.background)
+            self.glyphs[ch] = g
+        return g
+
+    def draw(self, str1, screen, pos):
+        x, y = pos
+        height = 0
+        blits = []
+        for ch in str1:
+            g = self.glyphs.get(ch) or self.glyph(ch)
+            blits.append((g, (x, y)))
+            x += g.get_width()
+            height = max(height, g.get_height())
+        screen.blits(blits, doreturn=False)
+        return pygame.Rect(pos[0], y, x - pos[0], height)
+
+class MyText():
+    def __init__(self, color, background=WHITE, antialias=True, fontname="comicsansms", fontsize=16, cache_size=128):
+        self.font = get_font(fontname, fontsize)
+        self.color = color
+        self.background = background
+        self.antialias = antialias
+        # rendered surfaces, least recently used first
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+        self.atlas = None
+
+    def render(self, str1):
+        key = (str1, self.color, self.background)
+        text = self.cache.get(key)
+        if text is None:
+            text = self.font.render(str1, self.antialias, self.color, self.background)
+            self.cache[key] = text
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        else:
+            self.cache.move_to_end(key)
+        return text
+
     def draw(self, str1, screen, pos):
-        text = self.font.render(str1, self.antialias, self.color, self.background)
-        screen.blit(text, pos)
\ No newline at end of file
+        return screen.blit(self.render(str1), pos)
+
+    def draw_readout(self, label, value, screen, pos, fmt="%f"):
+        # the label comes from the surface cache, the number from the glyph atlas
+        if self.atlas is None or self.atlas.color != self.color or self.atlas.background != self.background:
+            self.atlas = GlyphAtlas(self.font, self.color, self.background, self.antialias)
+        rect = self.draw(label, screen, pos)
+        return rect.union(self.atlas.draw(fmt % value, screen, (rect.right, pos[1])))
@@ -6,11 +6,15 @@ license: BSD
 """
 
 
+import argparse
+import os
+import sys
 import numpy as np
-from matplotlib import pyplot as plt
-from matplotlib import animation
 from scipy.integrate import ode
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common import events
+
 
 def rot(angle, v):
     # rotates vector v by some angle 
@@ -21,31 +25,10 @@ def rot(angle, v):
 floor_angle = np.deg2rad(10)
 floor_normal = rot(floor_angle, np.array([0,1]))
 floor_tangent = rot(floor_angle, -np.array([1,0]))
-print ('floor_angle', np.rad2deg(floor_angle))
-print ('floor_normal', floor_normal)
-
-# Setup figure
-fig = plt.figure(1)
-ax = plt.axes(xlim=(0, 300), ylim=(-75, 110))
-plt.grid()
-line, = ax.plot([], [], '-')
-time_template = 'time = %.1fs'
-time_text = ax.text(0.05, 0.9, '', transform=ax.transAxes)
-frame_template = 'frame = %d'
-frame_text = ax.text(0.05, 0.85, '', transform=ax.transAxes)
-vx_template = 'Vx = %.1fm/s'
-vx_text = ax.text(0.05, 0.80, '', transform=ax.transAxes)
-vy_template = 'Vy = %.1fm/s'
-vy_text = ax.text(0.05, 0.75, '', transform=ax.transAxes)
-plt.title('xy location')
-plt.xlabel('x')
-plt.ylabel('y')
-
 x0 = -300
 y0 = x0 * np.sin(floor_angle)
 x1 = 300
 y1 = x1 * np.sin(floor_angle)
-plt.plot([x0, x1], [y0, y1], 'g-')
 
 # y0 + (x - x0) * (y1 - y0) / (x1 - x0) = y  
 
@@ -67,27 +50,6 @@ def collision_detection(x, y):
     else:
         return False, y_collision
 
-# Background for each function
-def init():
-    line.set_data([], [])
-    time_text.set_text('')
-    frame_text.set_text('')
-    vx_text.set_text('')
-    vy_text.set_text('')
-    return line, time_text, frame_text,
-
-# Called at each frame
-def animate(i, ball):
-    line.set_xdata(np.append(line.get_xdata(), ball.x))
-    line.set_ydata(np.append(line.get_ydata(), ball.y))
-    time_text.set_text(time_template % ball.t)
-    frame_text.set_text(frame_template % i)
-    vx_text.set_text(vx_template % ball.vx)
-    vy_text.set_text(vy_template % ball.vy)
-    
-    ball.update()
-    return line, time_text, frame_text, vx_text, vy_text
-
 # Ball simulation - bouncing ball
 class Ball:
     def __init__(self):
@@ -157,17 +119,96 @@ class Ball:
         self.vy = self.r.y[3]
 #        print('DBG', self.x, self.y, self.vx, self.vy, self.t)
 
+# Same ball, but the flights between bounces are computed in closed form
+# and the bounces happen exactly when the ball reaches the floor
+class EventBall:
+    def __init__(self):
+        self.y = 100
+        self.x = 290
+        self.vx = 0
+        self.vy = 0
+        self.g = -9.8
+        self.dt = 0.01
+        self.t = 0
+        self.mass = 1
+        self.friction = 0.001
 
-ball = Ball()
-
-# blit=True - only re-draw the parts that have changed.
-# repeat=False - stops when frame count reaches 999
-# fargs=(ball,) - a tuple that can be used to pass extra arguments to animate function
-anim = animation.FuncAnimation(fig, animate, fargs=(ball,), init_func=init, frames=8000, interval=10, blit=True, repeat=False)
-#plt.savefig('bouncing-ball-trace', format='png')
-
-# Save the animation as an mp4.  For more information, see
-# http://matplotlib.sourceforge.net/api/animation_api.html
-# anim.save('basic_animation.mp4', fps=30, extra_args=['-vcodec', 'libx264'])
+        # the floor line drawn above, the one collision_detection() uses
+        floor = events.Plane((x0, y0), (-(y1 - y0), x1 - x0))
+        self.scheduler = events.EventScheduler([floor])
+        self.body = self.scheduler.add(events.Ballistic([self.x, self.y], [self.vx, self.vy], self.t,
+                                                        k=self.friction/self.mass, g=-self.g))
 
-plt.show()#
\ No newline at end of file
+    def update(self):
+        self.t += self.dt
+        self.scheduler.advance(self.t, lambda t, body, surface: print('Collision detected.'))
+        self.x, self.y, self.vx, self.vy = self.body.state(self.t)
+
+def main():
+    print ('floor_angle', np.rad2deg(floor_angle))
+    print ('floor_normal', floor_normal)
+
+    from matplotlib import pyplot as plt
+    from matplotlib import animation
+
+    # Setup figure
+    fig = plt.figure(1)
+    ax = plt.axes(xlim=(0, 300), ylim=(-75, 110))
+    plt.grid()
+    line, = ax.plot([], [], '-')
+    time_template = 'time = %.1fs'
+    time_text = ax.text(0.05, 0.9, '', transform=ax.transAxes)
+    frame_template = 'frame = %d'
+    frame_text = ax.text(0.05, 0.85, '', transform=ax.transAxes)
+    vx_template = 'Vx = %.1fm/s'
+    vx_text = ax.text(0.05, 0.80, '', transform=ax.transAxes)
+    vy_template = 'Vy = %.1fm/s'
+    vy_text = ax.text(0.05, 0.75, '', transform=ax.transAxes)
+    plt.title('xy location')
+    plt.xlabel('x')
+    plt.ylabel('y')
+
+    plt.plot([x0, x1], [y0, y1], 'g-')
+
+    # Background for each function
+    def init():
+        line.set_data([], [])
+        time_text.set_text('')
+        frame_text.set_text('')
+        vx_text.set_text('')
+        vy_text.set_text('')
+        return line, time_text, frame_text,
+
+    # Called at each frame
+    def animate(i, ball):
+        line.set_xdata(np.append(line.get_xdata(), ball.x))
+        line.set_ydata(np.append(line.get_ydata(), ball.y))
+        time_text.set_text(time_template % ball.t)
+        frame_text.set_text(frame_template % i)
+        vx_text.set_text(vx_template % ball.vx)
+        vy_text.set_text(vy_template % ball.vy)
+
+        ball.update()
+        return line, time_text, frame_text, vx_text, vy_text
+
+    parser = argparse.ArgumentParser(description='Ball bouncing on a slanted floor')
+    parser.add_argument('--events', action='store_true',
+                        help='jump from bounce to bounce analytically instead of integrating every frame')
+    opts, _ = parser.parse_known_args()
+
+    ball = EventBall() if opts.events else Ball()
+
+    # blit=True - only re-draw the parts that have changed.
+    # repeat=False - stops when frame count reaches 999
+    # fargs=(ball,) - a tuple that can be used to pass extra arguments to animate function
+    anim = animation.FuncAnimation(fig, animate, fargs=(ball,), init_func=init, frames=8000, interval=10, blit=True, repeat=False)
+    #plt.savefig('bouncing-ball-trace', format='png')
+
+    # Save the animation as an mp4.  For more information, see
+    # http://matplotlib.sourceforge.net/api/animation_api.html
+    # anim.save('basic_animation.mp4', fps=30, extra_args=['-vcodec', 'libx264'])
+
+    plt.show()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,281 @@
+"""
+Terrain made of line segments, for balls to bounce off.
+
+collision_detection() in ball_slanted_fall.py knows a single slanted line.
+Terrain takes any number of segments (a polyline of thousands of points,
+say) and builds a bounding volume hierarchy over them once: a binary tree
+of axis aligned boxes, split at the median of the longest side, with a few
+segments in every leaf.  Queries come in batches, one row per ball, and walk
+the tree for all of them together, level by level, visiting only the boxes
+that can still hold a closer (or earlier) segment, about log(segments)
+boxes per ball.
+
+    terrain = Terrain.polyline(points)                 # (m, 2) points
+    hit = terrain.closest(xy)                          # nearest segment of each ball
+    hit = terrain.sweep(xy, xy + v*dt, radius)         # first contact over a step
+
+Both return a Contact with, for each ball, the segment, the contact point on
+it and the local normal (pointing to the ball) and tangent, the floor_normal
+and floor_tangent the reflection in Ball.update() uses; reflect() is that
+response for a batch.
+"""
+
+import numpy as np
+
+class Contact:
+    # per ball: segment index (-1 for none), distance or time of contact,
+    # contact point, normal and tangent
+    def __init__(self, segment, value, point, normal, tangent):
+        self.segment = segment
+        self.hit = segment >= 0
+        self.value = value
+        self.point = point
+        self.normal = normal
+        self.tangent = tangent
+
+def tangent_of(normal):
+    # the normal turned by 90 degrees, as floor_tangent is to floor_normal
+    return np.stack([-normal[:, 1], normal[:, 0]], axis=1)
+
+def reflect(v, normal, tangent, restitution=1.0):
+    # the bounce of Ball.update(), v (n, 2): normal part reversed
+    vn = -restitution * (v * normal).sum(axis=1, keepdims=True) * normal
+    vt = (v * tangent).sum(axis=1, keepdims=True) * tangent
+    return vn + vt
+
+class Terrain:
+
+    def __init__(self, segments, leaf_size=4):
+        segments = np.asarray(segments, dtype=float).reshape(-1, 2, 2)
+        if len(segments) == 0:
+            raise ValueError('terrain needs at least one segment')
+        self.leaf_size = leaf_size
+        self.build(segments)
+
+    @classmethod
+    def polyline(cls, points, closed=False, leaf_size=4):
+        points = np.asarray(points, dtype=float)
+        if closed:
+            points = np.vstack([points, points[:1]])
+        return cls(np.stack([points[:-1], points[1:]], axis=1), leaf_size)
+
+    # ---------------------------------------------------------------
+
+    def build(self, segments):
+        lo = segments.min(axis=1)
+        hi = segments.max(axis=1)
+        centre = (lo + hi) / 2
+
+        box_lo, box_hi, children, leaves = [], [], [], []
+
+        def node(index):
+            i = len(box_lo)
+            box_lo.append(lo[index].min(axis=0))
+            box_hi.append(hi[index].max(axis=0))
+            children.append([-1, -1])
+            leaves.append(-1)
+            if len(index) <= self.leaf_size:
+                leaves[i] = len(self.order_chunks)
+                self.order_chunks.append(index)
+                return i
+            axis = int(np.argmax(box_hi[i] - box_lo[i]))
+            half = len(index) // 2
+            part = np.argpartition(centre[index, axis], half)
+            left = node(index[part[:half]])
+            right = node(index[part[half:]])
+            children[i] = [left, right]
+            return i
+
+        self.order_chunks = []
+        node(np.arange(len(segments)))
+
+        self.box_lo = np.array(box_lo)
+        self.box_hi = np.array(box_hi)
+        self.children = np.array(children, dtype=np.intp)
+        self.leaf = np.array(leaves, dtype=np.intp)
+        # segments of every leaf, padded with -1 to leaf_size
+        self.leaf_segments = np.full((len(self.order_chunks), self.leaf_size), -1, dtype=np.intp)
+        for k, index in enumerate(self.order_chunks):
+            self.leaf_segments[k, :len(index)] = index
+        del self.order_chunks
+
+        self.a = segments[:, 0].copy()
+        self.b = segments[:, 1].copy()
+        self.e = self.b - self.a
+        self.length2 = np.maximum((self.e**2).sum(axis=1), np.finfo(float).tiny)
+        self.depth = int(np.ceil(np.log2(max(1, len(segments) / self.leaf_size)))) + 1
+
+    def __len__(self):
+        return len(self.a)
+
+    # --------------------- geometry of the segments -----------------
+
+    def closest_points(self, p, s):
+        # closest point of segment s[i] to p[i], and the squared distance
+        u = ((p - self.a[s]) * self.e[s]).sum(axis=1) / self.length2[s]
+        c = self.a[s] + np.clip(u, 0, 1)[:, None] * self.e[s]
+        return c, ((p - c)**2).sum(axis=1)
+
+    def contact(self, segment, value, centre):
+        # contact point on the segment, normal towards the centre
+        n = len(segment)
+        point = np.full((n, 2), np.nan)
+        normal = np.full((n, 2), np.nan)
+        hit = segment >= 0
+        if hit.any():
+            s = segment[hit]
+            c, d2 = self.closest_points(centre[hit], s)
+            away = centre[hit] - c
+            d = np.sqrt(d2)
+            # a centre right on the segment takes the left normal of it
+            left = np.stack([-self.e[s, 1], self.e[s, 0]], axis=1) / np.sqrt(self.length2[s])[:, None]
+            nrm = np.where(d[:, None] > 0, away / np.where(d > 0, d, 1)[:, None], left)
+            point[hit] = c
+            normal[hit] = nrm
+        return Contact(segment, value, point, normal, tangent_of(normal))
+
+    def sweep_times(self, p0, d, r, s):
+        # First time in [0, 1] at which the circle p0 + t d of radius r
+        # touches segment s (inf if it does not): the sides of the segment
+        # moved out by r, then the circles of radius r at its ends.
+        a, e = self.a[s], self.e[s]
+        length = np.sqrt(self.length2[s])
+        n = np.stack([-e[:, 1], e[:, 0]], axis=1) / length[:, None]
+        t = np.full(len(s), np.inf)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            s0 = ((p0 - a) * n).sum(axis=1)
+            ds = (d * n).sum(axis=1)
+            side = np.where(s0 >= 0, 1.0, -1.0)
+            tf = (side*r - s0) / ds
+            tf = np.where(np.abs(s0) <= r, 0.0, tf)     # already touching the line
+            along = ((p0 + tf[:, None]*d - a) * e).sum(axis=1) / self.length2[s]
+            ok = (tf >= 0) & (tf <= 1) & (along >= 0) & (along <= 1)
+            t = np.where(ok, tf, t)
+
+            dd = (d * d).sum(axis=1)
+            for end in (a, self.b[s]):
+                m = p0 - end
+                b = (m * d).sum(axis=1)
+                c = (m * m).sum(axis=1) - r*r
+                disc = b*b - dd*c
+                tc = np.where(c <= 0, 0.0, (-b - np.sqrt(disc)) / dd)
+                ok = (disc >= 0) & (tc >= 0) & (tc <= 1) & ((c <= 0) | (b < 0))
+                t = np.minimum(t, np.where(ok, tc, np.inf))
+        return t
+
+    # --------------------- queries ----------------------------------
+
+    def walk(self, n, keep, leaf):
+        # Breadth first over (ball, node) pairs.  keep(q, nodes) says which
+        # pairs can still matter, leaf(q, segments) takes the segments of
+        # the leaves reached.
+        q = np.arange(n)
+        nodes = np.zeros(n, dtype=np.intp)
+        while len(q):
+            k = keep(q, nodes)
+            q, nodes = q[k], nodes[k]
+            at_leaf = self.leaf[nodes] >= 0
+            if at_leaf.any():
+                segs = self.leaf_segments[self.leaf[nodes[at_leaf]]]
+                ql = np.repeat(q[at_leaf], self.leaf_size)
+                segs = segs.ravel()
+                real = segs >= 0
+                leaf(ql[real], segs[real])
+            inner = ~at_leaf
+            q = np.repeat(q[inner], 2)
+            nodes = self.children[nodes[inner]].ravel()
+
+    def descend(self, p):
+        # one leaf per ball, following the nearer box at every level, for a
+        # first guess of the closest segment
+        nodes = np.zeros(len(p), dtype=np.intp)
+        for _ in range(self.depth + 1):
+            inner = self.leaf[nodes] < 0
+            if not inner.any():
+                break
+            ch = self.children[nodes[inner]]
+            d = np.stack([self.box_distance2(p[inner], ch[:, 0]), self.box_distance2(p[inner], ch[:, 1])], axis=1)
+            nodes[inner] = ch[np.arange(len(ch)), np.argmin(d, axis=1)]
+        return self.leaf_segments[self.leaf[nodes]]
+
+    def box_distance2(self, p, nodes):
+        gap = np.maximum(self.box_lo[nodes] - p, 0) + np.maximum(p - self.box_hi[nodes], 0)
+        return (gap**2).sum(axis=1)
+
+    def best(self, q, s, value, best_value, best_segment):
+        # per ball the smallest value among the candidates, where it is
+        # better than what the ball has
+        order = np.lexsort((value, q))
+        q, s, value = q[order], s[order], value[order]
+        first = np.ones(len(q), dtype=bool)
+        first[1:] = q[1:] != q[:-1]
+        q, s, value = q[first], s[first], value[first]
+        better = value < best_value[q]
+        best_value[q[better]] = value[better]
+        best_segment[q[better]] = s[better]
+
+    def closest(self, points, max_distance=np.inf):
+        """
+        The segment closest to each point, within max_distance (Contact.value
+        holds the distance; segment -1 where nothing is that close).
+        """
+        p = np.asarray(points, dtype=float).reshape(-1, 2)
+        n = len(p)
+        best_d2 = np.full(n, float(max_distance)**2)
+        best_s = np.full(n, -1, dtype=np.intp)
+
+        def leaf(q, s):
+            _, d2 = self.closest_points(p[q], s)
+            self.best(q, s, d2, best_d2, best_s)
+
+        # a good first guess makes the walk prune most of the tree
+        guess = self.descend(p)
+        q = np.repeat(np.arange(n), self.leaf_size)
+        guess = guess.ravel()
+        leaf(q[guess >= 0], guess[guess >= 0])
+
+        self.walk(n, lambda q, nodes: self.box_distance2(p[q], nodes) < best_d2[q], leaf)
+        return self.contact(best_s, np.sqrt(best_d2), p)
+
+    def sweep(self, start, end, radius):
+        """
+        First contact of circles of the given radius moving in a straight
+        line from start to end (one row per ball).  Contact.value is the
+        fraction of the way at which they touch, the contact point and
+        normal are taken there; segment -1 for circles that touch nothing.
+        """
+        p0 = np.asarray(start, dtype=float).reshape(-1, 2)
+        p1 = np.asarray(end, dtype=float).reshape(-1, 2)
+        n = len(p0)
+        r = np.broadcast_to(np.asarray(radius, dtype=float), (n,))
+        d = p1 - p0
+        best_t = np.full(n, np.inf)
+        best_s = np.full(n, -1, dtype=np.intp)
+
+        def keep(q, nodes):
+            # slab test of the path against the box grown by the radius,
+            # entered before the earliest contact found so far
+            lo = self.box_lo[nodes] - r[q, None]
+            hi = self.box_hi[nodes] + r[q, None]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                inv = 1.0 / d[q]
+                t1 = (lo - p0[q]) * inv
+                t2 = (hi - p0[q]) * inv
+            # a path parallel to an axis is inside that slab or never is
+            still = d[q] == 0
+            inside = (p0[q] >= lo) & (p0[q] <= hi)
+            tmin = np.where(still, np.where(inside, -np.inf, np.inf), np.minimum(t1, t2))
+            tmax = np.where(still, np.where(inside, np.inf, -np.inf), np.maximum(t1, t2))
+            enter = np.maximum(tmin.max(axis=1), 0.0)
+            leave = np.minimum(tmax.min(axis=1), 1.0)
+            return (enter <= leave) & (enter <= best_t[q])
+
+        def leaf(q, s):
+            t = self.sweep_times(p0[q], d[q], r[q], s)
+            self.best(q, s, t, best_t, best_s)
+
+        self.walk(n, keep, leaf)
+        t = np.where(best_s >= 0, best_t, np.nan)
+        centre = p0 + np.nan_to_num(t)[:, None] * d
+        return self.contact(best_s, t, centre)
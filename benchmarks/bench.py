@@ -0,0 +1,504 @@
+"""
+Throughput benchmarks for the simulation kernels.
+
+Every kernel is timed on its own and reported as calls per second, together
+with the bytes it allocates per call (tracemalloc).  Results can be saved as a
+JSON baseline and later runs compared against it:
+
+    python benchmarks/bench.py --save            # write benchmarks/baseline.json
+    python benchmarks/bench.py --compare         # flag regressions
+    python benchmarks/bench.py -k rhs --compare --tolerance 0.2
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+# no windows or plots while benchmarking
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('MPLBACKEND', 'Agg')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common import memcheck
+from common.loader import ROOT, load_module
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# name -> function that sets the kernel up and returns a callable to time
+kernels = {}
+
+def kernel(name):
+    def register(setup):
+        kernels[name] = setup
+        return setup
+    return register
+
+# --------------------- right hand sides --------------------------
+
+@kernel('rhs/mass_spring.f')
+def _():
+    sim = load_module('2d_mass_spring/sim.py').Simulation('bench')
+    sim.init(np.array([200, 200, 0, 0], dtype='float32'), mass=10., k=10, l=200.)
+    y = np.array([200., 150., 1., 2.])
+    return lambda: sim.f(0, y)
+
+@kernel('rhs/mass_spring.f_into')
+def _():
+    sim = load_module('2d_mass_spring/sim.py').Simulation('bench')
+    sim.init(np.array([200, 200, 0, 0], dtype='float32'), mass=10., k=10, l=200.)
+    y = np.array([200., 150., 1., 2.])
+    out = np.empty(4)
+    return lambda: sim.f_into(0, y, out)
+
+@kernel('rhs/projectile.f')
+def _():
+    sim = load_module('lab2/projectile_sim.py').Simulation()
+    y = np.array([10., 20., 30., 40.])
+    return lambda: sim.f(0, y, sim.gamma, sim.gravity)
+
+@kernel('rhs/double_spring.f')
+def _():
+    sim = load_module('lab4/double_spring.py').Simulation([10.0, 10.0, 20.0, -2.0, 0.0, 0.0, 0.0, 0.0])
+    y = np.array(sim.state, dtype=float)
+    return lambda: sim.f(0, y, sim.params)
+
+@kernel('rhs/double_spring.f_into')
+def _():
+    sim = load_module('lab4/double_spring.py').Simulation([10.0, 10.0, 20.0, -2.0, 0.0, 0.0, 0.0, 0.0])
+    y = np.array(sim.state, dtype=float)
+    out = np.empty(8)
+    return lambda: sim.f_into(0, y, out, sim.params)
+
+@kernel('rhs/orbits.dSdt')
+def _():
+    nbody = load_module('lab3/nbody.py')
+    body = nbody.Body('moon', nbody.Moon_Mass)
+    y = np.array([nbody.Distance, 0., 0., 1000.])
+    F = np.array([-1e20, 0.])
+    return lambda: body.dSdt(0, y, F)
+
+@kernel('rhs/rigid_body.f')
+def _():
+    rb = load_module('box_falling/rigid_body.py').RigidBody([0, -1, 0], [0, 0, 0.1])
+    return lambda: rb.f(0, rb.state, rb.force, rb.torque, rb.IbodyInv)
+
+@kernel('rhs/rigid_body.f_into')
+def _():
+    rb = load_module('box_falling/rigid_body.py').RigidBody([0, -1, 0], [0, 0, 0.1])
+    out = np.zeros(19)
+    return lambda: rb.f_into(0, rb.state, out, rb.force, rb.torque, rb.IbodyInv)
+
+# --------------------- simulation steps ---------------------------
+
+@kernel('step/falling_ball')
+def _():
+    sim = load_module('lab1/freefall.py').Simulation()
+    sim.setup(460, 0, 1)
+    def step():
+        sim.step()
+        # keep the history lists from growing without bound
+        if len(sim.times) > 10000:
+            sim.setup(460, 0, 1)
+    return step
+
+@kernel('step/mass_spring')
+def _():
+    sim = load_module('2d_mass_spring/sim.py').Simulation('bench')
+    sim.init(np.array([200, 200, 0, 0], dtype='float32'), mass=10., k=10, l=200.)
+    sim.set_dt(0.1)
+    return sim.step
+
+@kernel('step/mass_spring.rk4')
+def _():
+    sim = load_module('2d_mass_spring/sim_rk4.py').Simulation('bench')
+    sim.init(np.array([200, 200, 0, 0], dtype='float32'), mass=10., k=10, l=200.)
+    sim.set_dt(0.1)
+    return sim.step
+
+def mass_springs(n, policy):
+    # n independent systems per step
+    sim = load_module('2d_mass_spring/sim_rk4.py').Simulation('bench', policy=policy)
+    sim.init(np.zeros((n, 4)) + [200, 200, 0, 0], mass=10., k=np.linspace(1, 10, n), l=200.)
+    sim.set_dt(0.1)
+    return sim.step
+
+kernels['step/mass_spring.rk4.10000'] = lambda: mass_springs(10000, 'float64')
+kernels['step/mass_spring.rk4.10000.float32'] = lambda: mass_springs(10000, 'float32')
+
+def projectile(integrator):
+    sim = load_module('lab2/projectile_sim.py').Simulation(integrator)
+    sim.setup(50, 45)
+    def step():
+        sim.step()
+        if len(sim.trace_x) > 10000:
+            sim.setup(50, 45)
+    return step
+
+kernels['step/projectile'] = lambda: projectile('dop853')
+kernels['step/projectile.rk4'] = lambda: projectile('rk4')
+kernels['step/projectile.analytic'] = lambda: projectile('analytic')
+
+@kernel('projectile/range_table.10000')
+def _():
+    # exact landing ranges of 10000 (angle, speed, drag) launches per call
+    from common import projectile
+    rng = np.random.default_rng(0)
+    angle = rng.uniform(15, 90, 10000)
+    speed = rng.uniform(10, 100, 10000)
+    k = rng.uniform(0, 0.1, 10000)
+    return lambda: projectile.landing_range(speed, angle, k)
+
+@kernel('projectile/max_range.1000')
+def _():
+    # best launch angles of 1000 (speed, drag) pairs per call
+    launch = load_module('lab2/launch.py')
+    rng = np.random.default_rng(0)
+    speed = rng.uniform(10, 100, 1000)
+    k = rng.uniform(0, 0.1, 1000)
+    return lambda: launch.max_range(speed, k)
+
+def double_spring(integrator):
+    sim = load_module('lab4/double_spring.py').Simulation([10.0, 10.0, 20.0, -2.0, 0.0, 0.0, 0.0, 0.0], integrator)
+    return lambda: sim.update(0.02)
+
+kernels['step/double_spring'] = lambda: double_spring('dop853')
+kernels['step/double_spring.rk4'] = lambda: double_spring('rk4')
+kernels['step/double_spring.multirate'] = lambda: double_spring('multirate')
+
+def universe(integrator):
+    # integrator 'kepler' moves the bodies along the exact solution
+    nbody = load_module('lab3/nbody.py')
+    universe = nbody.Universe()
+    body_integrator = 'dop853' if integrator == 'kepler' else integrator
+    earth = nbody.Body('earth', nbody.Earth_Mass, integrator=body_integrator)
+    earth.setup(vel=[0, -np.sqrt(nbody.G*nbody.Moon_Mass/nbody.Distance)])
+    moon = nbody.Body('moon', nbody.Moon_Mass, integrator=body_integrator)
+    moon.setup([int(nbody.Distance), 0], [0, np.sqrt(nbody.G*nbody.Earth_Mass/nbody.Distance)])
+    universe.add_body(earth)
+    universe.add_body(moon)
+    if integrator == 'kepler':
+        universe.use_kepler()
+    def step():
+        universe.update()
+        if len(earth.distances) > 10000:
+            del earth.distances[:], earth.xpos[:], earth.ypos[:], earth.yvel[:]
+    return step
+
+kernels['step/universe'] = lambda: universe('dop853')
+kernels['step/universe.rk4'] = lambda: universe('rk4')
+kernels['step/universe.kepler'] = lambda: universe('kepler')
+
+def earth_moon_orbit(k):
+    # k copies of the earth-moon pair of orbits.py, as one TwoBody
+    nbody = load_module('lab3/nbody.py')
+    kepler = load_module('lab3/kepler.py')
+    vel1 = [0, -np.sqrt(nbody.G*nbody.Moon_Mass/nbody.Distance)]
+    vel2 = [0, np.sqrt(nbody.G*nbody.Earth_Mass/nbody.Distance)]
+    return kepler.TwoBody(np.full(k, nbody.Earth_Mass), np.full(k, nbody.Moon_Mass), np.zeros((k, 2)),
+                          np.tile(vel1, (k, 1)), np.tile([nbody.Distance, 0], (k, 1)), np.tile(vel2, (k, 1)), nbody.G)
+
+@kernel('kepler/states.100000')
+def _():
+    # the earth and the moon at 100000 times over ten years
+    orbit = earth_moon_orbit(1)
+    t = np.linspace(0, 10*365*86400., 100000)
+    return lambda: orbit.states(t)
+
+@kernel('kepler/pairs.10000')
+def _():
+    # 10000 independent pairs at one time
+    orbit = earth_moon_orbit(10000)
+    return lambda: orbit.states(86400.)
+
+def rigid_body(integrator):
+    rb = load_module('box_falling/rigid_body.py').RigidBody([0, -1, 0], [0, 0, 0.1], integrator)
+    initial = rb.state.copy()
+    rb.solver.set_initial_value(rb.state, 0)
+    t = [0.0]
+    def step():
+        t[0] += 0.1
+        rb.state = rb.integrate(t[0])
+        # the constant torque spins the body up without bound, start over
+        # before the angular momentum gets unreasonably large
+        if t[0] > 100:
+            t[0] = rb.t = 0.0
+            rb.state[:] = initial
+            rb.solver.set_initial_value(rb.state, 0)
+    return step
+
+kernels['step/rigid_body'] = lambda: rigid_body('dop853')
+kernels['step/rigid_body.rk4'] = lambda: rigid_body('rk4')
+
+def cluster(n, policy):
+    nbody = load_module('lab3/nbody.py')
+    c = nbody.Cluster(*nbody.disk(n), policy=policy)
+    return lambda: c.step(60.)
+
+kernels['step/cluster.1000'] = lambda: cluster(1000, 'float64')
+kernels['step/cluster.1000.float32'] = lambda: cluster(1000, 'float32')
+
+def satellite_cluster(method, dt):
+    # 200 light moons and a satellite 0.03 earth-moon distances out, which
+    # needs steps of about 60 s; every call moves the cluster on by 3840 s
+    nbody = load_module('lab3/nbody.py')
+    pos, vel, masses = nbody.disk(200)
+    masses[1:] = 1e12
+    r = 0.03*nbody.Distance
+    pos = np.vstack([pos, [r, 0]])
+    vel = np.vstack([vel, [0, np.sqrt(nbody.G*nbody.Earth_Mass/r)]])
+    c = nbody.Cluster(pos, vel, np.append(masses, 1000.), method)
+    n = int(round(3840. / dt))
+    def step():
+        for _ in range(n):
+            c.step(dt)
+    return step
+
+kernels['step/cluster.satellite.rk4'] = lambda: satellite_cluster('rk4', 60.)
+kernels['step/cluster.satellite.multirate'] = lambda: satellite_cluster('multirate', 3840.)
+
+@kernel('step/cluster.dense.adaptive')
+def _():
+    # 64 bodies in close encounters, softened, on per body steps
+    nbody = load_module('lab3/nbody.py')
+    c = nbody.Cluster(*nbody.ball(64), method='multirate', eta=0.02, softening=2e7)
+    return lambda: c.step(500.)
+
+@kernel('step/cluster.binary.regularized')
+def _():
+    # a pair of moons 2000 km apart on the orbit of the moon, stepped an
+    # hour at a time, more than half the period of the pair
+    nbody = load_module('lab3/nbody.py')
+    a = 2e6
+    v = np.sqrt(nbody.G*nbody.Earth_Mass/nbody.Distance)
+    vb = np.sqrt(nbody.G*2*nbody.Moon_Mass/a)
+    pos = [[0, 0], [nbody.Distance - a/2, 0], [nbody.Distance + a/2, 0]]
+    vel = [[0, 0], [0, v - vb/2], [0, v + vb/2]]
+    c = nbody.Cluster(pos, vel, [nbody.Earth_Mass, nbody.Moon_Mass, nbody.Moon_Mass], regularize=True)
+    return lambda: c.step(3600.)
+
+# --------------------- collision detection ------------------------
+
+def circle(x, y, r):
+    return {'x': x, 'y': y, 'radius': r}
+
+@kernel('collision/circles')
+def _():
+    check = load_module('collision_detection/circle_collision_detection.py').check_circle_collision
+    a, b = circle(30, 50, 20), circle(50, 50, 20)
+    return lambda: check(a, b)
+
+def regular_polygon(n, cx, cy, r):
+    a = np.linspace(0, 2*np.pi, n, endpoint=False)
+    return np.stack([cx + r*np.cos(a), cy + r*np.sin(a)], axis=1)
+
+def polygons(n):
+    collide = load_module('collision_detection/polygon_collision.py').polygons_collide
+    p1 = regular_polygon(n, 30, 30, 20)
+    p2 = regular_polygon(n, 45, 40, 20)
+    return lambda: collide(p1, p2)
+
+for n in (3, 8, 32, 128):
+    kernels[f'collision/polygons.{n}'] = lambda n=n: polygons(n)
+
+def star(n, cx, cy, r1, r2):
+    # concave outline with n points
+    a = np.linspace(0, 2*np.pi, 2*n, endpoint=False)
+    r = np.where(np.arange(2*n) % 2 == 0, r1, r2)
+    return np.stack([cx + r*np.cos(a), cy + r*np.sin(a)], axis=1)
+
+def concave(n):
+    # decompositions come from the cache after the first call
+    collide = load_module('collision_detection/decompose.py').shapes_collide
+    s1 = star(n, 30, 30, 20, 8)
+    s2 = star(n, 52, 40, 20, 8)
+    return lambda: collide(s1, s2)
+
+for n in (5, 32):
+    kernels[f'collision/concave.{n}'] = lambda n=n: concave(n)
+
+@kernel('collision/concave.moving')
+def _():
+    # a star moving past another, its outline in its own coordinates, so the
+    # cache keeps hitting while it moves
+    collide = load_module('collision_detection/decompose.py').shapes_collide
+    s1 = star(32, 30, 30, 20, 8)
+    s2 = star(32, 0, 0, 20, 8)
+    x = np.linspace(0, 100, 1000)
+    frame = [0]
+    def step():
+        frame[0] = (frame[0] + 1) % len(x)
+        return collide(s1, s2, offset2=(x[frame[0]], 40))
+    return step
+
+def terrain(query):
+    # 1000 balls against a 5000 segment polyline per call
+    module = load_module('ball_falling/terrain.py')
+    rng = np.random.default_rng(0)
+    x = np.linspace(-1000, 1000, 5001)
+    ground = module.Terrain.polyline(np.stack([x, 50*np.sin(x/37) + 20*rng.standard_normal(len(x))], axis=1))
+    xy = np.stack([rng.uniform(-1000, 1000, 1000), rng.uniform(-100, 200, 1000)], axis=1)
+    v = np.stack([rng.uniform(-50, 50, 1000), rng.uniform(-300, 0, 1000)], axis=1)
+    if query == 'closest':
+        return lambda: ground.closest(xy)
+    return lambda: ground.sweep(xy, xy + v, 2.0)
+
+kernels['collision/terrain.closest.1000'] = lambda: terrain('closest')
+kernels['collision/terrain.sweep.1000'] = lambda: terrain('sweep')
+
+# --------------------- rendering ----------------------------------
+
+def points(n, fade):
+    import pygame
+    from common.pointsprites import PointRenderer
+    pygame.display.init()
+    screen = pygame.display.set_mode((640, 640))
+    renderer = PointRenderer(screen, size=1, fade=fade)
+    rng = np.random.default_rng(0)
+    xy = rng.uniform(0, 640, (n, 2))
+    colors = rng.integers(0, 256, (n, 3))
+    return lambda: renderer.draw(xy, colors)
+
+kernels['render/points.100000'] = lambda: points(100000, None)
+kernels['render/points.100000.trails'] = lambda: points(100000, 0.9)
+
+# --------------------- full headless loops ------------------------
+
+LOOPS = {
+    'loop/falling_ball': ('lab1/lab1.py', 300),
+    'loop/projectile': ('lab2/2d-projectile-simulation.py', 300),
+    'loop/mass_spring': ('2d_mass_spring/mass-spring-2d.py', 300),
+    'loop/double_spring': ('lab4/double-mass-spring-system.py', 300),
+    'loop/rigid_body': ('box_falling/2d-square-falling-from-the-sky.py', 300),
+    'loop/orbits': ('lab3/orbits.py', 20000),
+}
+
+# --------------------- imports -----------------------------------
+
+# The models are imported without pygame or matplotlib, the front ends pull
+# in both.  Each import runs in a fresh interpreter, reported as imports/sec.
+IMPORTS = {
+    'import/freefall': 'lab1/freefall.py',
+    'import/projectile_sim': 'lab2/projectile_sim.py',
+    'import/double_spring': 'lab4/double_spring.py',
+    'import/rigid_body': 'box_falling/rigid_body.py',
+    'import/nbody': 'lab3/nbody.py',
+    'import/orbits': 'lab3/orbits.py',
+}
+
+def run_import(script, repeat=3):
+    path = os.path.join(ROOT, script)
+    name = os.path.splitext(os.path.basename(path))[0]
+    code = f"import sys; sys.path.insert(0, {os.path.dirname(path)!r}); import {name}"
+    best = 0.0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        best = max(best, 1 / (time.perf_counter() - start))
+    return best
+
+def run_loop(script, frames):
+    # frames per second of the whole front end, run headless in its own process
+    path = os.path.join(ROOT, script)
+    start = time.perf_counter()
+    subprocess.run([sys.executable, os.path.basename(path), '--headless', '--frames', str(frames)],
+                   cwd=os.path.dirname(path), check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return frames / (time.perf_counter() - start)
+
+# --------------------- measuring ----------------------------------
+
+def rate(fn, min_time=0.2, repeat=3):
+    # best of repeat runs, in calls per second
+    n = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(n):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time / 10:
+            break
+        n *= 10
+    n = max(1, int(n * min_time / elapsed))
+    best = 0.0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(n):
+            fn()
+        best = max(best, n / (time.perf_counter() - start))
+    return best
+
+def measure(name):
+    if name in LOOPS:
+        return {'rate': run_loop(*LOOPS[name])}
+    if name in IMPORTS:
+        return {'rate': run_import(IMPORTS[name])}
+    fn = kernels[name]()
+    retained, peak = memcheck.allocations_per_call(fn, calls=200)
+    return {'rate': rate(fn), 'peak_bytes': peak, 'retained_bytes': retained}
+
+def regressions(results, baseline, tolerance):
+    found = []
+    for name, r in results.items():
+        b = baseline.get(name)
+        if b is None:
+            continue
+        if r['rate'] < b['rate'] * (1 - tolerance):
+            found.append(f"{name}: {r['rate']:.0f}/s, baseline {b['rate']:.0f}/s")
+        # a few hundred bytes of noise is normal for tracemalloc
+        if 'peak_bytes' in r and 'peak_bytes' in b and r['peak_bytes'] > b['peak_bytes'] * (1 + tolerance) + 256:
+            found.append(f"{name}: allocates {r['peak_bytes']} bytes per call, baseline {b['peak_bytes']}")
+    return found
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulation kernel benchmarks')
+    parser.add_argument('-k', dest='pattern', default='', help='only run benchmarks whose name contains this')
+    parser.add_argument('--no-loops', action='store_true', help='skip the full headless loops and the import times')
+    parser.add_argument('--baseline', default=BASELINE, help='baseline file (default: benchmarks/baseline.json)')
+    parser.add_argument('--save', action='store_true', help='save the results as the baseline')
+    parser.add_argument('--compare', action='store_true', help='compare against the baseline and fail on regressions')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='allowed slowdown as a fraction (default 0.1)')
+    opts = parser.parse_args()
+
+    names = list(kernels) + ([] if opts.no_loops else list(IMPORTS) + list(LOOPS))
+    names = [n for n in names if opts.pattern in n]
+
+    results = {}
+    print(f"{'benchmark':32s} {'per sec':>12s} {'peak bytes':>11s}")
+    for name in names:
+        results[name] = measure(name)
+        r = results[name]
+        peak = f"{r['peak_bytes']:11d}" if 'peak_bytes' in r else f"{'-':>11s}"
+        rate = f"{r['rate']:12.0f}" if r['rate'] >= 100 else f"{r['rate']:12.2f}"
+        print(f"{name:32s} {rate} {peak}")
+
+    if opts.save:
+        baseline = {}
+        if os.path.exists(opts.baseline):
+            with open(opts.baseline) as f:
+                baseline = json.load(f)['results']
+        baseline.update(results)
+        with open(opts.baseline, 'w') as f:
+            json.dump({'python': platform.python_version(), 'machine': platform.machine(),
+                       'results': baseline}, f, indent=2, sort_keys=True)
+        print(f"saved {opts.baseline}")
+
+    if opts.compare:
+        with open(opts.baseline) as f:
+            baseline = json.load(f)['results']
+        found = regressions(results, baseline, opts.tolerance)
+        for r in found:
+            print('REGRESSION', r)
+        if found:
+            sys.exit(1)
+        print('no regressions')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+"""
+Work-precision comparison of the integrators on every model.
+
+Each model is run over the same interval with dop853 at a range of
+tolerances and with the fixed step methods (common/fixedstep.py) at a range
+of steps, and the state at the end is compared with a reference: the exact
+solution where there is one, dop853 at a tolerance of 1e-13 otherwise.
+The error is relative, |y - y_ref| / |y_ref|, and the cost is the CPU time
+of the whole run.  For every model the cheapest setting that meets the
+target error is recommended.
+
+    python benchmarks/work_precision.py                     # all models, target 1e-6
+    python benchmarks/work_precision.py -k orbits --target 1e-8 --plot wp.png
+
+The orbits of the earth and the moon are measured against the Kepler
+solution (lab3/kepler.py).
+
+lab1's hand-rolled update (position from the old velocity, then the
+velocity) is explicit Euler, the 'euler' rows of the falling ball.  The
+symplectic methods are left out for the rigid body, its state is not made
+of positions and velocities.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+os.environ.setdefault('MPLBACKEND', 'Agg')
+
+import numpy as np
+from scipy.integrate import ode
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common import fixedstep, projectile
+from common.loader import load_module
+
+TOLERANCES = (1e-3, 1e-5, 1e-7, 1e-9, 1e-11)
+REFERENCE_RTOL = 1e-13
+
+class Problem:
+
+    def __init__(self, name, f_into, y0, t_end, dts, params=(), exact=None, symplectic=True):
+        self.name = name
+        self.f_into = f_into
+        self.y0 = np.array(y0, dtype=float)
+        self.t_end = t_end
+        self.dts = dts
+        self.params = params
+        self.exact = exact          # exact(t) -> state, if known
+        self.symplectic = symplectic
+
+    def methods(self):
+        return fixedstep.METHODS + (fixedstep.SYMPLECTIC if self.symplectic else ())
+
+    def f(self, t, y):
+        # flat version for scipy
+        shape = self.y0.shape
+        return self.f_into(t, y.reshape(shape), np.empty(shape), *self.params).ravel()
+
+    def dop853(self, rtol):
+        solver = ode(self.f)
+        solver.set_integrator('dop853', rtol=rtol, atol=rtol*1e-3, nsteps=10**7)
+        solver.set_initial_value(self.y0.ravel(), 0.0)
+        solver.integrate(self.t_end)
+        return solver.y.reshape(self.y0.shape)
+
+    def fixed(self, method, dt):
+        n = max(1, int(round(self.t_end / dt)))
+        dt = self.t_end / n
+        y = self.y0.copy()
+        stepper = fixedstep.FixedStepper(self.f_into, y.shape, method, self.params)
+        for i in range(n):
+            stepper.step(i*dt, y, dt)
+        return y
+
+    def reference(self):
+        if self.exact is not None:
+            return np.asarray(self.exact(self.t_end), dtype=float).reshape(self.y0.shape)
+        return self.dop853(REFERENCE_RTOL)
+
+def timed(run, min_time):
+    # result and the best CPU time of a run, repeated for at least min_time
+    best = np.inf
+    total = 0.0
+    while total < min_time or best == np.inf:
+        start = time.process_time()
+        y = run()
+        elapsed = time.process_time() - start
+        best = min(best, elapsed)
+        total += max(elapsed, 1e-6)
+    return y, best
+
+def falling_ball():
+    sim = load_module('lab1/freefall.py').Simulation()
+    sim.setup(460, 0, 1)
+    a = sim.g / sim.mass
+
+    def f_into(t, y, out):
+        out[0] = y[1]
+        out[1] = a
+        return out
+
+    def exact(t):
+        return [sim.y + sim.vy*t + 0.5*a*t*t, sim.vy + a*t]
+
+    return Problem('falling_ball', f_into, [sim.y, sim.vy], 5.0,
+                   [sim.dt*2**k for k in range(3, -4, -1)], exact=exact)
+
+def projectile_flight():
+    sim = load_module('lab2/projectile_sim.py').Simulation()
+    sim.setup(50, 45)
+    k = sim.gamma / sim.mass
+    t_end = float(projectile.landing_time(0., sim.vy, k, sim.gravity))
+
+    def exact(t):
+        return projectile.state(t, *sim.launch, k, sim.gravity)
+
+    return Problem('projectile', sim.f_into, sim.launch, t_end,
+                   [sim.dt*2**k for k in range(3, -4, -1)], params=(sim.gamma, sim.gravity), exact=exact)
+
+def double_spring():
+    module = load_module('lab4/double_spring.py')
+    sim = module.Simulation([10.0, 10.0, 20.0, -2.0, 0.0, 0.0, 0.0, 0.0])
+    return Problem('double_spring', sim.f_into, sim.state, 10.0,
+                   [module.DT*2**k for k in range(2, -5, -1)], params=(sim.params,))
+
+def orbits():
+    # the earth and the moon of orbits.py, for a month
+    nbody = load_module('lab3/nbody.py')
+    kepler = load_module('lab3/kepler.py')
+    pos = [[0, 0], [nbody.Distance, 0]]
+    vel = [[0, -np.sqrt(nbody.G*nbody.Moon_Mass/nbody.Distance)],
+           [0, np.sqrt(nbody.G*nbody.Earth_Mass/nbody.Distance)]]
+    cluster = nbody.Cluster(pos, vel, [nbody.Earth_Mass, nbody.Moon_Mass])
+    orbit = kepler.TwoBody(nbody.Earth_Mass, nbody.Moon_Mass, pos[0], vel[0], pos[1], vel[1], nbody.G)
+
+    def exact(t):
+        pos1, vel1, pos2, vel2 = orbit.states(t)
+        return [np.concatenate([pos1, vel1]), np.concatenate([pos2, vel2])]
+
+    return Problem('orbits', cluster.f_into, cluster.state, 28*86400.,
+                   [3600.*2**k for k in range(3, -3, -1)], exact=exact)
+
+def rigid_body():
+    rb = load_module('box_falling/rigid_body.py').RigidBody([0, -1, 0], [0, 0, 0.1])
+    return Problem('rigid_body', rb.f_into, rb.state, 10.0, [0.1*2**k for k in range(2, -5, -1)],
+                   params=(rb.force, rb.torque, rb.IbodyInv), symplectic=False)
+
+MODELS = {'falling_ball': falling_ball, 'projectile': projectile_flight, 'double_spring': double_spring,
+          'orbits': orbits, 'rigid_body': rigid_body}
+
+def error(y, reference):
+    return float(np.linalg.norm(y - reference) / np.linalg.norm(reference))
+
+def measure(problem, min_time):
+    # rows of (method, setting, error, seconds)
+    reference = problem.reference()
+    rows = []
+    for rtol in TOLERANCES:
+        y, cpu = timed(lambda: problem.dop853(rtol), min_time)
+        rows.append(('dop853', f'rtol {rtol:.0e}', error(y, reference), cpu))
+    for method in problem.methods():
+        for dt in problem.dts:
+            y, cpu = timed(lambda: problem.fixed(method, dt), min_time)
+            rows.append((method, f'dt {dt:.4g}', error(y, reference), cpu))
+    return rows
+
+def recommend(rows, target):
+    # cheapest row within the target error, None if there is none
+    good = [r for r in rows if np.isfinite(r[2]) and r[2] <= target]
+    return min(good, key=lambda r: r[3]) if good else None
+
+def plot(results, target, path):
+    import matplotlib.pyplot as plt
+    fig, axes = plt.subplots(1, len(results), figsize=(5*len(results), 4.5), squeeze=False)
+    for ax, (name, rows) in zip(axes[0], results.items()):
+        for method in dict.fromkeys(r[0] for r in rows):
+            err = [max(r[2], 1e-17) for r in rows if r[0] == method]
+            cpu = [r[3] for r in rows if r[0] == method]
+            ax.loglog(cpu, err, 'o-', label=method, markersize=3)
+        ax.axhline(target, color='gray', linestyle='--', linewidth=1)
+        ax.set_title(name)
+        ax.set_xlabel('CPU time (s)')
+        ax.set_ylabel('relative error')
+        ax.grid(True, which='both', alpha=0.3)
+    axes[0][0].legend(fontsize='small')
+    fig.tight_layout()
+    fig.savefig(path)
+    print(f'saved {path}')
+
+def main():
+    parser = argparse.ArgumentParser(description='Error against CPU time of the integrators on every model')
+    parser.add_argument('-k', dest='pattern', default='', help='only the models whose name contains this')
+    parser.add_argument('--target', type=float, default=1e-6, help='relative error to meet (default 1e-6)')
+    parser.add_argument('--min-time', type=float, default=0.05, help='repeat every run for at least this long')
+    parser.add_argument('--plot', metavar='PATH', help='save the work-precision diagrams to this image')
+    opts = parser.parse_args()
+
+    results = {}
+    for name, make in MODELS.items():
+        if opts.pattern not in name:
+            continue
+        rows = results[name] = measure(make(), opts.min_time)
+        print(f"\n{name}")
+        print(f"  {'method':18s} {'setting':14s} {'error':>10s} {'cpu ms':>10s}")
+        for method, setting, err, cpu in rows:
+            print(f"  {method:18s} {setting:14s} {err:10.2e} {cpu*1e3:10.3f}")
+
+    print(f"\ncheapest integrator with a relative error within {opts.target:.0e}:")
+    for name, rows in results.items():
+        best = recommend(rows, opts.target)
+        if best is None:
+            print(f"  {name:14s} none of the settings")
+        else:
+            print(f"  {name:14s} {best[0]} ({best[1]}), error {best[2]:.2e}, {best[3]*1e3:.3f} ms")
+
+    if opts.plot:
+        plot(results, opts.target, opts.plot)
+
+if __name__ == '__main__':
+    main()
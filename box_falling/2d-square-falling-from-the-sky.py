@@ -5,10 +5,16 @@ website: http://www.vclab.ca
 license: BSD
 """
 
-import pygame, sys
-import matplotlib.pyplot as plt
-import numpy as np
-from scipy.integrate import ode
+import pygame, sys, os
+from collections import OrderedDict
+
+from rigid_body import RigidBody
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common import invariants, options, scheduler as frame_clock
+from common.capture import FrameRecorder
+from common.profiling import profiler as prof
+from common.scheduler import FixedTimestep
 
 # set up the colors
 BLACK = (0, 0, 0)
@@ -17,120 +23,67 @@ RED = (255, 0, 0)
 GREEN = (0, 255, 0)
 BLUE = (0, 0, 255)
 
-class RigidBody:
-
-    def __init__(self, force, torque):
-        self.mass = 1.0                       # mass
-        self.Ibody = np.identity(3)           # inertia tensor
-        self.IbodyInv = np.linalg.inv(self.Ibody)  # inverse of inertia tensor
-        self.v = np.zeros(3)       # linear velocity
-        self.omega = np.zeros(3)   # angular velocity
-
-        self.state = np.zeros(19)
-        self.state[0:3] = np.zeros(3)                     # position
-        self.state[3:12] = np.identity(3).reshape([1,9])  # rotation
-        self.state[12:15] = self.mass * self.v            # linear momentum
-        self.state[15:18] = np.zeros(3)                   # angular momentum
-
-        # Computed quantities
-        self.force = force
-        self.torque = torque
-
-        # Setting up the solver
-        self.solver = ode(self.f)
-        self.solver.set_integrator('dop853')
-        self.solver.set_f_params(self.force, self.torque, self.IbodyInv)
-
-    def f(self, t, state, force, torque, IbodyInv):
-        rate = np.zeros(19)
-        
-        # computing derived velocities directly from current state
-        v = state[12:15]/self.mass
-        omega = np.matmul(IbodyInv, state[15:18])
-        
-        # rate of change in position (dx/dt) is current computed velocity
-        rate[0:3] = v
-        
-        # current rotation matrix
-        R = state[3:12].reshape([3,3])
-        # rate of change in rotation matrix based on angular velocity
-        dRdt = np.matmul(self.star(omega), R)
-        rate[3:12] = dRdt.reshape([1,9])
-        
-        # rate of change in linear momentum is force
-        rate[12:15] = force
-        
-        # rate of change in anuglar momentum is torque
-        rate[15:18] = torque
-        
-        # rate of change in time with respect to itself is 1
-        rate[18] = 1
-
-        return rate
-
-    def star(self, v):
-        vs = np.zeros([3,3])
-        vs[0][0] = 0
-        vs[1][0] = v[2]
-        vs[2][0] = -v[1]
-        vs[0][1] = -v[2]
-        vs[1][1] = 0
-        vs[2][1] = v[0]
-        vs[0][2] = v[1] 
-        vs[1][2] = -v[0]
-        vs[2][2] = 0
-        return vs;       
-
-    def orthonormalize(self, m):
-        mo = np.zeros([3,3])
-        r0 = m[0,:]
-        r1 = m[1,:]
-        r2 = m[2,:]
-        
-        r0new = r0 / np.linalg.norm(r0)
-        
-        r2new = np.cross(r0new, r1)
-        r2new = r2new / np.linalg.norm(r2new)
-
-        r1new = np.cross(r2new, r0new)
-        r1new = r1new / np.linalg.norm(r1new)
-
-        mo[0,:] = r0new
-        mo[1,:] = r1new
-        mo[2,:] = r2new
-        return mo
-
-    def get_pos(self):
-        return self.state[0:3]
-
-    def get_rot(self):
-        return self.state[3:12].reshape([3,3])
-
-    def get_angle_2d(self):
-        v1 = [1,0,0]
-        v2 = np.dot(self.state[3:12].reshape([3,3]), v1)
-        cosang = np.dot(v1, v2)
-        axis = np.cross(v1, v2)
-        return np.degrees(np.arccos(cosang)), axis
-
-    def prn_state(self):
-        print( 'Pos', self.state[0:3])
-        print( 'Rot', self.state[3:12].reshape([3,3]))
-        print( 'P', self.state[12:15])
-        print( 'L', self.state[15:18])
+class RotationCache:
+    # Rotated copies of one image.  Angles are rounded to a multiple of
+    # quantum degrees, and the least recently used copies are dropped once
+    # there are more than maxsize of them.
+
+    def __init__(self, image, quantum=1.0, maxsize=360):
+        self.image = image
+        self.steps = max(1, int(round(360. / quantum)))
+        self.quantum = 360. / self.steps
+        self.maxsize = maxsize
+        self.surfaces = OrderedDict()
+
+    def key(self, angle):
+        return int(round(angle / self.quantum)) % self.steps
+
+    def get(self, angle):
+        k = self.key(angle)
+        surface = self.surfaces.get(k)
+        if surface is None:
+            surface = pygame.transform.rotate(self.image, k * self.quantum)
+            self.surfaces[k] = surface
+            if len(self.surfaces) > self.maxsize:
+                self.surfaces.popitem(last=False)
+        else:
+            self.surfaces.move_to_end(k)
+        return surface
+
+    def prebuild(self):
+        # renders the full rotation atlas up front, so that rotate() never
+        # has to resample the image during the simulation
+        self.maxsize = max(self.maxsize, self.steps)
+        for k in range(self.steps):
+            if k not in self.surfaces:
+                self.surfaces[k] = pygame.transform.rotate(self.image, k * self.quantum)
+
+# caches are shared between all boxes that use the same image and quantum
+rotation_caches = {}
+
+def get_rotation_cache(imgfile, quantum=1.0, maxsize=360, prebuild=False):
+    key = (imgfile, quantum)
+    cache = rotation_caches.get(key)
+    if cache is None:
+        cache = RotationCache(pygame.image.load(imgfile), quantum, maxsize)
+        rotation_caches[key] = cache
+    if prebuild:
+        cache.prebuild()
+    return cache
 
 class Box2d(pygame.sprite.Sprite):
-    def __init__(self, x, y, screen_height, imgfile):
+    def __init__(self, x, y, screen_height, imgfile, angle_quantum=1.0, cache_size=360, prebuild=False):
         pygame.sprite.Sprite.__init__(self)
 
-        self.image = pygame.image.load(imgfile)
+        self.cache = get_rotation_cache(imgfile, angle_quantum, cache_size, prebuild)
+        self.image = self.cache.image
         self.rect = self.image.get_rect()
         self.pos = (x,y)
         self.image_rot = self.image
         self.screen_height = screen_height
 
     def rotate(self, angle):
-        self.image_rot = pygame.transform.rotate(self.image, angle)
+        self.image_rot = self.cache.get(angle)
 
     def move(self, x, y):
         new_x = self.pos[0] + x
@@ -145,6 +98,11 @@ class Box2d(pygame.sprite.Sprite):
 
 def main():
 
+    opts = options.parse('2D square falling from the sky')
+    if opts.dirty:
+        # the background scrolls with the square, every frame redraws it all
+        sys.exit('--dirty is not supported here, the whole window changes every frame')
+
    # initializing pygame
     pygame.init()
 
@@ -158,21 +116,48 @@ def main():
 
     background = pygame.image.load('background-vertical.png')
 
-    box = Box2d(320, 320, win_height, 'square.png')
+    box = Box2d(320, 320, win_height, 'square.png', prebuild=True)
     box_exploded = Box2d(320, 320, win_height, 'square-exploded.png')
 
+    recorder = None
+    if opts.record:
+        recorder = FrameRecorder(opts.record, screen.get_size(), fps=30)
+
     rb = RigidBody([0,-1,0], [0,0,0.1])
     cur_time = 0.0
     dt = 0.1
 
     rb.solver.set_initial_value(rb.state, cur_time)
 
+    # drift of the conserved quantities, checked after every physics step;
+    # they all start at zero, atol=1 measures them against unit mass and force
+    monitor = None
+    if opts.drift is not None:
+        monitor = invariants.DriftMonitor(rb.invariants, invariants.RIGID_BODY,
+                                          opts.drift or None, opts.on_drift, atol=1.0)
+        monitor.reset(cur_time)
+
+    def step(h):
+        nonlocal cur_time
+        rb.state = rb.integrate(cur_time + h)
+        cur_time += h
+        if monitor and not monitor.check(cur_time) and opts.on_drift == 'downshift':
+            scheduler.set_dt(monitor.downshift(scheduler.dt, cur_time))
+
+    # fixed dt physics steps at the same pace as the old one step per frame at
+    # 30 fps; the position is drawn interpolated between the last two states
+    scheduler = FixedTimestep(dt, speed=30*dt, adaptive=opts.adaptive)
+    scheduler.reset(rb.get_pos()[0:2])
+
     exploded = False
+    frame = 0
     while True:
         # 30 fps
-        clock.tick(30)
+        with prof.phase('clock.tick'):
+            frame_time = frame_clock.tick(clock, 30, opts.headless)
 
-        event = pygame.event.poll()
+        with prof.phase('event.poll'):
+            event = pygame.event.poll()
         if event.type == pygame.QUIT:
             pygame.quit()
             sys.exit(0)
@@ -183,26 +168,40 @@ def main():
             pass
 
         if not exploded:
-            rb.state = rb.solver.integrate(cur_time)
-            cur_time += dt
+            with prof.phase('integration'):
+                scheduler.advance(frame_time, step, lambda: rb.get_pos()[0:2])
 
             angle, axis = rb.get_angle_2d()
             if axis[2] < 0:
                 angle *= -1.
 
-            pos = rb.get_pos()
+            pos = scheduler.interpolate()
 
         # clear the background, and draw the sprites
-        screen.blit(background, (pos[0],pos[1]))
-
-        if pos[1] < -1600:
-            exploded = True
-            box_exploded.draw(screen)
-        else:
-            box.rotate(angle)
-            #box.move(pos[0], pos[1])
-            box.draw(screen)
-        pygame.display.update()
+        with prof.phase('draw'):
+            screen.blit(background, (pos[0],pos[1]))
+
+            if pos[1] < -1600:
+                exploded = True
+                box_exploded.draw(screen)
+            else:
+                with prof.phase('sprites'):
+                    box.rotate(angle)
+                #box.move(pos[0], pos[1])
+                box.draw(screen)
+        with prof.phase('display'):
+            pygame.display.update()
+        if recorder:
+            with prof.phase('capture'):
+                recorder.capture(screen)
+        frame += 1
+        if opts.frames and frame >= opts.frames:
+            if recorder:
+                recorder.close()
+            if monitor:
+                print(monitor.report())
+            pygame.quit()
+            sys.exit(0)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,142 @@
+"""
+author: Faisal Qureshi
+email: faisal.qureshi@uoit.ca
+website: http://www.vclab.ca
+license: BSD
+
+The rigid body of 2d-square-falling-from-the-sky.py, without pygame, so
+that it can be imported by batch jobs and benchmarks.
+"""
+
+import os
+import sys
+import numpy as np
+from scipy.integrate import ode
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common import fixedstep, invariants
+
+class RigidBody:
+
+    def __init__(self, force, torque, integrator='dop853'):
+        self.mass = 1.0                       # mass
+        self.Ibody = np.identity(3)           # inertia tensor
+        self.IbodyInv = np.linalg.inv(self.Ibody)  # inverse of inertia tensor
+        self.v = np.zeros(3)       # linear velocity
+        self.omega = np.zeros(3)   # angular velocity
+
+        self.state = np.zeros(19)
+        self.state[0:3] = np.zeros(3)                     # position
+        self.state[3:12] = np.identity(3).reshape([1,9])  # rotation
+        self.state[12:15] = self.mass * self.v            # linear momentum
+        self.state[15:18] = np.zeros(3)                   # angular momentum
+
+        # Computed quantities
+        self.force = np.asarray(force, dtype=float)
+        self.torque = np.asarray(torque, dtype=float)
+
+        # scratch arrays used by f_into
+        self.omega_tmp = np.zeros(3)
+        self.star_tmp = np.zeros([3,3])
+
+        # Setting up the solver
+        self.solver = ode(self.f)
+        self.solver.set_integrator('dop853')
+        self.solver.set_f_params(self.force, self.torque, self.IbodyInv)
+
+        # allocation free fixed step path ('euler', 'rk2' or 'rk4'),
+        # used by integrate() instead of the ode solver when selected
+        self.t = 0.0
+        self.stepper = None
+        if integrator != 'dop853':
+            self.stepper = fixedstep.FixedStepper(self.f_into, 19, integrator, params=(self.force, self.torque, self.IbodyInv))
+
+    def f(self, t, state, force, torque, IbodyInv):
+        return self.f_into(t, state, np.zeros(19), force, torque, IbodyInv)
+
+    def f_into(self, t, state, rate, force, torque, IbodyInv):
+        # computing derived velocities directly from current state
+        omega = np.matmul(IbodyInv, state[15:18], out=self.omega_tmp)
+        
+        # rate of change in position (dx/dt) is current computed velocity
+        np.divide(state[12:15], self.mass, out=rate[0:3])
+        
+        # current rotation matrix
+        R = state[3:12].reshape([3,3])
+        # rate of change in rotation matrix based on angular velocity
+        np.matmul(self.star(omega, self.star_tmp), R, out=rate[3:12].reshape([3,3]))
+        
+        # rate of change in linear momentum is force
+        rate[12:15] = force
+        
+        # rate of change in anuglar momentum is torque
+        rate[15:18] = torque
+        
+        # rate of change in time with respect to itself is 1
+        rate[18] = 1
+
+        return rate
+
+    def star(self, v, vs=None):
+        if vs is None:
+            vs = np.zeros([3,3])
+        vs[0][0] = 0
+        vs[1][0] = v[2]
+        vs[2][0] = -v[1]
+        vs[0][1] = -v[2]
+        vs[1][1] = 0
+        vs[2][1] = v[0]
+        vs[0][2] = v[1] 
+        vs[1][2] = -v[0]
+        vs[2][2] = 0
+        return vs;       
+
+    def integrate(self, t):
+        # same as solver.integrate(t), using the fixed step path if selected
+        if self.stepper is None:
+            return self.solver.integrate(t)
+        if t > self.t:
+            self.stepper.step(self.t, self.state, t - self.t)
+            self.t = t
+        return self.state
+
+    def orthonormalize(self, m):
+        mo = np.zeros([3,3])
+        r0 = m[0,:]
+        r1 = m[1,:]
+        r2 = m[2,:]
+        
+        r0new = r0 / np.linalg.norm(r0)
+        
+        r2new = np.cross(r0new, r1)
+        r2new = r2new / np.linalg.norm(r2new)
+
+        r1new = np.cross(r2new, r0new)
+        r1new = r1new / np.linalg.norm(r1new)
+
+        mo[0,:] = r0new
+        mo[1,:] = r1new
+        mo[2,:] = r2new
+        return mo
+
+    def invariants(self, t):
+        return invariants.rigid_body(self.state, self.mass, self.force, self.torque, t)
+
+    def get_pos(self):
+        return self.state[0:3]
+
+    def get_rot(self):
+        return self.state[3:12].reshape([3,3])
+
+    def get_angle_2d(self):
+        v1 = [1,0,0]
+        v2 = np.dot(self.state[3:12].reshape([3,3]), v1)
+        cosang = np.dot(v1, v2)
+        axis = np.cross(v1, v2)
+        return np.degrees(np.arccos(cosang)), axis
+
+    def prn_state(self):
+        print( 'Pos', self.state[0:3])
+        print( 'Rot', self.state[3:12].reshape([3,3]))
+        print( 'P', self.state[12:15])
+        print( 'L', self.state[15:18])
@@ -1,7 +1,8 @@
-import matplotlib.pyplot as plt
 import numpy as np
 
 def plot_circles(circle1, circle2, collision):
+    import matplotlib.pyplot as plt
+
     fig, ax = plt.subplots(figsize=(6, 6))
     ax.set_xlim(0, 100)
     ax.set_ylim(0, 100)
@@ -33,14 +34,18 @@ def check_circle_collision(circle1, circle2):
     else:
         return False
 
-# Define circles for collision case
-circle1_collision = {'x': 30, 'y': 50, 'radius': 20}
-circle2_collision = {'x': 50, 'y': 50, 'radius': 20}
-collision = check_circle_collision(circle1_collision, circle2_collision)
-plot_circles(circle1_collision, circle2_collision, collision)
-
-# Define circles for non-collision case
-circle1_no_collision = {'x': 20, 'y': 50, 'radius': 15}
-circle2_no_collision = {'x': 70, 'y': 50, 'radius': 15}
-no_collision = check_circle_collision(circle1_no_collision, circle2_no_collision)
-plot_circles(circle1_no_collision, circle2_no_collision, no_collision)
\ No newline at end of file
+def main():
+    # Define circles for collision case
+    circle1_collision = {'x': 30, 'y': 50, 'radius': 20}
+    circle2_collision = {'x': 50, 'y': 50, 'radius': 20}
+    collision = check_circle_collision(circle1_collision, circle2_collision)
+    plot_circles(circle1_collision, circle2_collision, collision)
+
+    # Define circles for non-collision case
+    circle1_no_collision = {'x': 20, 'y': 50, 'radius': 15}
+    circle2_no_collision = {'x': 70, 'y': 50, 'radius': 15}
+    no_collision = check_circle_collision(circle1_no_collision, circle2_no_collision)
+    plot_circles(circle1_no_collision, circle2_no_collision, no_collision)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+# Concave polygons for the SAT collision test - 2D case
+#
+# polygons_collide() only works for convex polygons.  A concave outline is
+# cut into triangles by ear clipping, and neighbouring pieces are merged
+# back together wherever the result stays convex (Hertel-Mehlhorn), which
+# leaves at most four times the minimum number of convex pieces.  The
+# pieces are kept, with their edges, axes and bounding boxes, in a cache
+# keyed by a hash of the vertices, so a shape is only decomposed the first
+# time it is seen.  Two shapes collide if any pair of their pieces does;
+# pairs whose bounding boxes do not overlap are skipped without SAT.
+#
+#     shapes_collide(outline1, outline2)     # (n, 2) vertex arrays, any winding
+#
+# A shape that moves keeps its outline in its own coordinates and passes
+# its position as an offset, so the outline, the key and the cached pieces
+# stay the same from frame to frame:
+#
+#     shapes_collide(outline1, outline2, offset1=pos1, offset2=pos2)
+
+import hashlib
+
+import numpy as np
+
+from polygon_collision import ConvexPolygon, convex_polygons_collide
+
+def signed_area(vs):
+    x, y = vs[:, 0], vs[:, 1]
+    return 0.5 * (np.dot(x, np.roll(y, -1)) - np.dot(np.roll(x, -1), y))
+
+def cross(o, a, b):
+    return (a[0] - o[0])*(b[1] - o[1]) - (a[1] - o[1])*(b[0] - o[0])
+
+def inside_triangle(p, a, b, c):
+    # counter clockwise a, b, c, the boundary counts as inside
+    return cross(a, b, p) >= 0 and cross(b, c, p) >= 0 and cross(c, a, p) >= 0
+
+def triangulate(vs):
+    """
+    Ear clipping of a simple polygon, counter clockwise vertices vs (a list
+    of (x, y)).  Returns
+    the triangles as lists of vertex indices.  O(n^2), fine for outlines of
+    a few hundred vertices.
+    """
+    index = list(range(len(vs)))
+    triangles = []
+    while len(index) > 3:
+        n = len(index)
+        reflex = [i for k, i in enumerate(index)
+                  if cross(vs[index[k-1]], vs[i], vs[index[(k+1) % n]]) < 0]
+        for k in range(n):
+            prev, i, nxt = index[k-1], index[k], index[(k+1) % n]
+            turn = cross(vs[prev], vs[i], vs[nxt])
+            if turn == 0:
+                # a vertex on the line of its neighbours is no corner at all
+                del index[k]
+                break
+            if turn < 0:
+                continue
+            if any(inside_triangle(vs[j], vs[prev], vs[i], vs[nxt])
+                   for j in reflex if j not in (prev, nxt)):
+                continue
+            triangles.append([prev, i, nxt])
+            del index[k]
+            break
+        else:
+            raise ValueError('no ear found, the polygon is not simple')
+    if len(index) == 3 and cross(vs[index[0]], vs[index[1]], vs[index[2]]) > 0:
+        triangles.append(index)
+    return triangles
+
+def is_convex(vs, piece):
+    n = len(piece)
+    return all(cross(vs[piece[k-1]], vs[piece[k]], vs[piece[(k+1) % n]]) >= 0 for k in range(n))
+
+def merge(a, b, u, v):
+    # a holds the edge u -> v, b the same edge as v -> u
+    i = a.index(v)
+    j = b.index(u)
+    a = a[i:] + a[:i]          # v ... u
+    b = b[j:] + b[:j]          # u ... v
+    return a + b[1:-1]
+
+def hertel_mehlhorn(vs, pieces):
+    # One pass over the diagonals between the pieces, each one is removed
+    # if the piece it leaves is still convex.
+    pieces = dict(enumerate(list(p) for p in pieces))
+    owner = {}          # directed edge -> piece
+    for n, p in pieces.items():
+        for k in range(len(p)):
+            owner[(p[k], p[(k+1) % len(p)])] = n
+    diagonals = [(u, v) for (u, v) in owner if (v, u) in owner and u < v]
+    for u, v in diagonals:
+        a, b = owner[(u, v)], owner[(v, u)]
+        candidate = merge(pieces[a], pieces[b], u, v)
+        if not is_convex(vs, candidate):
+            continue
+        pieces[a] = candidate
+        for k in range(len(pieces[b])):
+            owner[(pieces[b][k], pieces[b][(k+1) % len(pieces[b])])] = a
+        del pieces[b], owner[(u, v)], owner[(v, u)]
+    return list(pieces.values())
+
+class Decomposition:
+    """
+    The convex pieces of a polygon, as ConvexPolygons, with the bounding
+    box of every piece (lo, hi: (pieces, 2)) and of the whole shape.
+    """
+
+    def __init__(self, vertices):
+        vs = np.asarray(vertices, dtype=float)
+        if signed_area(vs) < 0:
+            vs = vs[::-1]
+        self.vertices = vs
+        # plain floats, the corner tests are done one at a time
+        pts = vs.tolist()
+        pieces = hertel_mehlhorn(pts, triangulate(pts))
+        self.pieces = [ConvexPolygon(vs[p]) for p in pieces]
+        self.lo = np.array([vs[p].min(axis=0) for p in pieces])
+        self.hi = np.array([vs[p].max(axis=0) for p in pieces])
+        self.box = (self.lo.min(axis=0), self.hi.max(axis=0))
+
+    def __len__(self):
+        return len(self.pieces)
+
+def shape_key(vertices):
+    vs = np.ascontiguousarray(vertices, dtype=np.float64)
+    return hashlib.blake2b(vs.tobytes() + str(vs.shape).encode(), digest_size=16).hexdigest()
+
+cache = {}
+CACHE_SIZE = 4096
+stats = {'hits': 0, 'misses': 0}
+
+def decompose(vertices):
+    # the cached decomposition of vertices, made the first time
+    key = shape_key(vertices)
+    d = cache.get(key)
+    if d is not None:
+        stats['hits'] += 1
+        return d
+    stats['misses'] += 1
+    d = cache[key] = Decomposition(vertices)
+    if len(cache) > CACHE_SIZE:
+        # the oldest shape goes first
+        del cache[next(iter(cache))]
+    return d
+
+def shapes_collide(poly1, poly2, offset1=None, offset2=None):
+    """
+    Check for collision between two simple polygons, convex or not, each
+    moved by its offset (x, y) if given.
+    """
+    d1 = poly1 if isinstance(poly1, Decomposition) else decompose(poly1)
+    d2 = poly2 if isinstance(poly2, Decomposition) else decompose(poly2)
+    # everything is compared where shape 1 is, shape 2 moved by d
+    d = np.zeros(2)
+    if offset2 is not None:
+        d += offset2
+    if offset1 is not None:
+        d -= offset1
+    lo2, hi2 = d2.lo + d, d2.hi + d
+    if np.any(d1.box[1] < d2.box[0] + d) or np.any(d2.box[1] + d < d1.box[0]):
+        return False
+    # piece pairs with overlapping boxes, then SAT on those
+    overlap = ((d1.lo[:, None, :] <= hi2[None, :, :]) & (lo2[None, :, :] <= d1.hi[:, None, :])).all(axis=2)
+    for i, j in zip(*np.nonzero(overlap)):
+        if convex_polygons_collide(d1.pieces[i], d2.pieces[j], d):
+            return True
+    return False
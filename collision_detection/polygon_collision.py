@@ -5,7 +5,6 @@
 # Adapted from ChatGPT
 
 import numpy as np
-import matplotlib.pyplot as plt
 
 class ConvexPolygon:
     
@@ -34,7 +33,8 @@ class ConvexPolygon:
             
             colinear = False
             for a in axs:
-                if(np.isclose(np.dot(ax, a) % 1, 0)):
+                # parallel axes (dot +-1) give the same projections
+                if(np.isclose(abs(np.dot(ax, a)), 1)):
                     colinear = True
             
             if not colinear:
@@ -50,15 +50,20 @@ class ConvexPolygon:
 
 def polygons_collide(poly1, poly2):
     """Check for collision between two convex polygons using SAT."""
-    
-    poly1 = ConvexPolygon(poly1)
-    poly2 = ConvexPolygon(poly2)
-        
+    return convex_polygons_collide(ConvexPolygon(poly1), ConvexPolygon(poly2))
+
+def convex_polygons_collide(poly1, poly2, offset=None):
+    """
+    SAT for two ConvexPolygons, e.g. pieces kept from an earlier call, with
+    poly2 moved by offset (x, y) if given.
+    """
     axs = np.vstack([poly1.separating_axes, poly2.separating_axes])
     
     for a in axs:
         poly1_projections = np.sort(np.array([np.dot(a, v) for v in poly1.verticies]))
         poly2_projections = np.sort(np.array([np.dot(a, v) for v in poly2.verticies]))
+        if offset is not None:
+            poly2_projections += np.dot(a, offset)
         if not (poly1_projections[-1] > poly2_projections[0] and poly2_projections[-1] > poly1_projections[0]):
             return False
     
@@ -66,6 +71,8 @@ def polygons_collide(poly1, poly2):
 
 def plot_polygons(poly1, poly2, collision):
     """Visualize two polygons and indicate collision status."""
+    import matplotlib.pyplot as plt
+
     fig, ax = plt.subplots(figsize=(6, 6))
     ax.set_xlim(0, 100)
     ax.set_ylim(0, 100)
@@ -91,16 +98,35 @@ def plot_polygons(poly1, poly2, collision):
     plt.grid(True)
     plt.show()
 
-# Example polygons
-polygon1 = np.array([[10, 10], [30, 10], [30, 30]]) #, [10, 30]])  # Square
-polygon2 = np.array([[25, 25], [45, 25], [45, 45], [25, 45]])  # Overlapping Square
-polygon3 = np.array([[50, 50], [70, 50], [70, 70], [50, 70]])  # Non-overlapping Square
+def main():
+    from decompose import shapes_collide
+
+    # Example polygons
+    polygon1 = np.array([[10, 10], [30, 10], [30, 30], [10, 30]])  # Square
+    polygon2 = np.array([[25, 25], [45, 25], [45, 45], [25, 45]])  # Overlapping Square
+    polygon3 = np.array([[50, 50], [70, 50], [70, 70], [50, 70]])  # Non-overlapping Square
+
+    # Check and plot collision case
+    collision1 = polygons_collide(polygon1, polygon2)
+    plot_polygons(polygon1, polygon2, collision1)
+
+    # Check and plot non-collision case
+    collision2 = polygons_collide(polygon1, polygon3)
+    plot_polygons(polygon1, polygon3, collision2)
 
-# Check and plot collision case
-collision1 = polygons_collide(polygon1, polygon2)
-plot_polygons(polygon1, polygon2, collision1)
+    # Concave polygons go through shapes_collide, which cuts them into
+    # convex pieces.  The square sits in the notch of the arrow head, inside
+    # its convex hull but clear of the arrow itself.
+    arrow = np.array([[10, 10], [40, 25], [10, 40], [20, 25]])  # Concave arrow head
+    polygon4 = np.array([[11, 22], [15, 22], [15, 28], [11, 28]])  # Square in the notch
+    collision3 = shapes_collide(arrow, polygon4)
+    plot_polygons(arrow, polygon4, collision3)
 
-# Check and plot non-collision case
-collision2 = polygons_collide(polygon1, polygon3)
-plot_polygons(polygon1, polygon3, collision2)
+    # Shapes that move keep their outline in their own coordinates and are
+    # placed with offsets, so they are only decomposed once
+    for dx in (0, 5, 10):
+        collision4 = shapes_collide(arrow, polygon4, offset2=(dx, 0))
+        plot_polygons(arrow, polygon4 + [dx, 0], collision4)
 
+if __name__ == '__main__':
+    main()
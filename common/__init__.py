@@ -0,0 +1,6 @@
+"""
+Code shared by the simulations in this repository.
+
+The lab scripts are run from their own directories, so each of them puts the
+repository root on sys.path before importing from here.
+"""
@@ -0,0 +1,112 @@
+"""
+Frame export for the pygame simulations.
+
+FrameRecorder copies each frame out of the screen surface into one of a fixed
+pool of buffers and hands it to a background thread, which either pipes it to
+ffmpeg (for a video file) or saves it as a numbered PNG (for a path such as
+frames/frame%05d.png).  The simulation loop only waits when the writer falls
+more than queue_size frames behind.  If writing fails (ffmpeg exits, the disk
+is full) the thread keeps taking the frames and drops them, and the error is
+raised from the next capture() or from close().
+"""
+
+import atexit
+import os
+import queue
+import shutil
+import subprocess
+import threading
+
+import numpy as np
+import pygame
+
+class FrameRecorder:
+
+    def __init__(self, path, size, fps=30, queue_size=32):
+        self.path = path
+        self.width, self.height = size
+        self.fps = fps
+        self.count = 0
+
+        # buffers cycle between the pool and the queue, so that capturing
+        # does not allocate once the recorder is running
+        self.pool = queue.Queue()
+        for _ in range(queue_size + 2):
+            self.pool.put(np.empty((self.height, self.width, 3), dtype=np.uint8))
+        self.frames = queue.Queue(maxsize=queue_size)
+
+        self.ffmpeg = None
+        if '%' not in path:
+            if shutil.which('ffmpeg') is None:
+                raise RuntimeError(f"ffmpeg is needed to record {path}, or give a frame pattern such as frames/frame%05d.png")
+            self.ffmpeg = subprocess.Popen(
+                ['ffmpeg', '-loglevel', 'error', '-y',
+                 '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f'{self.width}x{self.height}', '-r', str(fps),
+                 '-i', '-', '-pix_fmt', 'yuv420p', path],
+                stdin=subprocess.PIPE)
+        elif os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self.closed = False
+        self.failed = False     # set by the writer, which drops frames from then on
+        self.error = None       # what it failed with, until check() raises it
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def check(self):
+        # raises the error the writer ran into, once
+        error, self.error = self.error, None
+        if error is not None:
+            raise RuntimeError(f"could not write the frames to {self.path}: {error}") from error
+
+    def capture(self, surface):
+        self.check()
+        buf = self.pool.get()
+        try:
+            # a view of the surface pixels, no copy is made here
+            pixels = pygame.surfarray.pixels3d(surface)
+        except ValueError:
+            # surfaces that can not be referenced directly (e.g. 8 bit)
+            pixels = pygame.surfarray.array3d(surface)
+        # surfarray is indexed [x, y], the frame [y, x]
+        np.copyto(buf, pixels.transpose(1, 0, 2))
+        del pixels  # unlocks the surface
+        self.frames.put(buf)
+        self.count += 1
+
+    def run(self):
+        n = 0
+        while True:
+            buf = self.frames.get()
+            if buf is None:
+                break
+            if not self.failed:
+                try:
+                    if self.ffmpeg is not None:
+                        self.ffmpeg.stdin.write(memoryview(buf))
+                    else:
+                        image = pygame.image.frombuffer(buf, (self.width, self.height), 'RGB')
+                        pygame.image.save(image, self.path % n)
+                except Exception as e:
+                    # keep handing the buffers back, or capture() would wait
+                    # for one forever
+                    self.error = e
+                    self.failed = True
+            n += 1
+            self.pool.put(buf)
+
+    def close(self):
+        # waits until every captured frame has been written
+        if self.closed:
+            return
+        self.closed = True
+        self.frames.put(None)
+        self.thread.join()
+        if self.ffmpeg is not None:
+            try:
+                self.ffmpeg.stdin.close()
+            except BrokenPipeError:
+                pass    # ffmpeg is gone already, the writer has the error
+            self.ffmpeg.wait()
+        self.check()
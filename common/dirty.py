@@ -0,0 +1,62 @@
+"""
+Dirty rectangle rendering for the pygame front ends.
+
+Instead of filling the whole window, redrawing every sprite and flipping,
+DirtyScreen restores the background only where something changed and pushes
+just those rectangles to the display.  The sprites have to be DirtySprites
+that set dirty = 1 whenever they move.
+"""
+
+import pygame
+
+class DirtyScreen:
+
+    def __init__(self, screen, background, sprites=()):
+        self.screen = screen
+        if not isinstance(background, pygame.Surface):
+            color = background
+            background = pygame.Surface(screen.get_size())
+            background.fill(color)
+        self.background = background
+        self.group = pygame.sprite.LayeredDirty(sprites)
+        self.group.clear(screen, background)
+        self.changed = []
+        self.drawn = []       # rects drawn outside of the sprite group this frame
+        self.under = []       # rects of those that belong underneath the sprites
+        self.last_drawn = []
+        self.first = True
+
+    def begin(self):
+        # restores the background under whatever was drawn outside of the
+        # sprite group last frame, then redraws the sprites that changed
+        if self.first:
+            self.screen.blit(self.background, (0, 0))
+        for r in self.last_drawn:
+            self.screen.blit(self.background, r, r)
+        if self.last_drawn:
+            for s in self.group:
+                if s.dirty == 0 and s.rect.collidelist(self.last_drawn) != -1:
+                    s.dirty = 1
+        self.changed = self.group.draw(self.screen)
+
+    def mark(self, rect, under=False):
+        # records something drawn directly on the screen after begin()
+        self.drawn.append(rect)
+        if under:
+            self.under.append(rect)
+
+    def end(self):
+        # sprites go back on top of anything drawn underneath them
+        for r in self.under:
+            for s in self.group:
+                if s.visible and s.rect.colliderect(r):
+                    self.screen.blit(s.image, s.rect)
+
+        if self.first:
+            pygame.display.update()
+            self.first = False
+        else:
+            pygame.display.update(self.changed + self.drawn + self.last_drawn)
+        self.last_drawn = self.drawn
+        self.drawn = []
+        self.under = []
@@ -0,0 +1,201 @@
+"""
+Event driven simulation of bodies in free flight.
+
+Between collisions a body under gravity and linear drag follows the exact
+solution in common/projectile.py, so the time of its next event (hitting
+the floor, leaving the screen) can be computed directly instead of being
+found by stepping and checking y < 0 after the fact.  The scheduler keeps
+the predicted events of all bodies in a priority queue and jumps from one
+to the next; a body is only touched when something happens to it.
+
+Bodies with forces that have no closed form (Integrated) are stepped with
+a fixed step integrator instead, each step being an event of its own, and
+are checked against the same surfaces after every step.
+
+    floor = Plane((0, 0), (0, 1))
+    scheduler = EventScheduler([floor, Box(0, 640, ymin=-100)])
+    scheduler.add(Ballistic((0, 10), (5, 0), k=0.1))
+    scheduler.advance(t)       # handles every event up to time t
+"""
+
+import heapq
+import itertools
+import numpy as np
+
+from common import fixedstep, projectile
+
+class Ballistic:
+    # free flight under gravity g (along -y) and linear drag k = gamma/m
+
+    def __init__(self, pos, vel, t=0.0, k=0.0, g=projectile.GRAVITY):
+        self.k = k
+        self.g = g
+        self.version = 0        # bumped whenever the predicted events go stale
+        self.active = True
+        self.restart(t, pos, vel)
+
+    def restart(self, t, pos, vel):
+        # new initial conditions, e.g. after a bounce
+        self.t0 = t
+        self.pos0 = np.array(pos, dtype=float)
+        self.vel0 = np.array(vel, dtype=float)
+        self.version += 1
+
+    def state(self, t):
+        # x, y, vx, vy at time t >= t0
+        x0, y0 = self.pos0
+        vx0, vy0 = self.vel0
+        return projectile.state(t - self.t0, x0, y0, vx0, vy0, self.k, self.g)
+
+class Integrated:
+    # a body stepped numerically, f_into(t, y, out, *params) with y = [x, y, vx, vy, ...]
+
+    def __init__(self, f_into, state, dt, t=0.0, method='rk4', params=()):
+        self.y = np.array(state, dtype=float)
+        self.stepper = fixedstep.FixedStepper(f_into, len(self.y), method, params)
+        self.dt = dt
+        self.t0 = t
+        self.version = 0
+        self.active = True
+
+    def restart(self, t, pos, vel):
+        self.t0 = t
+        self.y[0:2] = pos
+        self.y[2:4] = vel
+        self.version += 1
+
+    def step(self):
+        self.stepper.step(self.t0, self.y, self.dt)
+        self.t0 += self.dt
+
+    def state(self, t):
+        # the last step, the state is only known at the step times
+        return self.y[0], self.y[1], self.y[2], self.y[3]
+
+class Plane:
+    """
+    A floor through point with the (upward) normal, bodies bounce off it
+    elastically: the normal part of the velocity is reversed.
+    """
+
+    def __init__(self, point, normal):
+        self.point = np.array(point, dtype=float)
+        self.normal = np.array(normal, dtype=float) / np.linalg.norm(normal)
+        if self.normal[1] <= 0:
+            raise ValueError('the normal of a floor has to point up')
+
+    def distance(self, x, y):
+        return (x - self.point[0])*self.normal[0] + (y - self.point[1])*self.normal[1]
+
+    def time(self, body):
+        # Along the normal the motion has the same form as y(t), with the
+        # part of gravity along the normal, so landing_time() applies.
+        h = self.distance(*body.pos0)
+        vn = np.dot(body.vel0, self.normal)
+        if h <= 0 and vn <= 0:
+            # resting or sliding on the plane, not a free flight event
+            return np.inf
+        return body.t0 + float(projectile.landing_time(max(h, 0.), vn, body.k, body.g*self.normal[1]))
+
+    def inside(self, x, y):
+        return self.distance(x, y) >= 0
+
+    def respond(self, body, t):
+        x, y, vx, vy = body.state(t)
+        n = self.normal
+        pos = np.array([x, y])
+        pos -= min(self.distance(x, y), 0.) * n     # back onto the plane
+        vel = np.array([vx, vy])
+        vn = np.dot(vel, n)
+        if vn < 0:
+            vel -= 2*vn*n
+        body.restart(t, pos, vel)
+
+class Box:
+    """
+    Bodies that leave xmin <= x <= xmax or drop below ymin are taken out of
+    the simulation.  There is no top, what goes up comes back down.
+    """
+
+    def __init__(self, xmin, xmax, ymin):
+        self.xmin = xmin
+        self.xmax = xmax
+        self.ymin = ymin
+
+    def time(self, body):
+        x0, y0 = body.pos0
+        vx0, vy0 = body.vel0
+        edge = self.xmax if vx0 > 0 else self.xmin
+        t = float(projectile.time_at_distance(edge - x0, vx0, body.k))
+        if y0 >= self.ymin:
+            t = min(t, float(projectile.landing_time(y0, vy0, body.k, body.g, ground=self.ymin)))
+        return body.t0 + t
+
+    def inside(self, x, y):
+        return self.xmin <= x <= self.xmax and y >= self.ymin
+
+    def respond(self, body, t):
+        body.active = False
+
+class EventScheduler:
+
+    def __init__(self, surfaces=()):
+        self.surfaces = list(surfaces)
+        self.bodies = []
+        self.queue = []
+        self.counter = itertools.count()    # ties are handled first in first out
+        self.time = 0.0
+        self.handled = 0                    # events, steps of Integrated bodies excluded
+        self.steps = 0
+
+    def add(self, body):
+        self.bodies.append(body)
+        self.schedule(body)
+        return body
+
+    def schedule(self, body):
+        # queues the next events of body, older ones are recognised as stale
+        # by the version number when they come up
+        if not body.active:
+            return
+        if isinstance(body, Integrated):
+            self.push(body.t0 + body.dt, body, None)
+            return
+        for surface in self.surfaces:
+            t = surface.time(body)
+            if np.isfinite(t):
+                self.push(max(t, self.time), body, surface)
+
+    def push(self, t, body, surface):
+        heapq.heappush(self.queue, (t, next(self.counter), body.version, body, surface))
+
+    def advance(self, until, handle=None):
+        # Handles all events up to time until, in order.  handle(t, body,
+        # surface) is called after each response.
+        while self.queue and self.queue[0][0] <= until:
+            t, _, version, body, surface = heapq.heappop(self.queue)
+            if version != body.version or not body.active:
+                continue
+            self.time = t
+            if surface is None:
+                body.step()
+                self.steps += 1
+                x, y = body.y[0], body.y[1]
+                for s in self.surfaces:
+                    if body.active and not s.inside(x, y):
+                        self.respond(s, body, t, handle)
+            else:
+                self.respond(surface, body, t, handle)
+            self.schedule(body)
+        self.time = max(self.time, until)
+
+    def respond(self, surface, body, t, handle):
+        surface.respond(body, t)
+        self.handled += 1
+        if handle is not None:
+            handle(t, body, surface)
+
+    def states(self, t=None):
+        # x, y, vx, vy of the bodies still in the simulation, (n, 4)
+        t = self.time if t is None else t
+        return np.array([b.state(t) for b in self.bodies if b.active], dtype=float).reshape(-1, 4)
@@ -0,0 +1,100 @@
+"""
+Fixed-step integrators that work on preallocated buffers.
+
+The models expose an f_into(t, state, out, *params) method that writes the
+derivatives into out instead of returning a new list.  FixedStepper keeps its
+stage buffers around between calls, so once it is created a step does not
+allocate any arrays.
+
+The symplectic methods need states that hold the positions in the first
+half of their last axis and the velocities in the second ([x, y, vx, vy],
+or (n, 4) for n bodies), and use only the acceleration half of f_into.
+They keep the energy of conservative systems bounded over long runs where
+the Runge-Kutta methods let it drift.
+"""
+
+import numpy as np
+
+METHODS = ('euler', 'rk2', 'rk4')
+SYMPLECTIC = ('symplectic_euler', 'leapfrog')
+
+class FixedStepper:
+
+    def __init__(self, f_into, shape, method='rk4', params=(), dtype=np.float64):
+        if method not in METHODS + SYMPLECTIC:
+            raise ValueError(f"unknown fixed step method {method}, expected one of {METHODS + SYMPLECTIC}")
+        if method in SYMPLECTIC and np.atleast_1d(shape)[-1] % 2:
+            raise ValueError(f"{method} needs positions and velocities of the same size, the state has shape {shape}")
+        self.f_into = f_into
+        self.method = method
+        self.params = params
+
+        # stage derivatives and a scratch state, reused by every step
+        self.k1 = np.zeros(shape, dtype=dtype)
+        self.k2 = np.zeros(shape, dtype=dtype)
+        self.k3 = np.zeros(shape, dtype=dtype)
+        self.k4 = np.zeros(shape, dtype=dtype)
+        self.tmp = np.zeros(shape, dtype=dtype)
+
+    def step(self, t, y, dt):
+        # advances y in place from t to t + dt
+        f = self.f_into
+        k1, k2, k3, k4, tmp = self.k1, self.k2, self.k3, self.k4, self.tmp
+
+        if self.method == 'euler':
+            f(t, y, k1, *self.params)
+            np.multiply(k1, dt, out=k1)
+            np.add(y, k1, out=y)
+
+        elif self.method == 'symplectic_euler':
+            # kick with the acceleration at (q, v), then drift with the new v
+            h = y.shape[-1] // 2
+            q, v, a = y[..., :h], y[..., h:], k1[..., h:]
+            f(t, y, k1, *self.params)
+            np.multiply(a, dt, out=a)
+            np.add(v, a, out=v)
+            np.multiply(v, dt, out=tmp[..., :h])
+            np.add(q, tmp[..., :h], out=q)
+
+        elif self.method == 'leapfrog':
+            # drift half a step, kick, drift the other half
+            h = y.shape[-1] // 2
+            q, v, a = y[..., :h], y[..., h:], k1[..., h:]
+            np.multiply(v, 0.5*dt, out=tmp[..., :h])
+            np.add(q, tmp[..., :h], out=q)
+            f(t + 0.5*dt, y, k1, *self.params)
+            np.multiply(a, dt, out=a)
+            np.add(v, a, out=v)
+            np.multiply(v, 0.5*dt, out=tmp[..., :h])
+            np.add(q, tmp[..., :h], out=q)
+
+        elif self.method == 'rk2':
+            # midpoint method
+            f(t, y, k1, *self.params)
+            np.multiply(k1, 0.5*dt, out=tmp)
+            np.add(tmp, y, out=tmp)
+            f(t + 0.5*dt, tmp, k2, *self.params)
+            np.multiply(k2, dt, out=k2)
+            np.add(y, k2, out=y)
+
+        else:
+            f(t, y, k1, *self.params)
+            np.multiply(k1, 0.5*dt, out=tmp)
+            np.add(tmp, y, out=tmp)
+            f(t + 0.5*dt, tmp, k2, *self.params)
+            np.multiply(k2, 0.5*dt, out=tmp)
+            np.add(tmp, y, out=tmp)
+            f(t + 0.5*dt, tmp, k3, *self.params)
+            np.multiply(k3, dt, out=tmp)
+            np.add(tmp, y, out=tmp)
+            f(t + dt, tmp, k4, *self.params)
+
+            # y += dt/6 * (k1 + 2*k2 + 2*k3 + k4)
+            np.add(k2, k3, out=k2)
+            np.multiply(k2, 2.0, out=k2)
+            np.add(k1, k2, out=k1)
+            np.add(k1, k4, out=k1)
+            np.multiply(k1, dt/6.0, out=k1)
+            np.add(y, k1, out=y)
+
+        return y
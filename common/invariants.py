@@ -0,0 +1,176 @@
+"""
+Conserved quantities of the models, and a monitor that follows how far
+they drift while a simulation runs.
+
+Each of the invariant functions returns a small array of numbers that the
+exact solution keeps constant, and next to it the size of the terms they are
+made of.  The integrators only keep them constant up to their error, so the
+drift is a cheap measure of how much a timestep costs in accuracy.  It is
+measured relative to the size of the terms, a total energy that is close to
+zero because the kinetic and potential energy cancel is still measured
+against their size.
+"""
+
+import math
+import numpy as np
+
+class DriftError(RuntimeError):
+    pass
+
+NBODY = ('energy', 'momentum x', 'momentum y', 'angular momentum')
+
+def nbody(pos, vel, masses, G, softening=0.):
+    # pos and vel are (n, 2) arrays, all pairs interact through gravity,
+    # Plummer softened if softening > 0
+    pos = np.asarray(pos, dtype=float)
+    vel = np.asarray(vel, dtype=float)
+    m = np.asarray(masses, dtype=float)
+
+    kinetic = 0.5 * np.dot(m, (vel**2).sum(axis=1))
+    i, j = np.triu_indices(len(m), 1)
+    r = np.sqrt(((pos[j] - pos[i])**2).sum(axis=1) + softening*softening)
+    potential = -G * (m[i] * m[j] / r).sum()
+
+    p = m @ vel
+    l = m * (pos[:, 0]*vel[:, 1] - pos[:, 1]*vel[:, 0])
+    values = np.array([kinetic + potential, p[0], p[1], l.sum()])
+    # both components are measured against the total size of the momenta,
+    # one of them is often zero to begin with
+    pabs = np.dot(m, np.sqrt((vel**2).sum(axis=1)))
+    scales = np.array([kinetic - potential, pabs, pabs, np.abs(l).sum()])
+    return values, scales
+
+SPRINGS = ('energy',)
+
+def springs(pos, vel, masses, k, l, g=0., anchor=(0., 0.)):
+    # A chain anchor - mass 0 - mass 1 - ... of springs with stiffness k[i]
+    # and rest length l[i], in a gravity field of strength g along -y.
+    # Elastic, kinetic and gravitational potential energy.
+    pos = np.asarray(pos, dtype=float).reshape(-1, 2)
+    vel = np.asarray(vel, dtype=float).reshape(-1, 2)
+    m = np.asarray(masses, dtype=float)
+
+    ends = np.vstack([np.asarray(anchor, dtype=float), pos])
+    stretch = np.sqrt(((ends[1:] - ends[:-1])**2).sum(axis=1)) - l
+    elastic = 0.5 * np.dot(k, stretch**2)
+    kinetic = 0.5 * np.dot(m, (vel**2).sum(axis=1))
+    gravity = g * m * pos[:, 1]
+    return (np.array([elastic + kinetic + gravity.sum()]),
+            np.array([elastic + kinetic + np.abs(gravity).sum()]))
+
+def angular_momentum(pos, vel, masses, origin=(0., 0.)):
+    # about origin, conserved under central forces (e.g. a single spring
+    # anchored at origin without gravity)
+    pos = np.asarray(pos, dtype=float).reshape(-1, 2) - origin
+    vel = np.asarray(vel, dtype=float).reshape(-1, 2)
+    l = np.multiply(masses, pos[:, 0]*vel[:, 1] - pos[:, 1]*vel[:, 0])
+    return np.array([l.sum()]), np.array([np.abs(l).sum()])
+
+RIGID_BODY = ('energy', 'momentum x', 'momentum y', 'momentum z',
+              'angular momentum x', 'angular momentum y', 'angular momentum z')
+
+def rigid_body(state, mass, force, torque, t):
+    # Under a constant force and torque the momentum and angular momentum
+    # grow linearly, P - F t and L - tau t stay constant.  The force only
+    # acts on the translation, so |P|^2/2m - F.x is the conserved energy.
+    x = state[0:3]
+    P = state[12:15]
+    L = state[15:18]
+    kinetic = np.dot(P, P) / (2*mass)
+    work = np.dot(force, x)
+    values = np.empty(7)
+    values[0] = kinetic - work
+    values[1:4] = P - np.multiply(force, t)
+    values[4:7] = L - np.multiply(torque, t)
+    scales = np.empty(7)
+    scales[0] = kinetic + abs(work)
+    scales[1:4] = np.linalg.norm(P) + np.linalg.norm(force) * abs(t)
+    scales[4:7] = np.linalg.norm(L) + np.linalg.norm(torque) * abs(t)
+    return values, scales
+
+class DriftMonitor:
+    """
+    Follows the drift of invariants(*args) away from its first value.
+
+    invariants(*args) returns the values q and the size s of their terms
+    (see above).  The drift of every quantity is |q - q0| / (s0 + atol);
+    atol sets the scale of quantities whose terms all start at zero.
+    check() records the largest drift after every step.  Past threshold, on_drift decides what
+    happens: 'warn' prints once, 'abort' raises DriftError and 'downshift'
+    leaves it to the caller to call downshift() for a smaller dt.
+    """
+
+    ACTIONS = ('warn', 'abort', 'downshift')
+
+    def __init__(self, invariants, names=None, threshold=None, on_drift='warn', atol=1e-12):
+        if on_drift not in self.ACTIONS:
+            raise ValueError(f"unknown drift action '{on_drift}', expected one of {self.ACTIONS}")
+        self.invariants = invariants
+        self.names = names
+        self.threshold = threshold
+        self.on_drift = on_drift
+        self.atol = atol
+        self.reference = None
+        self.scale = None
+        self.drift = []           # largest relative drift after every check
+        self.max_drift = None     # per quantity, over the whole run
+        self.exceeded = 0
+        self.downshifts = 0
+
+    def reset(self, *args):
+        # the current values become the reference
+        q, s = self.invariants(*args)
+        self.reference = np.array(q, dtype=float)
+        self.scale = np.asarray(s, dtype=float) + self.atol
+        if self.max_drift is None:
+            self.max_drift = np.zeros_like(self.reference)
+
+    def name(self, i):
+        return self.names[i] if self.names else f'invariant {i}'
+
+    def check(self, *args):
+        # Returns False when the drift is over the threshold.
+        if self.reference is None:
+            self.reset(*args)
+        q, _ = self.invariants(*args)
+        d = np.abs(q - self.reference) / self.scale
+        worst = d.max()
+        self.drift.append(worst)
+        np.maximum(self.max_drift, d, out=self.max_drift)
+
+        if self.threshold is None or worst <= self.threshold:
+            return True
+
+        self.exceeded += 1
+        i = int(d.argmax())
+        msg = f"{self.name(i)} drifted by {worst:.3e} (threshold {self.threshold:.3e})"
+        if self.on_drift == 'abort':
+            raise DriftError(msg)
+        if self.on_drift == 'warn' and self.exceeded == 1:
+            print('Warning:', msg)
+        return False
+
+    def downshift(self, dt, *args, factor=0.5, min_dt=0.):
+        # Smaller dt for the steps to come.  The drift so far can not be
+        # undone, the current values become the new reference.
+        self.downshifts += 1
+        self.reset(*args)
+        return max(dt * factor, min_dt)
+
+    def report(self):
+        if self.max_drift is None:
+            return 'no drift checks'
+        lines = [f'{len(self.drift)} checks, {self.exceeded} over threshold, {self.downshifts} dt downshifts']
+        for i, d in enumerate(self.max_drift):
+            lines.append(f'{self.name(i)}: max drift {d:.3e}')
+        return '\n'.join(lines)
+
+def safe_dt(trial, dt, threshold, factor=0.5, min_dt=0.):
+    # Largest dt, among dt, dt*factor, dt*factor**2, ..., for which
+    # trial(dt) (the largest drift of a test run) stays within threshold.
+    while dt > min_dt:
+        drift = trial(dt)
+        if math.isfinite(drift) and drift <= threshold:
+            return dt
+        dt *= factor
+    raise DriftError(f"no timestep above {min_dt} keeps the drift within {threshold}")
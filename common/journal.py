@@ -0,0 +1,56 @@
+"""
+Input journal of an interactive session, for replaying it later.
+
+Only what changes the simulation is written down, as commands with the
+simulation time at which they were given, one JSON line each:
+
+    {"model": ..., "dt": 0.1, ...}          header, whatever the replay needs to set up
+    ["advance", 12.3, 0.0333]               kind, simulation time, arguments
+    ["drag", 15.0, -40, 120]
+    ...
+    {"end": {"time": ..., "state": [...]}}  where the session ended
+
+Python writes floats with repr, which reads back to exactly the same
+number, so a replay that applies the same commands in the same order does
+the same arithmetic and ends in a bit-identical state.  The real frame
+times are part of the commands, the replay does not need a clock.
+"""
+
+import json
+
+class Journal:
+
+    def __init__(self, path, **header):
+        self.path = path
+        self.count = 0
+        self.file = open(path, 'w')
+        self.write(header)
+
+    def write(self, entry):
+        self.file.write(json.dumps(entry))
+        self.file.write('\n')
+
+    def record(self, kind, t, *args):
+        self.write([kind, float(t), *args])
+        self.count += 1
+
+    def close(self, **end):
+        # end records the final state, to check replays against
+        if self.file.closed:
+            return
+        self.write({'end': end})
+        self.file.close()
+
+def load(path):
+    # header, the list of commands and the end record (None for a session
+    # that did not finish)
+    with open(path) as f:
+        lines = [json.loads(line) for line in f if line.strip()]
+    header, commands, end = lines[0], lines[1:], None
+    if commands and isinstance(commands[-1], dict):
+        end = commands.pop()['end']
+    return header, commands, end
+
+def floats(values):
+    # numpy values -> plain floats for json, exactly
+    return [float(v) for v in values]
@@ -0,0 +1,38 @@
+"""
+Loads the simulation scripts as modules.
+
+Most scripts have names like double-mass-spring-system.py that can not be
+imported with an import statement, and expect to be run from their own
+directory (they load images with relative paths).
+"""
+
+import importlib.util
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def load_module(path, name=None):
+    # path is relative to the repository root
+    path = os.path.join(ROOT, path)
+    directory = os.path.dirname(path)
+    if name is None:
+        name = os.path.splitext(os.path.basename(path))[0].replace('-', '_')
+    if name in sys.modules:
+        return sys.modules[name]
+
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+    cwd = os.getcwd()
+    os.chdir(directory)
+    try:
+        spec = importlib.util.spec_from_file_location(name, path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        spec.loader.exec_module(module)
+    except BaseException:
+        del sys.modules[name]
+        raise
+    finally:
+        os.chdir(cwd)
+    return module
@@ -0,0 +1,25 @@
+"""
+Allocation counting with tracemalloc.
+"""
+
+import tracemalloc
+
+def allocations_per_call(fn, calls=1000, warmup=10):
+    """Returns (retained, peak) bytes for calling fn, retained is per call."""
+    for _ in range(warmup):
+        fn()
+
+    started = tracemalloc.is_tracing()
+    if not started:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    before, _ = tracemalloc.get_traced_memory()
+
+    for _ in range(calls):
+        fn()
+
+    after, peak = tracemalloc.get_traced_memory()
+    if not started:
+        tracemalloc.stop()
+
+    return (after - before) / calls, peak - before
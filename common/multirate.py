@@ -0,0 +1,138 @@
+"""
+Multirate RK4 for systems whose parts move on very different timescales.
+
+The rows of the state (bodies, or single components) are split into
+groups, slowest first.  Every group takes RK4 steps of its own size, ratio
+times smaller than the group before it:
+
+    level 0    |-------------------------------|           H
+    level 1    |---------------|---------------|           H/ratio
+    level 2    |-------|-------|-------|-------|           H/ratio^2
+
+Slowest first: a group steps over its interval before the faster groups
+fill it with their smaller steps.  It does so together with the faster
+groups (one RK4 step of all of them, so the coupling forces it sees are
+those of a proper RK4 stage) but keeps only its own part of the result.
+The faster groups then redo their part with their own steps, and see it
+through a cubic Hermite interpolant of its state and derivative at both
+ends, which is as accurate as the RK4 step itself.
+
+f_into(t, y, out, *params, rows=rows) has to write the derivatives of the
+given rows into out[rows].  It may write more, but the saving comes from models
+that only compute what was asked for (the forces on a few fast bodies from
+all the others instead of all pairs).
+"""
+
+import numpy as np
+
+def hermite(s, H, y0, d0, y1, d1):
+    # cubic through y0, y1 with slopes d0, d1, at s in [0, 1] of a step H
+    s2 = s*s
+    s3 = s2*s
+    return ((2*s3 - 3*s2 + 1)*y0 + (s3 - 2*s2 + s)*H*d0
+            + (-2*s3 + 3*s2)*y1 + (s3 - s2)*H*d1)
+
+def levels(timescales, ratio=2, max_levels=8):
+    # Groups of rows for Multirate, slowest first.  The rows with the
+    # shortest timescale make the fastest group, every factor of ratio
+    # slower is a group further down, up to max_levels groups; whatever is
+    # slower still shares the first.
+    tau = np.asarray(timescales, dtype=float)
+    spread = np.floor(np.log(tau / tau.min()) / np.log(ratio)).astype(int)
+    top = min(spread.max(), max_levels - 1)
+    level = np.maximum(top - spread, 0)
+    return [np.nonzero(level == l)[0] for l in range(top + 1)]
+
+def levels_for_step(timescales, dt, eta, ratio=2, max_levels=8):
+    # Groups of rows for a step dt, each row in the first group whose step
+    # is at most eta times its timescale, up to max_levels groups (the rows
+    # faster still take the smallest step, so a step never costs more than
+    # max_levels levels).
+    tau = np.asarray(timescales, dtype=float)
+    with np.errstate(divide='ignore'):
+        need = np.ceil(np.log(dt / (eta * tau)) / np.log(ratio))
+    level = np.clip(need, 0, max_levels - 1).astype(int)
+    return [np.nonzero(level == l)[0] for l in range(level.max() + 1)]
+
+class Multirate:
+
+    def __init__(self, f_into, shape, groups, ratio=2, params=(), dtype=np.float64):
+        self.f_into = f_into
+        self.params = params
+        self.ratio = ratio
+        self.set_groups(groups)
+        self.z = np.zeros(shape, dtype=dtype)   # state the stages are evaluated at
+        self.out = np.zeros(shape, dtype=dtype)
+        self.evaluations = 0                # rows evaluated, a measure of the work
+
+    def set_groups(self, groups):
+        # Empty groups are left out, the next group takes their substeps
+        # as well: substeps[l] steps of group l per step of the one before.
+        self.groups = []
+        self.substeps = []
+        skipped = 1
+        for g in groups:
+            if len(g) == 0:
+                skipped *= self.ratio
+                continue
+            self.groups.append(np.asarray(g, dtype=np.intp))
+            self.substeps.append(skipped)
+            skipped = self.ratio
+        # the rows each level steps: its own, then those of the faster groups
+        self.active = [np.concatenate(self.groups[l:]) for l in range(len(self.groups))]
+        self.interval = [None] * len(self.groups)   # (t, H, y0, d0, y1, d1) of each level
+
+    def f(self, t, z, rows):
+        self.f_into(t, z, self.out, *self.params, rows=rows)
+        self.evaluations += len(rows)
+        return self.out[rows].copy()
+
+    def stage(self, level, t, y):
+        # the state at time t as level sees it, the slower groups interpolated
+        z = self.z
+        z[...] = y
+        for l in range(level):
+            t0, H, y0, d0, y1, d1 = self.interval[l]
+            z[self.groups[l]] = hermite((t - t0) / H, H, y0, d0, y1, d1)
+        return z
+
+    def step(self, t, y, dt):
+        # advances y in place from t to t + dt, dt being the step of the
+        # first group
+        self.substep(-1, t, y, dt)
+        return y
+
+    def substep(self, level, t, y, H):
+        # the steps of the group after level that fill [t, t + H]
+        m = self.substeps[level + 1]
+        h = H / m
+        for i in range(m):
+            self.advance(level + 1, t + i*h, y, h)
+
+    def advance(self, level, t, y, H):
+        g = self.groups[level]
+        rows = self.active[level]
+        n = len(g)
+
+        y0 = y[rows]
+        z = self.stage(level, t, y)
+        k1 = self.f(t, z, rows)
+        z = self.stage(level, t + H/2, y)
+        z[rows] = y0 + H/2*k1
+        k2 = self.f(t + H/2, z, rows)
+        z = self.stage(level, t + H/2, y)
+        z[rows] = y0 + H/2*k2
+        k3 = self.f(t + H/2, z, rows)
+        z = self.stage(level, t + H, y)
+        z[rows] = y0 + H*k3
+        k4 = self.f(t + H, z, rows)
+        y1 = y0 + H/6*(k1 + 2*k2 + 2*k3 + k4)
+        y[g] = y1[:n]
+
+        if len(rows) > n:
+            # slope at the end, for the interpolant the faster groups see
+            z = self.stage(level, t + H, y)
+            z[rows] = y1
+            d1 = self.f(t + H, z, g)
+            self.interval[level] = (t, H, y0[:n], k1[:n], y1[:n], d1)
+            self.substep(level, t, y, H)
@@ -0,0 +1,40 @@
+"""
+Command line options shared by the pygame front ends.
+"""
+
+import argparse
+import os
+
+from common import profiling
+
+def parse(description=None, argv=None, extra=None):
+    # extra(parser) can add the options that only one script has
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--dirty', action='store_true',
+                        help='only redraw and update the parts of the window that changed')
+    parser.add_argument('--adaptive', action='store_true',
+                        help='catch up with larger physics steps instead of slowing down when frames are slow')
+    parser.add_argument('--record', metavar='PATH',
+                        help='write the frames to a video file (needs ffmpeg) or to numbered images, e.g. frames/frame%%05d.png')
+    parser.add_argument('--headless', action='store_true',
+                        help='run without a window and without waiting for the frame clock')
+    parser.add_argument('--frames', type=int, default=0,
+                        help='stop after this many frames (0 runs until the simulation ends)')
+    parser.add_argument('--profile', action='store_true',
+                        help='time the phases of the main loop and print a summary at exit')
+    parser.add_argument('--trace', metavar='PATH',
+                        help='write the phase timings as a Chrome trace (JSON) at exit')
+    parser.add_argument('--drift', type=float, metavar='TOL',
+                        help='monitor the drift of the conserved quantities every step, over TOL relative drift '
+                             'counts as too much (0 only records it)')
+    parser.add_argument('--on-drift', choices=('warn', 'abort', 'downshift'), default='warn',
+                        help='what to do when the drift is over TOL: warn, abort the run, or halve dt (default: warn)')
+    if extra is not None:
+        extra(parser)
+    opts = parser.parse_args(argv)
+
+    if opts.headless:
+        # has to be set before the display is created
+        os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    profiling.setup(opts)
+    return opts
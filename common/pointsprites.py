@@ -0,0 +1,86 @@
+"""
+Draws large numbers of bodies as small squares of pixels, written straight
+into the surface with numpy instead of blitting one sprite per body.
+
+Positions come in as arrays of screen coordinates.  Colors can be one color
+for all points or one per point.  With fade the points leave trails: the
+previous frames are kept and darkened by that factor every frame.
+
+    renderer = PointRenderer(screen, size=2, fade=0.9)
+    renderer.draw(xy, colors)      # xy (n, 2), colors (n, 3) or (r, g, b)
+"""
+
+import numpy as np
+import pygame
+
+class PointRenderer:
+
+    def __init__(self, surface, size=1, fade=None, background=(0, 0, 0)):
+        if surface.get_bytesize() not in (3, 4):
+            raise ValueError('points are written as 24 or 32 bit pixels')
+        self.surface = surface
+        self.size = size
+        self.fade = fade
+        self.background = np.array(background[:3], dtype=np.uint8)
+        w, h = surface.get_size()
+        # offsets of the pixels of one point
+        d = np.arange(size) - (size - 1)//2
+        self.offsets = np.stack(np.meshgrid(d, d, indexing='ij'), axis=-1).reshape(-1, 2)
+        # with trails the picture is kept here, in rgb
+        self.trail = None
+        if fade is not None:
+            self.trail = np.empty((w, h, 3), dtype=np.uint8)
+            self.trail[:] = self.background
+
+    def map(self, colors):
+        # rgb (n, 3) -> pixel values of the surface (n,)
+        colors = np.asarray(colors, dtype=np.uint32)
+        shifts = self.surface.get_shifts()
+        losses = self.surface.get_losses()
+        mapped = np.zeros(colors.shape[:-1], dtype=np.uint32)
+        for c in range(3):
+            mapped |= (colors[..., c] >> losses[c]) << shifts[c]
+        if self.surface.get_bytesize() == 4 and self.surface.get_masks()[3]:
+            mapped |= np.uint32(self.surface.get_masks()[3])      # opaque
+        return mapped
+
+    def splat(self, xy):
+        # Every pixel of every point, clipped to the surface.  Returns the
+        # pixel coordinates (m, 2) and the index of the point of each.
+        xy = np.asarray(xy).astype(np.intp, copy=False).reshape(-1, 2)
+        n = len(xy)
+        w, h = self.surface.get_size()
+        px = (xy[None, :, :] + self.offsets[:, None, :]).reshape(-1, 2)
+        index = np.tile(np.arange(n), len(self.offsets))
+        inside = (px[:, 0] >= 0) & (px[:, 0] < w) & (px[:, 1] >= 0) & (px[:, 1] < h)
+        return px[inside], index[inside]
+
+    def draw(self, xy, colors=(255, 255, 255)):
+        px, index = self.splat(xy)
+        colors = np.asarray(colors, dtype=np.uint8)
+        if colors.ndim == 2:
+            colors = colors[index]
+
+        if self.trail is not None:
+            # darken the older frames, then draw the points on top
+            np.multiply(self.trail, self.fade, out=self.trail, casting='unsafe')
+            self.trail[px[:, 0], px[:, 1]] = colors
+            if self.surface.get_bytesize() == 4:
+                pixels = pygame.surfarray.pixels2d(self.surface)
+                pixels[...] = self.map(self.trail)
+            else:
+                pixels = pygame.surfarray.pixels3d(self.surface)
+                pixels[...] = self.trail
+        elif self.surface.get_bytesize() == 4:
+            pixels = pygame.surfarray.pixels2d(self.surface)
+            pixels[px[:, 0], px[:, 1]] = self.map(colors)
+        else:
+            pixels = pygame.surfarray.pixels3d(self.surface)
+            pixels[px[:, 0], px[:, 1]] = colors
+        # the surface stays locked while the pixel array exists
+        del pixels
+
+    def clear(self):
+        if self.trail is not None:
+            self.trail[:] = self.background
+        self.surface.fill(tuple(int(c) for c in self.background))
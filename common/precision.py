@@ -0,0 +1,87 @@
+"""
+Precision policies for the vectorized engines.
+
+A policy says in which dtype the state is stored and the arithmetic done,
+and in which dtype sums over many terms are accumulated:
+
+    float64   everything in double precision (the default)
+    float32   single precision state and arithmetic, sums in double
+
+Large batches are limited by memory traffic, which single precision halves,
+at the cost of a rounding error of about 1e-7 relative per operation.  A sum
+over thousands of terms (the forces on a body, a total energy) would lose
+several digits more in single precision, so sums are accumulated in double
+and rounded once at the end.  How much a run loses overall is measured by
+running a float64 reference next to it, see ErrorReport.
+
+Note that scipy's ode always integrates in float64, whatever the dtype of
+the state it is given, so the policies only apply to the fixed step engines.
+"""
+
+import numpy as np
+
+class Policy:
+
+    def __init__(self, name, dtype, accumulator=np.float64):
+        self.name = name
+        self.dtype = np.dtype(dtype)
+        self.accumulator = np.dtype(accumulator)
+        self.eps = np.finfo(self.dtype).eps
+
+    def array(self, values):
+        return np.array(values, dtype=self.dtype)
+
+    def zeros(self, shape):
+        return np.zeros(shape, dtype=self.dtype)
+
+    def sum(self, values, axis=None, out=None):
+        # Accumulated in the accumulator dtype.  With out the result is
+        # rounded into it, otherwise it is returned in the accumulator dtype.
+        return np.add.reduce(values, axis=axis, dtype=self.accumulator, out=out)
+
+    def __repr__(self):
+        return f'Policy({self.name!r})'
+
+FLOAT64 = Policy('float64', np.float64)
+FLOAT32 = Policy('float32', np.float32)
+
+POLICIES = {p.name: p for p in (FLOAT64, FLOAT32)}
+
+def get(policy):
+    # a Policy, or its name
+    if isinstance(policy, Policy):
+        return policy
+    if policy not in POLICIES:
+        raise ValueError(f"unknown precision '{policy}', expected one of {tuple(POLICIES)}")
+    return POLICIES[policy]
+
+class ErrorReport:
+    """
+    Largest difference between a run and its float64 reference, per named
+    quantity, absolute and relative to the largest value of the reference.
+    """
+
+    def __init__(self, policy, nbytes=None):
+        self.policy = get(policy)
+        self.nbytes = nbytes        # of the state, to report the memory saved
+        self.errors = {}            # name -> (absolute, relative)
+        self.checks = 0
+
+    def update(self, name, trial, reference):
+        trial = np.asarray(trial, dtype=np.float64)
+        reference = np.asarray(reference, dtype=np.float64)
+        error = float(np.max(np.abs(trial - reference)))
+        scale = float(np.max(np.abs(reference)))
+        relative = error / scale if scale else error
+        old = self.errors.get(name, (0.0, 0.0))
+        self.errors[name] = (max(old[0], error), max(old[1], relative))
+        self.checks += 1
+
+    def report(self):
+        lines = [f'{self.policy.name} against a float64 reference (eps {self.policy.eps:.1e})']
+        if self.nbytes is not None:
+            full = self.nbytes * 8 // self.policy.dtype.itemsize
+            lines[0] += f', state {self.nbytes} bytes instead of {full}'
+        for name, (error, relative) in self.errors.items():
+            lines.append(f'{name}: max error {error:.3e} ({relative:.3e} relative)')
+        return '\n'.join(lines)
@@ -0,0 +1,113 @@
+"""
+Per-phase timing for the main loops.
+
+    from common import profiling
+    prof = profiling.profiler
+    with prof.phase('integration'):
+        sim.step()
+
+While the profiler is disabled phase() hands back the same do-nothing context
+manager every time, so leaving the instrumentation in costs next to nothing.
+When enabled it keeps the last `window` durations of every phase (for the
+p50/p99 summary) and, if asked to, Chrome trace events that can be opened in
+chrome://tracing, Perfetto or speedscope.
+"""
+
+import atexit
+import json
+import os
+import time
+from collections import deque
+from contextlib import nullcontext
+
+import numpy as np
+
+NULL_PHASE = nullcontext()
+
+class Phase:
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, self.start, time.perf_counter())
+        return False
+
+class Profiler:
+
+    def __init__(self, window=1000, max_events=1000000):
+        self.enabled = False
+        self.window = window
+        self.max_events = max_events
+        self.durations = {}     # phase -> most recent durations in seconds
+        self.counts = {}
+        self.totals = {}
+        self.events = None      # chrome trace events, when tracing
+        self.origin = time.perf_counter()
+
+    def enable(self, trace=False):
+        self.enabled = True
+        if trace:
+            self.events = []
+
+    def phase(self, name):
+        if not self.enabled:
+            return NULL_PHASE
+        return Phase(self, name)
+
+    def record(self, name, start, end):
+        d = self.durations.get(name)
+        if d is None:
+            d = self.durations[name] = deque(maxlen=self.window)
+            self.counts[name] = 0
+            self.totals[name] = 0.0
+        d.append(end - start)
+        self.counts[name] += 1
+        self.totals[name] += end - start
+        if self.events is not None and len(self.events) < self.max_events:
+            self.events.append({'name': name, 'ph': 'X', 'pid': os.getpid(), 'tid': 0,
+                                'ts': (start - self.origin) * 1e6, 'dur': (end - start) * 1e6})
+
+    def stats(self):
+        # phase -> count, total, mean, p50 and p99 in seconds (percentiles over the window)
+        result = {}
+        for name, d in self.durations.items():
+            p50, p99 = np.percentile(np.fromiter(d, float, len(d)), [50, 99])
+            result[name] = {'count': self.counts[name], 'total': self.totals[name],
+                            'mean': self.totals[name] / self.counts[name], 'p50': p50, 'p99': p99}
+        return result
+
+    def summary(self):
+        lines = [f"{'phase':16s} {'count':>9s} {'total ms':>10s} {'mean ms':>9s} {'p50 ms':>9s} {'p99 ms':>9s}"]
+        stats = self.stats()
+        for name in sorted(stats, key=lambda n: -stats[n]['total']):
+            s = stats[name]
+            lines.append(f"{name:16s} {s['count']:9d} {s['total']*1e3:10.1f} {s['mean']*1e3:9.3f} {s['p50']*1e3:9.3f} {s['p99']*1e3:9.3f}")
+        return '\n'.join(lines)
+
+    def save_trace(self, path):
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': self.events or [], 'displayTimeUnit': 'ms'}, f)
+
+# the profiler used by all the simulations
+profiler = Profiler()
+
+def setup(opts):
+    # enables the profiler from the --profile / --trace options, the results
+    # are written when the program exits
+    if not (opts.profile or opts.trace):
+        return
+    profiler.enable(trace=bool(opts.trace))
+
+    def report():
+        if opts.profile:
+            print(profiler.summary())
+        if opts.trace:
+            profiler.save_trace(opts.trace)
+            print(f"trace written to {opts.trace}")
+    atexit.register(report)
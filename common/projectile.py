@@ -0,0 +1,130 @@
+"""
+Exact solution of the projectile with linear drag (lab2/equations.md):
+
+    dvx/dt = -k vx,    dvy/dt = -k vy - g,    k = gamma/m
+
+    vx(t) = vx0 e^(-kt)
+    vy(t) = vy0 e^(-kt) - g phi(t)
+    x(t)  = x0 + vx0 phi(t)
+    y(t)  = y0 + vy0 phi(t) - g psi(t)
+
+with phi(t) = (1 - e^(-kt))/k and psi(t) = (t - phi(t))/k.  Both are
+evaluated without cancellation for small k*t (k = 0, no drag, included),
+and all functions take numpy arrays and broadcast them against each other,
+so whole tables of launches and times are evaluated in one call.
+"""
+
+import numpy as np
+
+GRAVITY = 9.8
+
+# below this k*t the series of phi and psi are used, their next terms are
+# O((kt)^4) ~ 1e-12 relative there, and the closed forms lose fewer than
+# four digits to cancellation above it
+SERIES = 1e-3
+
+def _phi(k, t):
+    kt = k * t
+    small = np.abs(kt) < SERIES
+    safe_k = np.where(small, 1.0, k)
+    exact = -np.expm1(-kt) / safe_k
+    series = t * (1 - kt/2 * (1 - kt/3 * (1 - kt/4)))
+    return np.where(small, series, exact)
+
+def _psi(k, t):
+    kt = k * t
+    small = np.abs(kt) < SERIES
+    safe_k = np.where(small, 1.0, k)
+    exact = (kt + np.expm1(-kt)) / safe_k**2
+    series = t*t * (0.5 - kt/6 * (1 - kt/4 * (1 - kt/5)))
+    return np.where(small, series, exact)
+
+def launch(speed, angle_degrees):
+    # initial velocity components, as in lab2's Simulation.setup
+    a = np.radians(angle_degrees)
+    return speed * np.cos(a), speed * np.sin(a)
+
+def state(t, x0, y0, vx0, vy0, k, g=GRAVITY):
+    # x, y, vx, vy at time(s) t after the launch
+    phi = _phi(k, t)
+    decay = np.exp(-np.multiply(k, t))
+    return (x0 + vx0*phi,
+            y0 + vy0*phi - g*_psi(k, t),
+            vx0*decay,
+            vy0*decay - g*phi)
+
+def position(t, x0, y0, vx0, vy0, k, g=GRAVITY):
+    phi = _phi(k, t)
+    return x0 + vx0*phi, y0 + vy0*phi - g*_psi(k, t)
+
+def apex_time(vy0, k, g=GRAVITY):
+    # when vy = 0 (0 for launches that go down), log1p(k vy0/g)/k
+    vy0 = np.maximum(vy0, 0.0)
+    u = k * vy0 / g
+    small = np.abs(u) < SERIES
+    safe_k = np.where(small, 1.0, k)
+    exact = np.log1p(u) / safe_k
+    series = vy0 / g * (1 - u/2 * (1 - 2*u/3))
+    return np.where(small, series, exact)
+
+def landing_time(y0, vy0, k, g=GRAVITY, ground=0.0, iterations=50, tol=1e-12):
+    """
+    Time at which y comes down to ground, by Newton's method.
+
+    Needs y0 >= ground and vy0 above the terminal velocity -g/k (always true
+    for launches from rest or upwards).  y(t) is then concave, and Newton
+    started past the root converges monotonically from the right, usually in
+    a handful of iterations.
+    """
+    y0, vy0, k = np.broadcast_arrays(np.asarray(y0, dtype=float),
+                                     np.asarray(vy0, dtype=float),
+                                     np.asarray(k, dtype=float))
+    h = y0 - ground
+    # drag free landing time, then moved past the apex and doubled until
+    # below ground, to be on the right of the root
+    t = (vy0 + np.sqrt(vy0*vy0 + 2*g*h)) / g
+    t = np.maximum(t, 2*apex_time(vy0, k, g))
+    t = np.where(t > 0, t, 1.0)
+    for _ in range(64):
+        above = position(t, 0., y0, 0., vy0, k, g)[1] > ground
+        if not above.any():
+            break
+        t = np.where(above, 2*t, t)
+
+    # already on the ground and not going up, Newton would only creep
+    # towards t = 0 (a double root for vy0 = 0)
+    grounded = (h <= 0) & (vy0 <= 0)
+    for _ in range(iterations):
+        _, y, _, vy = state(t, 0., y0, 0., vy0, k, g)
+        dt = (y - ground) / np.where(vy < 0, vy, -1.0)
+        t = t - dt
+        if np.all((np.abs(dt) <= tol * np.maximum(t, 1.0)) | grounded):
+            break
+    return np.where(grounded, 0.0, t)
+
+def time_at_distance(dx, vx0, k):
+    # Time to travel dx along x, inf where the drag stops the body first
+    # (x only ever gets to x0 + vx0/k) or it moves the other way.
+    dx, vx0, k = np.broadcast_arrays(np.asarray(dx, dtype=float), np.asarray(vx0, dtype=float),
+                                     np.asarray(k, dtype=float))
+    phi = dx / np.where(vx0 != 0, vx0, np.nan)
+    u = k * phi
+    small = np.abs(u) < SERIES
+    safe_k = np.where(small, 1.0, k)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        exact = -np.log1p(-u) / safe_k
+    series = phi * (1 + u/2 * (1 + 2*u/3))
+    t = np.where(small, series, exact)
+    return np.where((phi >= 0) & (u < 1), t, np.inf)
+
+def landing_range(speed, angle_degrees, k, g=GRAVITY):
+    # horizontal distance travelled back to the launch height, and the time
+    vx0, vy0 = launch(speed, angle_degrees)
+    t = landing_time(0.0, vy0, k, g)
+    return vx0 * _phi(k, t), t
+
+def error(times, xs, ys, x0, y0, vx0, vy0, k, g=GRAVITY):
+    # largest distance between a numerically integrated trajectory and the
+    # exact one at the same times
+    x, y = position(np.asarray(times, dtype=float), x0, y0, vx0, vy0, k, g)
+    return np.max(np.hypot(np.asarray(xs) - x, np.asarray(ys) - y))
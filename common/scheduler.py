@@ -0,0 +1,95 @@
+"""
+Fixed timestep loop scheduler.
+
+The physics always advances in steps of dt, however long a frame took.  Frame
+time is collected in an accumulator and as many steps are taken as fit in it,
+up to max_steps per frame so that a slow machine cannot fall further and
+further behind (the "spiral of death").  What is left over in the
+accumulator is used to interpolate between the last two physics states when
+drawing.
+
+With adaptive=True the time that does not fit in max_steps is not dropped,
+it is caught up with up to max_steps larger steps of at most max_dt instead.
+"""
+
+import numpy as np
+
+class FixedTimestep:
+
+    def __init__(self, dt, speed=1.0, max_steps=5, adaptive=False, max_dt=None):
+        self.dt = dt
+        self.speed = speed              # simulated seconds per real second
+        self.max_steps = max_steps
+        self.adaptive = adaptive
+        self.max_dt = max_dt if max_dt is not None else 4*dt
+        self.accumulator = 0.0
+        self.alpha = 0.0
+        self.dropped = 0.0              # simulated time given up to stay real time
+        self.previous = None
+        self.current = None
+
+    def set_dt(self, dt):
+        # a new physics step, e.g. after a drift downshift; the catch-up
+        # steps of adaptive mode keep their size relative to it
+        self.max_dt *= dt / self.dt
+        self.dt = dt
+
+    def reset(self, state=None):
+        # forgets the accumulated time, e.g. after a pause or a state change
+        self.accumulator = 0.0
+        self.alpha = 0.0
+        if state is not None:
+            self.previous = np.array(state, dtype=float)
+            self.current = self.previous.copy()
+
+    def advance(self, frame_time, step, snapshot=None):
+        # Calls step(dt) for the simulated time that has passed in frame_time
+        # seconds and returns the number of steps taken.  snapshot() should
+        # return the state to interpolate between.
+        self.accumulator += frame_time * self.speed
+
+        steps = 0
+        while self.accumulator >= self.dt and steps < self.max_steps:
+            self._step(step, self.dt, snapshot)
+            self.accumulator -= self.dt
+            steps += 1
+
+        if self.accumulator >= self.dt and self.adaptive:
+            # under load, catch up with fewer but larger steps
+            substeps = 0
+            while self.accumulator >= self.dt and substeps < self.max_steps:
+                h = min(self.max_dt, self.accumulator - self.accumulator % self.dt)
+                self._step(step, h, snapshot)
+                self.accumulator -= h
+                substeps += 1
+            steps += substeps
+
+        if self.accumulator >= self.dt:
+            # whatever is still left can not be caught up this frame
+            behind = self.accumulator - self.accumulator % self.dt
+            self.dropped += behind
+            self.accumulator -= behind
+
+        self.alpha = self.accumulator / self.dt
+        return steps
+
+    def _step(self, step, h, snapshot):
+        if snapshot is not None:
+            self.previous = np.array(snapshot(), dtype=float) if self.current is None else self.current
+        step(h)
+        if snapshot is not None:
+            self.current = np.array(snapshot(), dtype=float)
+
+    def interpolate(self):
+        # state to draw, between the last two physics states
+        if self.previous is None or self.current is None:
+            return self.current
+        return self.previous + self.alpha * (self.current - self.previous)
+
+def tick(clock, fps, headless=False):
+    # Seconds of real time the frame covers.  Headless runs do not wait for
+    # the clock, every frame counts as exactly 1/fps.
+    if headless:
+        clock.tick()
+        return 1.0 / fps
+    return clock.tick(fps) / 1000.0
@@ -0,0 +1,43 @@
+"""
+author: Syed Arham Naqvi
+SID: 100590852
+email: syedm.naqvi@ontariotechu.net
+
+The falling ball model of lab1.py, without pygame, so that it can be
+imported by batch jobs and benchmarks.
+"""
+
+class Simulation:
+    def __init__(self):
+        self.y = 0
+        self.vy = 0
+        self.mass = 0
+        self.g = -9.8 # gravity acts downwards
+        self.dt = 0.033 # 33 millisecond, which corresponds to 30 fps
+        self.cur_time = 0
+
+        self.paused = True # starting in paused mode
+
+    def setup(self, y, vy, mass):
+        self.y = y
+        self.vy = vy
+        self.mass = mass
+
+        self.times = [self.cur_time*1000]
+        self.positions = [self.y]
+        self.velocities = [self.vy]
+
+    def step(self):
+        self.y += self.vy
+        self.vy += (self.g * self.dt / self.mass)
+        self.cur_time += self.dt
+
+        self.times.append(self.cur_time * 1000)
+        self.positions.append(self.y)
+        self.velocities.append(self.vy)
+
+    def pause(self):
+        self.paused = True
+
+    def resume(self):
+        self.paused = False
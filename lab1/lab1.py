@@ -5,9 +5,17 @@ email: syedm.naqvi@ontariotechu.net
 """
 
 import pygame, sys, os
-import matplotlib.pyplot as plt
 import numpy as np
 
+from freefall import Simulation
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common import options, scheduler as frame_clock
+from common.profiling import profiler as prof
+from common.capture import FrameRecorder
+from common.scheduler import FixedTimestep
+from common.dirty import DirtyScreen
+
 # set up the colors
 BLACK = (0, 0, 0)
 WHITE = (255, 255, 255)
@@ -15,17 +23,13 @@ RED = (255, 0, 0)
 GREEN = (0, 255, 0)
 BLUE = (0, 0, 255)
 
-# clock object that ensure that animation has the same
-# on all machines, regardless of the actual machine speed.
-clock = pygame.time.Clock()
-
 def load_image(name):
     image = pygame.image.load(name)
     return image
 
-class MyCircle(pygame.sprite.Sprite):
+class MyCircle(pygame.sprite.DirtySprite):
     def __init__(self, color, width, height):
-        pygame.sprite.Sprite.__init__(self)
+        pygame.sprite.DirtySprite.__init__(self)
 
         self.image = pygame.Surface([width, height])
         self.rect = self.image.get_rect()
@@ -34,53 +38,31 @@ class MyCircle(pygame.sprite.Sprite):
         pygame.draw.circle(self.image, color, (width//2, height//2), r, 0)
         self.rect = self.image.get_rect()
 
+    def set_pos(self, x, y):
+        old = self.rect.topleft
+        self.rect.x = x
+        self.rect.y = y
+        if self.rect.topleft != old:
+            self.dirty = 1
+
     def update(self):
         pass
 
-class Simulation:
-    def __init__(self):
-        self.y = 0
-        self.vy = 0
-        self.mass = 0
-        self.g = -9.8 # gravity acts downwards
-        self.dt = 0.033 # 33 millisecond, which corresponds to 30 fps
-        self.cur_time = 0
-
-        self.paused = True # starting in paused mode
-
-    def setup(self, y, vy, mass):
-        self.y = y
-        self.vy = vy
-        self.mass = mass
-
-        self.times = [self.cur_time*1000]
-        self.positions = [self.y]
-        self.velocities = [self.vy]
-
-    def step(self):
-        self.y += self.vy
-        self.vy += (self.g * self.dt / self.mass)
-        self.cur_time += self.dt
-
-        self.times.append(self.cur_time * 1000)
-        self.positions.append(self.y)
-        self.velocities.append(self.vy)
-
-    def pause(self):
-        self.paused = True
-
-    def resume(self):
-        self.paused = False
-
 def sim_to_screen_y(win_height, y):
     '''flipping y, since we want our y to increase as we move up'''
     return win_height - y
 
 def main():
 
+    opts = options.parse('1D Ball in Free Fall')
+
     # initializing pygame
     pygame.init()
 
+    # clock object that ensure that animation has the same
+    # on all machines, regardless of the actual machine speed.
+    clock = pygame.time.Clock()
+
     # top left corner is (0,0) top right (640,0) bottom left (0,480)
     # and bottom right is (640,480).
     win_width = 640
@@ -93,6 +75,14 @@ def main():
     my_sprite = MyCircle(RED, 30, 30)
     my_group = pygame.sprite.Group(my_sprite)
 
+    # in dirty rect mode only the regions that changed are redrawn
+    if opts.dirty:
+        dirty_screen = DirtyScreen(screen, WHITE, [my_sprite])
+
+    recorder = None
+    if opts.record:
+        recorder = FrameRecorder(opts.record, screen.get_size(), fps=30)
+
     # setting up simulation
     if (os.path.exists("./ball_fall_data.txt")):
         
@@ -114,6 +104,18 @@ def main():
         sim = Simulation()
         sim.setup(460, 0, 1)
 
+    def step(dt):
+        # the scheduler asks for larger steps when catching up
+        base_dt = sim.dt
+        sim.dt = dt
+        sim.step()
+        sim.dt = base_dt
+
+    # physics runs in fixed steps of sim.dt in real time, independent of the frame rate
+    scheduler = FixedTimestep(sim.dt, adaptive=opts.adaptive)
+    if opts.headless:
+        sim.resume()
+
     print ('--------------------------------')
     print ('Usage:')
     print ('Press (r) to start/resume simulation')
@@ -122,16 +124,23 @@ def main():
     print ('Press (space) to step forward simulation when paused')
     print ('--------------------------------')
 
+    frame = 0
     while True:
         # 30 fps
-        clock.tick(30)
+        with prof.phase('clock.tick'):
+            frame_time = frame_clock.tick(clock, 30, opts.headless)
 
         # update sprite x, y position using values
-        # returned from the simulation
-        my_sprite.rect.x = win_width/2
-        my_sprite.rect.y = sim_to_screen_y(win_height, sim.y)
-
-        event = pygame.event.poll()
+        # returned from the simulation, interpolated between physics steps
+        with prof.phase('sprites'):
+            y = sim.y
+            if not sim.paused and scheduler.current is not None:
+                y = scheduler.interpolate()[0]
+            my_sprite.set_pos(win_width/2, sim_to_screen_y(win_height, y))
+            my_group.update()
+
+        with prof.phase('event.poll'):
+            event = pygame.event.poll()
         if event.type == pygame.QUIT:
             pygame.quit()
             sys.exit(0)
@@ -164,23 +173,45 @@ def main():
             pass
 
         # clear the background, and draw the sprites
-        screen.fill(WHITE)
-        my_group.update()
-        my_group.draw(screen)
-        pygame.display.flip()
+        if opts.dirty:
+            with prof.phase('draw'):
+                dirty_screen.begin()
+            with prof.phase('display'):
+                dirty_screen.end()
+        else:
+            with prof.phase('draw'):
+                screen.fill(WHITE)
+                my_group.draw(screen)
+            with prof.phase('display'):
+                pygame.display.flip()
+        if recorder:
+            with prof.phase('capture'):
+                recorder.capture(screen)
+        frame += 1
+
+        if opts.frames and frame >= opts.frames:
+            pygame.quit()
+            break
 
-        if sim_to_screen_y(win_height, sim.y) > win_height:
+        with prof.phase('collision'):
+            off_screen = sim_to_screen_y(win_height, sim.y) > win_height
+        if off_screen:
             if(os.path.exists("./ball_fall_data.txt")):
                 os.remove("./ball_fall_data.txt")
             pygame.quit()
             break
 
         # update simulation
-        if not sim.paused:
-            sim.step()
-        else:
-            if event.type == pygame.KEYDOWN and event.key == pygame.K_SPACE:
-                sim.step()
+        with prof.phase('integration'):
+            if not sim.paused:
+                scheduler.advance(frame_time, step, lambda: [sim.y])
+            else:
+                scheduler.reset([sim.y])
+                if event.type == pygame.KEYDOWN and event.key == pygame.K_SPACE:
+                    sim.step()
+
+    if recorder:
+        recorder.close()
 
     # Lets move our lists to numpy array
     # first row contains times, second row contains positions
@@ -189,6 +220,7 @@ def main():
     vel_vs_times = np.vstack([sim.times, sim.velocities])
 
     # Using matplotlib to plot simulation data
+    import matplotlib.pyplot as plt
     plt.figure(1)
     plt.plot(pos_vs_times[0,:], pos_vs_times[1,:])
     plt.xlabel('Time (ms)')
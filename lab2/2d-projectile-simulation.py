@@ -1,7 +1,13 @@
-import pygame, sys
-import matplotlib.pyplot as plt
-import numpy as np
-from scipy.integrate import ode
+import pygame, sys, os
+
+from projectile_sim import Simulation
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common import fixedstep, options, scheduler as frame_clock
+from common.capture import FrameRecorder
+from common.profiling import profiler as prof
+from common.dirty import DirtyScreen
+from common.scheduler import FixedTimestep
 
 # set up the colors
 BLACK = (0, 0, 0)
@@ -10,85 +16,28 @@ RED = (255, 0, 0)
 GREEN = (0, 255, 0)
 BLUE = (0, 0, 255)
 
-# clock object that ensure that animation has the same
-# on all machines, regardless of the actual machine speed.
-clock = pygame.time.Clock()
-
 def load_image(name):
     image = pygame.image.load(name)
     return image
 
-class MyCircle(pygame.sprite.Sprite):
+class MyCircle(pygame.sprite.DirtySprite):
     def __init__(self, color, width, height):
-        pygame.sprite.Sprite.__init__(self)
+        pygame.sprite.DirtySprite.__init__(self)
         self.image = pygame.Surface([width, height])
         self.rect = self.image.get_rect()
         self.image.fill(WHITE)
         pygame.draw.circle(self.image, color, (width//2, height//2), min(width,height)//2)
 
+    def set_pos(self, x, y):
+        old = self.rect.topleft
+        self.rect.x = x
+        self.rect.y = y
+        if self.rect.topleft != old:
+            self.dirty = 1
+
     def update(self):
         pass
 
-class Simulation:
-    def __init__(self):
-        
-        self.x = 0
-        self.vx = 0
-        self.y = 0
-        self.vy = 0
-        self.mass = 1
-        self.gamma = 0.0001
-        self.gravity = 9.8
-        self.dt = 0.033
-        self.curr_time = 0
-        
-        self.paused = False # starting in paused mode
-
-        self.solver = ode(self.f)
-        self.solver.set_integrator('dop853')
-        self.solver.set_f_params(self.gamma, self.gravity)
-
-    def f(self, t, state, arg1, arg2):
-        x, y, vx, vy = state
-        gam, grav = arg1, arg2
-        
-        dx = vx
-        dy = vy
-        dvx = (-gam/self.mass)*vx
-        dvy = (-gam/self.mass)*vy - grav
-        
-        return [dx, dy, dvx, dvy]
-        
-    def setup(self, speed, angle_degrees):
-        
-        self.vx = speed*np.cos(angle_degrees*(np.pi/180))
-        self.vy = speed*np.sin(angle_degrees*(np.pi/180))
-        self.solver.set_initial_value([self.x, self.y, self.vx, self.vy], self.curr_time)
-    
-        
-        self.trace_x = [self.x]
-        self.trace_y = [self.y]
-
-    def step(self):
-        self.curr_time += self.dt
-        if(self.solver.successful()):
-            self.solver.integrate(self.curr_time)
-            self.x = self.solver.y[0]
-            self.y = self.solver.y[1]
-            self.vx = self.solver.y[2]
-            self.vy = self.solver.y[3]
-        else:
-            print(f"Something went wrong during the integration at time {self.curr_time-self.dt}")
-
-        self.trace_x.append(self.x)
-        self.trace_y.append(self.y)
-
-    def pause(self):
-        self.paused = True
-
-    def resume(self):
-        self.paused = False
-
 def sim_to_screen(win_height, x, y):
     '''flipping y, since we want our y to increase as we move up'''
     x += 20
@@ -98,9 +47,19 @@ def sim_to_screen(win_height, x, y):
 
 def main():
 
+    def extra(parser):
+        parser.add_argument('--integrator', choices=('dop853',) + fixedstep.METHODS + ('analytic',), default='dop853',
+                            help="how the trajectory is computed, 'analytic' uses the exact solution (default: dop853)")
+
+    opts = options.parse('2D projectile motion', extra=extra)
+
     # initializing pygame
     pygame.init()
 
+    # clock object that ensure that animation has the same
+    # on all machines, regardless of the actual machine speed.
+    clock = pygame.time.Clock()
+
     # top left corner is (0,0)
     win_width = 640
     win_height = 640
@@ -112,6 +71,15 @@ def main():
     my_sprite = MyCircle(RED, 10, 10)
     my_group = pygame.sprite.Group(my_sprite)
 
+    # in dirty rect mode only the regions that changed are redrawn
+    if opts.dirty:
+        dirty_screen = DirtyScreen(screen, WHITE, [my_sprite])
+
+    recorder = None
+    if opts.record:
+        recorder = FrameRecorder(opts.record, screen.get_size(), fps=30)
+    frame = 0
+
     print('--------------------------------')
     print('Usage:')
     print('Press (r) to start/resume simulation')
@@ -123,18 +91,36 @@ def main():
     for angle in [15,30,45,60,75,90]:
         for speed in [50, 60, 70]:
             # setting up simulation
-            sim = Simulation()
+            sim = Simulation(opts.integrator)
             sim.setup(speed, angle)
 
+            def step(dt):
+                # the scheduler asks for larger steps when catching up
+                base_dt = sim.dt
+                sim.dt = dt
+                sim.step()
+                sim.dt = base_dt
+
+            # physics runs in fixed steps of sim.dt in real time, independent of the frame rate
+            scheduler = FixedTimestep(sim.dt, adaptive=opts.adaptive)
+            scheduler.reset([sim.x, sim.y])
+
             while True:
                 # 30 fps
-                clock.tick(30)
+                with prof.phase('clock.tick'):
+                    frame_time = frame_clock.tick(clock, 30, opts.headless)
 
                 # update sprite x, y position using values
-                # returned from the simulation
-                my_sprite.rect.x, my_sprite.rect.y = sim_to_screen(win_height, sim.x, sim.y)
-
-                event = pygame.event.poll()
+                # returned from the simulation, interpolated between physics steps
+                with prof.phase('sprites'):
+                    x, y = sim.x, sim.y
+                    if not sim.paused:
+                        x, y = scheduler.interpolate()
+                    my_sprite.set_pos(*sim_to_screen(win_height, x, y))
+                    my_group.update()
+
+                with prof.phase('event.poll'):
+                    event = pygame.event.poll()
                 if event.type == pygame.QUIT:
                     pygame.quit()
                     sys.exit(0)
@@ -154,21 +140,41 @@ def main():
                     pass
 
                 # clear the background, and draw the sprites
-                screen.fill(WHITE)
-                my_group.update()
-                my_group.draw(screen)
-                pygame.display.flip()
+                if opts.dirty:
+                    with prof.phase('draw'):
+                        dirty_screen.begin()
+                    with prof.phase('display'):
+                        dirty_screen.end()
+                else:
+                    with prof.phase('draw'):
+                        screen.fill(WHITE)
+                        my_group.draw(screen)
+                    with prof.phase('display'):
+                        pygame.display.flip()
+                if recorder:
+                    with prof.phase('capture'):
+                        recorder.capture(screen)
+                frame += 1
+
+                if opts.frames and frame >= opts.frames:
+                    pygame.quit()
+                    sys.exit(0)
 
-                if sim.y < 0:
+                with prof.phase('collision'):
+                    landed = sim.y < 0
+                if landed:
                     break
 
                 # update simulation
-                if not sim.paused:
-                    sim.step()
-                else:
-                    if event.type == pygame.KEYDOWN and event.key == pygame.K_SPACE:
-                        sim.step()
-
+                with prof.phase('integration'):
+                    if not sim.paused:
+                        scheduler.advance(frame_time, step, lambda: [sim.x, sim.y])
+                    else:
+                        scheduler.reset([sim.x, sim.y])
+                        if event.type == pygame.KEYDOWN and event.key == pygame.K_SPACE:
+                            sim.step()
+
+            # import matplotlib.pyplot as plt
             # plt.figure(1)
             # plt.plot(sim.trace_x, sim.trace_y)
             # plt.xlabel('x')
@@ -177,9 +183,12 @@ def main():
             # plt.title('2D projectile trajectory')
             # plt.show()
 
-            print(f"angle = {angle}, speed = {speed}, r = {sim.trace_x[-1]}")
+            print(f"angle = {angle}, speed = {speed}, r = {sim.trace_x[-1]}, exact r = {sim.exact_range()}, "
+                  f"max error = {sim.error():.3e}")
 
     print()
+    if recorder:
+        recorder.close()
     pygame.quit()
     sys.exit()
 
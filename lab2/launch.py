@@ -0,0 +1,122 @@
+"""
+Launch angles for the lab2 projectile model (linear drag), solved for whole
+batches of speeds and drag coefficients at once:
+
+    max_range(speed, k)             angle that throws the furthest
+    hit(speed, k, distance)         low and high angle that land at distance
+    min_time(speed, k, distance)    fastest angle to distance, and its time
+
+k = gamma/m.  The arguments broadcast against each other.  Every trajectory
+is evaluated with the exact solution in common/projectile.py.  The range
+rises up to the best angle and falls after it, so both the best angle and
+the angles for a given distance are found by bracketed root finding.
+
+    python launch.py --speed 50 60 70 --gamma 0.0001 --distance 200
+"""
+
+import argparse
+import os
+import sys
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common import projectile
+
+def flight_range(speed, angle_degrees, k, g=projectile.GRAVITY):
+    return projectile.landing_range(speed, angle_degrees, k, g)[0]
+
+def flight_time(speed, angle_degrees, k, g=projectile.GRAVITY):
+    # nan for nan angles (out of reach)
+    vx0, vy0 = projectile.launch(speed, np.nan_to_num(angle_degrees))
+    t = projectile.landing_time(0., vy0, k, g)
+    return np.where(np.isnan(angle_degrees), np.nan, t)
+
+def illinois(f, lo, hi, tol=1e-10, iterations=100):
+    """
+    Root of f in [lo, hi] (elementwise, f(lo) and f(hi) of opposite sign)
+    by regula falsi with the Illinois modification: the root stays
+    bracketed like with bisection, but it converges superlinearly.
+    """
+    flo, fhi = f(lo), f(hi)
+    x = lo
+    side = np.zeros(np.shape(lo))   # which end moved last, +1 lo, -1 hi
+    for _ in range(iterations):
+        denom = fhi - flo
+        flat = denom == 0
+        x_new = np.where(flat, (lo + hi)/2, (lo*fhi - hi*flo) / np.where(flat, 1, denom))
+        fx = f(x_new)
+        move_lo = np.sign(fx) == np.sign(flo)
+        # an end that stays put twice in a row gets its value halved
+        fhi = np.where(move_lo & (side > 0), fhi/2, fhi)
+        flo = np.where(~move_lo & (side < 0), flo/2, flo)
+        lo, flo = np.where(move_lo, x_new, lo), np.where(move_lo, fx, flo)
+        hi, fhi = np.where(move_lo, hi, x_new), np.where(move_lo, fhi, fx)
+        side = np.where(move_lo, 1, -1)
+        done = np.abs(x_new - x) <= tol
+        x = x_new
+        if done.all():
+            break
+    return x
+
+def max_range(speed, k, g=projectile.GRAVITY):
+    """
+    Angle of the largest range and the range.  The range is largest when
+    the velocity at landing is perpendicular to the launch velocity,
+    sin(a) vy(T) + cos(a) vx(T) = 0, which is positive at 0 degrees and
+    negative at 90 and is solved for the angle a by root finding.
+    """
+    speed, k = np.broadcast_arrays(np.asarray(speed, dtype=float), np.asarray(k, dtype=float))
+
+    def perpendicular(angle):
+        vx0, vy0 = projectile.launch(speed, angle)
+        t = projectile.landing_time(0., vy0, k, g)
+        _, _, vx, vy = projectile.state(t, 0., 0., vx0, vy0, k, g)
+        a = np.radians(angle)
+        return np.sin(a)*vy + np.cos(a)*vx
+
+    angle = illinois(perpendicular, np.zeros(speed.shape), np.full(speed.shape, 90.))
+    return angle, flight_range(speed, angle, k, g)
+
+def hit(speed, k, distance, g=projectile.GRAVITY):
+    """
+    The low and the high angle that land at distance, nan where the distance
+    is out of reach.  Both are bracketed by the angle of the largest range.
+    """
+    speed, k, distance = np.broadcast_arrays(np.asarray(speed, dtype=float), np.asarray(k, dtype=float),
+                                             np.asarray(distance, dtype=float))
+    best, reach = max_range(speed, k, g)
+    f = lambda angle: flight_range(speed, angle, k, g) - distance
+    low = illinois(f, np.zeros(speed.shape), best)
+    high = illinois(f, best, np.full(speed.shape, 90.))
+    out_of_reach = distance > reach
+    low[out_of_reach] = np.nan
+    high[out_of_reach] = np.nan
+    return low, high
+
+def min_time(speed, k, distance, g=projectile.GRAVITY):
+    # The flight time grows with the angle, so the low angle is the fastest
+    low, _ = hit(speed, k, distance, g)
+    return low, flight_time(speed, low, k, g)
+
+def main():
+    parser = argparse.ArgumentParser(description='Firing table of the projectile with linear drag')
+    parser.add_argument('--speed', type=float, nargs='+', default=[50, 60, 70])
+    parser.add_argument('--gamma', type=float, nargs='+', default=[0.0001])
+    parser.add_argument('--mass', type=float, default=1.)
+    parser.add_argument('--distance', type=float, help='also solve for the angles that hit this distance')
+    opts = parser.parse_args()
+
+    speed, gamma = np.meshgrid(opts.speed, opts.gamma, indexing='ij')
+    k = gamma / opts.mass
+    best, reach = max_range(speed, k)
+    if opts.distance is not None:
+        low, high = hit(speed, k, opts.distance)
+        time = flight_time(speed, low, k)
+    for i in np.ndindex(speed.shape):
+        line = f"speed = {speed[i]}, gamma = {gamma[i]}, best angle = {best[i]:.4f}, r = {reach[i]:.4f}"
+        if opts.distance is not None:
+            line += f", hit {opts.distance} at {low[i]:.4f} or {high[i]:.4f} (fastest {time[i]:.4f} s)"
+        print(line)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""
+The projectile model of 2d-projectile-simulation.py, without pygame, so
+that it can be imported by batch jobs and benchmarks.
+"""
+
+import os
+import sys
+import numpy as np
+from scipy.integrate import ode
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common import fixedstep, projectile
+
+class Simulation:
+    def __init__(self, integrator='dop853'):
+        
+        self.x = 0
+        self.vx = 0
+        self.y = 0
+        self.vy = 0
+        self.mass = 1
+        self.gamma = 0.0001
+        self.gravity = 9.8
+        self.dt = 0.033
+        self.curr_time = 0
+        
+        self.paused = False # starting in paused mode
+
+        self.solver = None
+        self.stepper = None
+        self.analytic = integrator == 'analytic'
+        self.launch_time = 0
+        if self.analytic:
+            # exact solution of the model (common/projectile.py), no integration
+            pass
+        elif integrator == 'dop853':
+            self.solver = ode(self.f)
+            self.solver.set_integrator('dop853')
+            self.solver.set_f_params(self.gamma, self.gravity)
+        else:
+            # allocation free fixed step path ('euler', 'rk2' or 'rk4')
+            self.state = np.zeros(4)
+            self.stepper = fixedstep.FixedStepper(self.f_into, 4, integrator, params=(self.gamma, self.gravity))
+
+    def f(self, t, state, arg1, arg2):
+        return self.f_into(t, state, np.empty(4), arg1, arg2)
+
+    def f_into(self, t, state, out, arg1, arg2):
+        vx = state[2]
+        vy = state[3]
+        gam, grav = arg1, arg2
+        
+        out[0] = vx
+        out[1] = vy
+        out[2] = (-gam/self.mass)*vx
+        out[3] = (-gam/self.mass)*vy - grav
+        
+        return out
+        
+    def setup(self, speed, angle_degrees):
+        
+        self.vx = speed*np.cos(angle_degrees*(np.pi/180))
+        self.vy = speed*np.sin(angle_degrees*(np.pi/180))
+        self.launch = (self.x, self.y, self.vx, self.vy)
+        self.launch_time = self.curr_time
+        if self.analytic:
+            pass
+        elif self.stepper is not None:
+            self.state[:] = [self.x, self.y, self.vx, self.vy]
+        else:
+            self.solver.set_initial_value([self.x, self.y, self.vx, self.vy], self.curr_time)
+    
+        
+        self.trace_x = [self.x]
+        self.trace_y = [self.y]
+        self.trace_t = [self.curr_time]
+
+    def step(self):
+        self.curr_time += self.dt
+        if self.analytic:
+            self.x, self.y, self.vx, self.vy = projectile.state(self.curr_time - self.launch_time, *self.launch,
+                                                                self.gamma/self.mass, self.gravity)
+        elif self.stepper is not None:
+            self.stepper.step(self.curr_time - self.dt, self.state, self.dt)
+            self.x, self.y, self.vx, self.vy = self.state
+        elif(self.solver.successful()):
+            self.solver.integrate(self.curr_time)
+            self.x = self.solver.y[0]
+            self.y = self.solver.y[1]
+            self.vx = self.solver.y[2]
+            self.vy = self.solver.y[3]
+        else:
+            print(f"Something went wrong during the integration at time {self.curr_time-self.dt}")
+
+        self.trace_x.append(self.x)
+        self.trace_y.append(self.y)
+        self.trace_t.append(self.curr_time)
+
+    def pause(self):
+        self.paused = True
+
+    def resume(self):
+        self.paused = False
+
+    def exact_range(self):
+        # where the exact trajectory comes back to the launch height
+        x0, y0, vx0, vy0 = self.launch
+        k = self.gamma/self.mass
+        t = projectile.landing_time(0., vy0, k, self.gravity)
+        return float(projectile.position(t, x0, y0, vx0, vy0, k, self.gravity)[0])
+
+    def error(self):
+        # largest distance of the traced trajectory from the exact one
+        times = np.array(self.trace_t) - self.launch_time
+        return projectile.error(times, self.trace_x, self.trace_y, *self.launch,
+                                self.gamma/self.mass, self.gravity)
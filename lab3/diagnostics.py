@@ -0,0 +1,124 @@
+"""
+Orbit diagnostics that are updated one state at a time, so long runs can
+report how stable the orbit is without keeping the whole trajectory around.
+"""
+
+import math
+
+
+class OrbitDiagnostics:
+    """
+    Tracks the relative orbit of one body around another.
+
+    mu is G*(m1 + m2). Call update() with the time and the position and
+    velocity of the orbiting body relative to the central one after every
+    step (or every output sample). Everything kept is a fixed number of
+    floats, memory does not grow with the length of the run.
+    """
+
+    def __init__(self, mu):
+        self.mu = mu
+        self.n = 0
+
+        # running distance statistics
+        self.r_min = math.inf
+        self.r_max = -math.inf
+        self.r_mean = 0.
+
+        # apsides, found where the radial velocity changes sign
+        self.periapsis = math.inf
+        self.apoapsis = -math.inf
+        self.last_periapsis = None
+        self.last_apoapsis = None
+        self.prev_rdot = None
+
+        # period from upward crossings of y = 0 (relative to the central body)
+        self.prev_t = None
+        self.prev_y = None
+        self.last_crossing = None
+        self.crossings = 0
+        self.period = None        # last measured period
+        self.period_mean = 0.
+        self.period_min = math.inf
+        self.period_max = -math.inf
+
+        # osculating elements of the latest state
+        self.energy = None
+        self.h = None
+        self.a = None
+        self.e = None
+        self.omega = None         # argument of periapsis [rad]
+
+    def update(self, t, pos, vel):
+        x, y = float(pos[0]), float(pos[1])
+        vx, vy = float(vel[0]), float(vel[1])
+        r = math.hypot(x, y)
+
+        self.n += 1
+        self.r_min = min(self.r_min, r)
+        self.r_max = max(self.r_max, r)
+        self.r_mean += (r - self.r_mean) / self.n
+
+        rdot = (x*vx + y*vy) / r
+        if self.prev_rdot is not None:
+            if self.prev_rdot < 0 <= rdot:
+                self.last_periapsis = r
+                self.periapsis = min(self.periapsis, r)
+            elif self.prev_rdot > 0 >= rdot:
+                self.last_apoapsis = r
+                self.apoapsis = max(self.apoapsis, r)
+        self.prev_rdot = rdot
+
+        if self.prev_y is not None and self.prev_y < 0 <= y:
+            # linear interpolation of the crossing time between the samples
+            tc = self.prev_t + (t - self.prev_t) * (-self.prev_y) / (y - self.prev_y)
+            if self.last_crossing is not None:
+                self.period = tc - self.last_crossing
+                self.crossings += 1
+                self.period_mean += (self.period - self.period_mean) / self.crossings
+                self.period_min = min(self.period_min, self.period)
+                self.period_max = max(self.period_max, self.period)
+            self.last_crossing = tc
+        self.prev_t = t
+        self.prev_y = y
+
+        self.elements(x, y, vx, vy, r)
+
+    def elements(self, x, y, vx, vy, r):
+        # osculating two body elements from a single state
+        mu = self.mu
+        v2 = vx*vx + vy*vy
+        h = x*vy - y*vx
+        self.energy = 0.5*v2 - mu/r
+        self.h = h
+        self.a = -mu / (2*self.energy) if self.energy != 0 else math.inf
+        # eccentricity vector
+        ex = (vy*h)/mu - x/r
+        ey = -(vx*h)/mu - y/r
+        self.e = math.hypot(ex, ey)
+        self.omega = math.atan2(ey, ex)
+
+    def stability(self):
+        # relative spreads, 0 for a perfectly repeating orbit
+        out = {}
+        if self.n:
+            out['distance spread'] = (self.r_max - self.r_min) / self.r_mean
+        if self.crossings > 1:
+            out['period spread'] = (self.period_max - self.period_min) / self.period_mean
+        return out
+
+    def report(self):
+        if self.n == 0:
+            return 'no samples'
+        lines = [f'samples {self.n}',
+                 f'distance min {self.r_min:.6g} max {self.r_max:.6g} mean {self.r_mean:.6g}']
+        if self.last_periapsis is not None:
+            lines.append(f'periapsis {self.last_periapsis:.6g} (lowest {self.periapsis:.6g})')
+        if self.last_apoapsis is not None:
+            lines.append(f'apoapsis {self.last_apoapsis:.6g} (highest {self.apoapsis:.6g})')
+        if self.crossings:
+            lines.append(f'period {self.period:.6g} s (mean {self.period_mean:.6g} over {self.crossings} orbits)')
+        lines.append(f'a {self.a:.6g} e {self.e:.6g} omega {math.degrees(self.omega):.3f} deg energy {self.energy:.6g}')
+        for k, v in self.stability().items():
+            lines.append(f'{k} {v:.3e}')
+        return '\n'.join(lines)
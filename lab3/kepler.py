@@ -0,0 +1,216 @@
+"""
+Two-body (Kepler) motion in universal variables.
+
+propagate() moves relative states r0, v0 (shape (..., 2)) of pairs with
+gravitational parameter mu = G*(m1 + m2) on by dt, exactly, whatever the
+orbit: ellipse, parabola or hyperbola, and however close the pericentre.
+Everything broadcasts, so one call handles many pairs, many times, or both.
+
+TwoBody puts the two bodies back around their centre of mass, for a pair
+(or many) set up like the earth and the moon of orbits.py:
+
+    orbit = TwoBody.from_bodies(earth, moon)           # after setup()
+    pos1, vel1, pos2, vel2 = orbit.states(t)           # any array of times
+
+Each call costs the same whatever t is, there are no steps to take.
+"""
+
+import math
+
+import numpy as np
+
+def stumpff(z):
+    # Stumpff functions C(z) and S(z), with their series near z = 0 where
+    # the closed forms lose all their digits
+    z = np.asarray(z, dtype=float)
+    c = np.empty_like(z)
+    s = np.empty_like(z)
+    pos = z > 1e-6
+    neg = z < -1e-6
+    small = ~(pos | neg)
+    sz = np.sqrt(z[pos])
+    c[pos] = (1 - np.cos(sz)) / z[pos]
+    s[pos] = (sz - np.sin(sz)) / sz**3
+    sz = np.sqrt(-z[neg])
+    c[neg] = (np.cosh(sz) - 1) / -z[neg]
+    s[neg] = (np.sinh(sz) - sz) / sz**3
+    zs = z[small]
+    c[small] = 1/2 - zs/24 + zs*zs/720
+    s[small] = 1/6 - zs/120 + zs*zs/5040
+    return c, s
+
+def hyperbolic_guess(rn, rv, alpha, mu, dt):
+    # Vallado's first guess of chi on a hyperbola (alpha < 0), from the
+    # asymptotic growth of the orbit; rv is r.v
+    a = 1/alpha
+    sign = np.sign(dt)
+    return sign*np.sqrt(-a)*np.log(-2*mu*alpha*dt / (rv + sign*np.sqrt(-mu*a)*(1 - rn*alpha)))
+
+def propagate(r0, v0, mu, dt, tol=1e-13, max_iter=50):
+    """
+    State (r, v) of the relative orbits r0, v0 after dt.  The universal
+    anomaly chi is solved for with Laguerre-Conway iterations, from a
+    first guess that suits the kind of orbit; RuntimeError if they do not
+    converge in max_iter iterations.
+    """
+    r0 = np.asarray(r0, dtype=float)
+    v0 = np.asarray(v0, dtype=float)
+    mu = np.asarray(mu, dtype=float)
+    dt = np.asarray(dt, dtype=float)
+
+    rn = np.sqrt((r0*r0).sum(axis=-1))
+    sigma = (r0*v0).sum(axis=-1) / np.sqrt(mu)        # r.v / sqrt(mu)
+    alpha = 2/rn - (v0*v0).sum(axis=-1)/mu            # 1/a, < 0 for hyperbolae
+    rn, sigma, alpha, mu, dt = np.broadcast_arrays(rn, sigma, alpha, mu, dt)
+
+    # whole periods of the ellipses change nothing, and make the solve harder
+    with np.errstate(invalid='ignore', divide='ignore'):
+        period = np.where(alpha > 0, 2*np.pi / np.sqrt(mu * np.abs(alpha)**3), np.inf)
+    dt = np.where(np.isfinite(period), np.fmod(dt, period), dt)
+
+    sqmu = np.sqrt(mu)
+    chi = np.where(alpha > 0, sqmu * alpha * dt, sqmu * dt / rn)
+    # On open orbits chi grows only like cbrt(dt) (parabola) or log(dt)
+    # (hyperbola), and the guess above, which grows like dt, takes many
+    # iterations on long steps or overflows cosh(); the smallest of the
+    # three instead (short steps keep the one above).
+    with np.errstate(invalid='ignore', divide='ignore'):
+        hyp = hyperbolic_guess(rn, sigma*sqmu, alpha, mu, dt)
+        hyp = np.where(hyp*dt > 0, np.abs(hyp), np.inf)
+        guess = np.sign(dt) * np.minimum(np.minimum(np.abs(chi), np.cbrt(6*sqmu*np.abs(dt))), hyp)
+    chi = np.where(alpha > 0, chi, guess)
+    n = 5
+    for _ in range(max_iter):
+        z = alpha * chi*chi
+        c, s = stumpff(z)
+        f = sigma*chi*chi*c + (1 - alpha*rn)*chi**3*s + rn*chi - sqmu*dt
+        df = sigma*chi*(1 - z*s) + (1 - alpha*rn)*chi*chi*c + rn
+        ddf = sigma*(1 - z*c) + (1 - alpha*rn)*chi*(1 - z*s)
+        root = np.sqrt(np.abs((n - 1)**2*df*df - n*(n - 1)*f*ddf))
+        step = n*f / (df + np.copysign(root, df))
+        chi = chi - step
+        if np.all(np.abs(step) <= tol * np.maximum(np.abs(chi), 1e-300)):
+            break
+    else:
+        raise RuntimeError(f"Kepler's equation did not converge in {max_iter} iterations")
+
+    z = alpha * chi*chi
+    c, s = stumpff(z)
+    f = (1 - chi*chi/rn*c)[..., None]
+    g = (dt - chi**3/sqmu*s)[..., None]
+    r = f*r0 + g*v0
+    r1 = np.sqrt((r*r).sum(axis=-1))
+    fdot = (sqmu / (r1*rn) * (z*s - 1) * chi)[..., None]
+    gdot = (1 - chi*chi/r1*c)[..., None]
+    v = fdot*r0 + gdot*v0
+    return r, v
+
+def stumpff1(z):
+    # stumpff() for a single float
+    if z > 1e-6:
+        sz = math.sqrt(z)
+        return (1 - math.cos(sz)) / z, (sz - math.sin(sz)) / (sz*z)
+    if z < -1e-6:
+        sz = math.sqrt(-z)
+        return (math.cosh(sz) - 1) / -z, (math.sinh(sz) - sz) / (-sz*z)
+    return 1/2 - z/24 + z*z/720, 1/6 - z/120 + z*z/5040
+
+def propagate1(x, y, vx, vy, mu, dt, tol=1e-13, max_iter=50):
+    # propagate() for a single pair and time in plain floats, a dozen
+    # times faster than numpy for one value
+    rn = math.sqrt(x*x + y*y)
+    sqmu = math.sqrt(mu)
+    sigma = (x*vx + y*vy) / sqmu
+    alpha = 2/rn - (vx*vx + vy*vy)/mu
+    if alpha > 0:
+        dt = math.fmod(dt, 2*math.pi / math.sqrt(mu * alpha**3))
+        chi = sqmu * alpha * dt
+    else:
+        sign = math.copysign(1., dt)
+        chi = sign * min(abs(sqmu * dt / rn), (6*sqmu*abs(dt))**(1/3))
+        if alpha < 0 and dt != 0:
+            a = 1/alpha
+            arg = -2*mu*alpha*dt / (x*vx + y*vy + sign*math.sqrt(-mu*a)*(1 - rn*alpha))
+            if arg > 1:
+                chi = sign * min(abs(chi), math.sqrt(-a)*math.log(arg))
+    beta = 1 - alpha*rn
+    for _ in range(max_iter):
+        z = alpha * chi*chi
+        c, s = stumpff1(z)
+        f = sigma*chi*chi*c + beta*chi**3*s + rn*chi - sqmu*dt
+        df = sigma*chi*(1 - z*s) + beta*chi*chi*c + rn
+        ddf = sigma*(1 - z*c) + beta*chi*(1 - z*s)
+        root = math.sqrt(abs(16*df*df - 20*f*ddf))
+        step = 5*f / (df + math.copysign(root, df))
+        chi -= step
+        if abs(step) <= tol * max(abs(chi), 1e-300):
+            break
+    else:
+        raise RuntimeError(f"Kepler's equation did not converge in {max_iter} iterations")
+    z = alpha * chi*chi
+    c, s = stumpff1(z)
+    f = 1 - chi*chi/rn*c
+    g = dt - chi**3/sqmu*s
+    rx, ry = f*x + g*vx, f*y + g*vy
+    r1 = math.sqrt(rx*rx + ry*ry)
+    fdot = sqmu / (r1*rn) * (z*s - 1) * chi
+    gdot = 1 - chi*chi/r1*c
+    return rx, ry, fdot*x + gdot*vx, fdot*y + gdot*vy
+
+class TwoBody:
+    """
+    Two bodies of masses m1, m2 at pos1, pos2 with velocities vel1, vel2
+    at time t0.  The masses may be arrays of k independent pairs, with
+    (k, 2) positions and velocities; states(t) then gives (..., k, 2) arrays
+    for times of shape (...).
+    """
+
+    def __init__(self, m1, m2, pos1, vel1, pos2, vel2, G, t0=0.):
+        m1 = np.asarray(m1, dtype=float)[..., None]
+        m2 = np.asarray(m2, dtype=float)[..., None]
+        pos1, vel1, pos2, vel2 = (np.asarray(a, dtype=float) for a in (pos1, vel1, pos2, vel2))
+        m = m1 + m2
+        self.w1 = m1 / m            # share of each body in the centre of mass
+        self.w2 = m2 / m
+        self.mu = G * m[..., 0]
+        self.com = self.w1*pos1 + self.w2*pos2
+        self.com_vel = self.w1*vel1 + self.w2*vel2
+        self.r0 = pos2 - pos1
+        self.v0 = vel2 - vel1
+        self.t0 = t0
+        if self.mu.ndim == 0:
+            # the same for the plain float path of states()
+            self.scalar = (*self.r0.tolist(), *self.v0.tolist(), float(self.mu),
+                           float(self.w1[0]), float(self.w2[0]), *self.com.tolist(), *self.com_vel.tolist())
+
+    @classmethod
+    def from_bodies(cls, body1, body2, t0=0.):
+        # nbody.Body (or HeavenlyBody) objects, as they are after setup()
+        return cls(body1.mass, body2.mass, body1.pos, body1.vel, body2.pos, body2.vel, body1.G, t0)
+
+    def period(self):
+        # inf for orbits that are not closed
+        alpha = 2/np.sqrt((self.r0**2).sum(axis=-1)) - (self.v0**2).sum(axis=-1)/self.mu
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(alpha > 0, 2*np.pi / np.sqrt(self.mu * np.abs(alpha)**3), np.inf)
+
+    def states(self, t):
+        # pos1, vel1, pos2, vel2 at times t
+        if np.ndim(t) == 0 and self.mu.ndim == 0:
+            return self.state1(float(t))
+        dt = np.asarray(t, dtype=float) - self.t0
+        dt = dt.reshape(dt.shape + (1,)*self.mu.ndim)     # times first, then pairs
+        r, v = propagate(self.r0, self.v0, self.mu, dt)
+        com = self.com + dt[..., None]*self.com_vel
+        return (com - self.w2*r, self.com_vel - self.w2*v,
+                com + self.w1*r, self.com_vel + self.w1*v)
+
+    def state1(self, t):
+        # states() at a single time of a single pair
+        x, y, vx, vy, mu, w1, w2, cx, cy, cvx, cvy = self.scalar
+        dt = t - self.t0
+        rx, ry, rvx, rvy = propagate1(x, y, vx, vy, mu, dt)
+        cx += dt*cvx
+        cy += dt*cvy
+        return (np.array([cx - w2*rx, cy - w2*ry]), np.array([cvx - w2*rvx, cvy - w2*rvy]),
+                np.array([cx + w1*rx, cy + w1*ry]), np.array([cvx + w1*rvx, cvy + w1*rvy]))
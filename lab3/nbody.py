@@ -0,0 +1,467 @@
+"""
+author: Syed Arham Naqvi
+email: syedm.naqvi@ontariotechu.net
+license: BSD
+
+The gravity model of orbits.py, without pygame, so that it can be
+imported by batch jobs and benchmarks.  orbits.py adds the sprites.
+"""
+
+import argparse
+import os
+import sys
+import numpy as np
+from scipy.integrate import ode
+
+import kepler
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common import fixedstep, invariants, multirate, precision
+from common.profiling import profiler as prof
+
+# constants
+G = 6.674e-11 # N kg-2 m^2
+Earth_Mass = 5.972e24 # kg
+Moon_Mass = 7.34767309e22 # kg
+Distance = 384400000. # m
+
+def accelerations(pos, gm, policy=precision.FLOAT64, out=None, rows=None, softening=0.):
+    # Gravity on every body from all the others, pos (n, 2) and gm = G*m.
+    # The pair terms are computed in the dtype of pos, the sums over the
+    # other bodies are accumulated as the policy says.  x and y are kept
+    # apart, the (n, n) pair arrays are then contiguous along the sums.
+    # With rows, only on those bodies (out is then (len(rows), 2)).
+    # softening > 0 is the length of Plummer softening, r^2 becomes
+    # r^2 + softening^2 and the force stays finite as r goes to 0.
+    x, y = pos[:, 0], pos[:, 1]
+    if rows is None:
+        rows = slice(None)
+    dx = x[None, :] - x[rows, None]     # dx[i, j] = x_j - x_i
+    dy = y[None, :] - y[rows, None]
+    r2 = dx*dx + dy*dy
+    if softening:
+        r2 += softening*softening
+    r2[np.arange(len(r2)), np.arange(len(x))[rows]] = np.inf
+    w = gm / (r2 * np.sqrt(r2))
+    if out is None:
+        out = np.empty((len(r2), 2), dtype=policy.accumulator)
+    policy.sum(np.multiply(w, dx, out=dx), axis=1, out=out[:, 0])
+    policy.sum(np.multiply(w, dy, out=dy), axis=1, out=out[:, 1])
+    return out
+
+def timescales(pos, masses, softening=0., pairs=(), vel=None):
+    # Time over which the motion of each body changes: the shortest
+    # sqrt(r^3 / (G m_j)) over the others, the orbital time at that distance
+    # around body j.  A light moon close to a heavy planet is fast, the
+    # planet it hardly moves is not.  With vel, bodies heading for each
+    # other also count the time r / v_r until they meet, so that a flyby is
+    # seen coming before it happens.  The partners of regularized pairs do
+    # not count, their orbit is not integrated step by step.
+    pos = np.asarray(pos, dtype=float)
+    d = pos[None, :, :] - pos[:, None, :]
+    r2 = (d**2).sum(axis=2) + softening*softening
+    np.fill_diagonal(r2, np.inf)
+    for i, j in pairs:
+        r2[i, j] = r2[j, i] = np.inf
+    tau = r2**1.5 / (G * np.asarray(masses, dtype=float))[None, :]
+    if vel is not None:
+        vel = np.asarray(vel, dtype=float)
+        approach = -(d * (vel[None, :, :] - vel[:, None, :])).sum(axis=2)    # r v_r
+        with np.errstate(divide='ignore', invalid='ignore'):
+            meet = np.where(approach > 0, r2 / approach, np.inf)
+        tau = np.minimum(tau, meet**2)
+    return np.sqrt(tau.min(axis=1))
+
+def close_pairs(pos, vel, masses, dt=None, perturbation=1e-2):
+    """
+    Tight binaries and close flybys worth regularizing, as (i, j) pairs:
+    mutual nearest neighbours for which the tidal pull of the nearest third
+    body across the pair is below perturbation times their own attraction.
+    The pair is as wide as it gets over the next dt (from the Kepler
+    solution), or over its whole orbit without dt.
+    """
+    pos = np.asarray(pos, dtype=float)
+    vel = np.asarray(vel, dtype=float)
+    masses = np.asarray(masses, dtype=float)
+    if len(masses) < 2:
+        return []
+    d = pos[None, :, :] - pos[:, None, :]
+    r2 = (d**2).sum(axis=2)
+    np.fill_diagonal(r2, np.inf)
+    nearest = np.argmin(r2, axis=1)
+    pairs = []
+    for i, j in enumerate(nearest.tolist()):
+        if i > j or nearest[j] != i:
+            continue
+        mu = G * (masses[i] + masses[j])
+        r = np.sqrt(r2[i, j])
+        dv = vel[j] - vel[i]
+        energy = 0.5*(dv**2).sum() - mu/r
+        apocentre = -mu/energy if energy < 0 else np.inf      # at most 2a
+        if dt is None:
+            size = max(r, apocentre) if energy < 0 else r
+        else:
+            period = 2*np.pi*np.sqrt((apocentre/2)**3/mu) if energy < 0 else np.inf
+            r_end = np.sqrt((kepler.propagate(pos[j] - pos[i], dv, mu, dt)[0]**2).sum())
+            size = max(r, r_end) if dt < period/2 else apocentre
+        # the nearest third body, from the centre of mass of the pair
+        com = (masses[i]*pos[i] + masses[j]*pos[j]) / (masses[i] + masses[j])
+        dk = ((pos - com)**2).sum(axis=1)
+        dk[[i, j]] = np.inf
+        k = np.argmin(dk)
+        if len(masses) == 2 or 2*G*masses[k]*size / dk[k]**1.5 < perturbation * mu / size**2:
+            pairs.append((i, j))
+    return pairs
+
+class Body:
+    
+    def __init__(self, name, mass, integrator='dop853', softening=0.):
+        self.pos = np.array([0,0])
+        self.vel = np.array([0,0])
+        self.mass = mass
+        self.name = name
+        self.G = G
+        self.softening = softening  # Plummer softening length, see accelerations()
+        self.distances = []
+        self.xpos = []
+        self.ypos = []
+        self.yvel = []
+        self.solver = None
+        self.stepper = None
+        if integrator == 'dop853':
+            self.solver = ode(f=self.dSdt)
+            self.solver.set_integrator('dop853')
+        else:
+            # allocation free fixed step path ('euler', 'rk2' or 'rk4'),
+            # the force is held constant over the step like with dop853
+            self.t = 0
+            self.state = np.zeros(4)
+            self.force = np.zeros(2)
+            self.stepper = fixedstep.FixedStepper(self.dSdt_into, 4, integrator, params=(self.force,))
+    
+    def dSdt(self, t, state, F):
+        return self.dSdt_into(t, state, np.empty(4), F)
+
+    def dSdt_into(self, t, state, out, F):
+        
+        out[0] = state[2]
+        out[1] = state[3]
+        out[2] = F[0]/self.mass
+        out[3] = F[1]/self.mass
+        
+        return out
+
+    def setup(self, pos=[0,0], vel=[0,0]):
+        self.pos = np.array(pos)
+        self.vel = np.array(vel)
+        if self.stepper is not None:
+            self.t = 0
+            self.state[:] = [self.pos[0], self.pos[1], self.vel[0], self.vel[1]]
+        else:
+            self.solver.set_initial_value([self.pos[0], self.pos[1], self.vel[0], self.vel[1]], 0)
+
+    def update1(self, objects, t):
+        
+        for o in objects:
+            if o != self.name:
+                other = objects[o]
+
+                d = (other.pos - self.pos)
+                r = np.linalg.norm(d)
+                s2 = r*r + self.softening**2
+                f = d * G * self.mass * other.mass / (s2 * np.sqrt(s2))
+
+                if False: # Set this to True to print the following values
+                    print ('Force on', self.name, ' from', other.name, '=', f)
+                    print ('Mass-1', self.mass, 'mass-2', other.mass)
+                    print ('G', self.G)
+                    print ('Distance', r)
+                    print ('Vel', self.vel)
+
+                if self.stepper is not None:
+                    self.force[:] = f
+                    self.stepper.step(self.t, self.state, t - self.t)
+                    self.t = t
+                    self.pos[0] = self.state[0]
+                    self.pos[1] = self.state[1]
+                    self.vel[0] = self.state[2]
+                    self.vel[1] = self.state[3]
+                elif(self.solver.successful()):
+                    self.solver.set_f_params(f)
+                    self.solver.integrate(t)
+                    self.pos[0] = self.solver.y[0]
+                    self.pos[1] = self.solver.y[1]
+                    self.vel[0] = self.solver.y[2]
+                    self.vel[1] = self.solver.y[3]
+                else:
+                    print(f"Something went wrong during the integration at time {t}")
+
+                self.record(r)
+
+    def record(self, r):
+        # keeps the values that are plotted at the end of the run
+        if self.name == 'earth':
+            self.distances.append(r)
+            self.xpos.append(self.pos[0])
+            self.ypos.append(self.pos[1])
+            self.yvel.append(self.vel[1])
+
+class Universe:
+    def __init__(self):
+        self.objects_dict = {}
+        self.dt = 2
+        self.curr_time = 0
+        self.solver = None  # integrates all the bodies together, see advance()
+        self.softening = 0. # used by advance(), see accelerations()
+        self.orbit = None   # the exact two-body orbit, see use_kepler()
+
+    def add_body(self, body):
+        self.objects_dict[body.name] = body
+
+    def positions(self):
+        return np.array([b.pos for b in self.objects_dict.values()], dtype=float)
+
+    def use_kepler(self):
+        # From now on the bodies are moved along the exact solution instead
+        # of being integrated, for a universe of two unsoftened bodies.
+        bodies = list(self.objects_dict.values())
+        if len(bodies) != 2:
+            raise ValueError(f"the Kepler solution is for two bodies, the universe has {len(bodies)}")
+        if self.softening or any(b.softening for b in bodies):
+            raise ValueError("the Kepler solution is for unsoftened gravity, set the softening to 0")
+        self.orbit = kepler.TwoBody.from_bodies(*bodies, t0=self.curr_time)
+
+    def place_exact(self):
+        bodies = list(self.objects_dict.values())
+        with prof.phase('integration'):
+            pos1, vel1, pos2, vel2 = self.orbit.states(self.curr_time)
+        bodies[0].pos, bodies[0].vel = pos1, vel1
+        bodies[1].pos, bodies[1].vel = pos2, vel2
+        for b in bodies:
+            for other in bodies:
+                if other is not b:
+                    b.record(np.linalg.norm(other.pos - b.pos))
+
+    def update(self):
+        self.curr_time += self.dt
+        if self.orbit is not None:
+            self.place_exact()
+            return
+        for o in self.objects_dict:
+            # Compute positions for screen
+            obj = self.objects_dict[o]
+            with prof.phase('integration'):
+                obj.update1(self.objects_dict, self.curr_time)
+
+    def dSdt(self, t, state, masses):
+        # all bodies at once, state holds x, y, vx, vy of each body
+        s = state.reshape(-1, 4)
+        rate = np.empty_like(s)
+        rate[:, 0:2] = s[:, 2:4]
+        accelerations(s[:, 0:2], G*masses, out=rate[:, 2:4], softening=self.softening)
+        return rate.ravel()
+
+    def advance(self, interval, rtol=1e-10):
+        # Moves every body forward by interval seconds with a single call to
+        # the integrator, which picks its own (adaptive) steps in between.
+        # Unlike update() the bodies are integrated together, so the forces
+        # are not frozen over a step.
+        if self.orbit is not None:
+            self.curr_time += interval
+            self.place_exact()
+            return
+        bodies = list(self.objects_dict.values())
+        if self.solver is None:
+            state = np.array([[b.pos[0], b.pos[1], b.vel[0], b.vel[1]] for b in bodies], dtype=float)
+            self.solver = ode(self.dSdt)
+            self.solver.set_integrator('dop853', rtol=rtol, atol=1e-6, nsteps=1000000)
+            self.solver.set_f_params(np.array([b.mass for b in bodies], dtype=float))
+            self.solver.set_initial_value(state.ravel(), self.curr_time)
+
+        self.curr_time += interval
+        with prof.phase('integration'):
+            self.solver.integrate(self.curr_time)
+        if not self.solver.successful():
+            print(f"Something went wrong during the integration at time {self.curr_time}")
+
+        state = self.solver.y.reshape(-1, 4)
+        for i, b in enumerate(bodies):
+            b.pos = state[i, 0:2].copy()
+            b.vel = state[i, 2:4].copy()
+        for b in bodies:
+            for other in bodies:
+                if other is not b:
+                    b.record(np.linalg.norm(other.pos - b.pos))
+
+    def invariants(self):
+        # total energy, momentum and angular momentum of all the bodies
+        bodies = list(self.objects_dict.values())
+        return invariants.nbody([b.pos for b in bodies], [b.vel for b in bodies],
+                                [b.mass for b in bodies], G, self.softening)
+
+class Cluster:
+    """
+    Many bodies stepped together with a fixed step method ('euler', 'rk2'
+    or 'rk4'), the state of all of them in one (n, 4) array of x, y, vx, vy
+    stored in the dtype of the precision policy.
+
+    method='multirate' gives every body a step of its own instead (block
+    timesteps, common/multirate.py): the bodies are grouped by timescales()
+    at the start, the step passed to step() is that of the slowest group and
+    each faster group takes ratio times as many.  groups (slowest first)
+    overrides the grouping.  With eta the bodies are grouped again before
+    every step, each on the largest step of at most eta times its
+    timescale (but no more than max_levels levels below dt), so only the
+    bodies in a close encounter take small steps, and only while it lasts.
+
+    softening is the Plummer softening length of the forces.  regularize
+    takes tight binaries and close flybys (see close_pairs()) out of the
+    step by step integration: the two bodies move with their centre of
+    mass and feel everybody else, their orbit around each other is followed
+    exactly with the Kepler solution (kepler.py), half a step before and
+    half a step after.  The pairs are found anew before every step, and
+    attract each other unsoftened.
+    """
+
+    def __init__(self, pos, vel, masses, method='rk4', policy='float64', groups=None, ratio=2,
+                 eta=None, max_levels=8, softening=0., regularize=False):
+        self.policy = precision.get(policy)
+        n = len(masses)
+        self.state = self.policy.zeros((n, 4))
+        self.state[:, 0:2] = pos
+        self.state[:, 2:4] = vel
+        self.masses = np.array(masses, dtype=float)
+        self.gm = self.policy.array(G * self.masses)
+        self.t = 0.0
+        self.eta = eta
+        self.max_levels = max_levels
+        self.softening = softening
+        self.regularize = regularize
+        self.pairs = []
+        # per body: the pull of the partner taken out of the forces, and the
+        # velocity of the pair's centre of mass, for the regularized pairs
+        self.mutual = np.zeros((n, 2))
+        self.com_vel = np.zeros((n, 2))
+        if method == 'multirate':
+            if groups is None:
+                groups = multirate.levels(timescales(pos, masses, softening, vel=vel), ratio, max_levels)
+            self.stepper = multirate.Multirate(self.f_into, self.state.shape, groups, ratio, dtype=self.policy.dtype)
+        else:
+            self.stepper = fixedstep.FixedStepper(self.f_into, self.state.shape, method, dtype=self.policy.dtype)
+
+    def f_into(self, t, state, out, rows=None):
+        if rows is None:
+            out[:, 0:2] = state[:, 2:4]
+            accelerations(state[:, 0:2], self.gm, self.policy, out=out[:, 2:4], softening=self.softening)
+            rows = slice(None)
+        else:
+            # only the bodies in rows, for the multirate groups
+            out[rows, 0:2] = state[rows, 2:4]
+            out[rows, 2:4] = accelerations(state[:, 0:2], self.gm, self.policy, rows=rows,
+                                           softening=self.softening)
+        if self.pairs:
+            self.pair_terms(state)
+            paired = self.paired[rows]
+            out[rows, 0:2] = np.where(paired[:, None], self.com_vel[rows], out[rows, 0:2])
+            out[rows, 2:4] -= self.mutual[rows]
+        return out
+
+    def pair_terms(self, state):
+        # the pull of each partner (as accelerations() has it) and the
+        # velocity of the centre of mass of each pair
+        i, j = self.pair_index
+        d = state[j, 0:2] - state[i, 0:2]
+        r2 = (d*d).sum(axis=1) + self.softening*self.softening
+        w = 1 / (r2 * np.sqrt(r2))
+        self.mutual[i] = (self.gm[j] * w)[:, None] * d
+        self.mutual[j] = -(self.gm[i] * w)[:, None] * d
+        m_i, m_j = self.masses[i, None], self.masses[j, None]
+        v = (m_i*state[i, 2:4] + m_j*state[j, 2:4]) / (m_i + m_j)
+        self.com_vel[i] = v
+        self.com_vel[j] = v
+
+    def kepler_drift(self, dt):
+        # the regularized pairs around their centres of mass, exactly
+        i, j = self.pair_index
+        s = self.state
+        m_i, m_j = self.masses[i, None], self.masses[j, None]
+        m = m_i + m_j
+        com = (m_i*s[i, 0:2] + m_j*s[j, 0:2]) / m
+        com_vel = (m_i*s[i, 2:4] + m_j*s[j, 2:4]) / m
+        r, v = kepler.propagate(s[j, 0:2] - s[i, 0:2], s[j, 2:4] - s[i, 2:4], G*m[:, 0], dt)
+        s[i, 0:2] = com - m_j/m*r
+        s[j, 0:2] = com + m_i/m*r
+        s[i, 2:4] = com_vel - m_j/m*v
+        s[j, 2:4] = com_vel + m_i/m*v
+
+    def step(self, dt):
+        if self.regularize:
+            self.pairs = close_pairs(self.state[:, 0:2], self.state[:, 2:4], self.masses, dt)
+            self.pair_index = np.array(self.pairs, dtype=np.intp).reshape(-1, 2).T
+            self.paired = np.zeros(len(self.masses), dtype=bool)
+            self.paired[self.pair_index.ravel()] = True
+            self.mutual[:] = 0
+        if self.eta is not None and isinstance(self.stepper, multirate.Multirate):
+            tau = timescales(self.state[:, 0:2], self.masses, self.softening, self.pairs, self.state[:, 2:4])
+            self.stepper.set_groups(multirate.levels_for_step(tau, dt, self.eta, self.stepper.ratio,
+                                                              self.max_levels))
+        if self.pairs:
+            self.kepler_drift(dt/2)
+        self.stepper.step(self.t, self.state, dt)
+        if self.pairs:
+            self.kepler_drift(dt/2)
+        self.t += dt
+
+    def invariants(self):
+        # in float64, whatever the policy
+        return invariants.nbody(self.state[:, 0:2], self.state[:, 2:4], self.masses, G, self.softening)
+
+def disk(n, seed=0):
+    # n moons on circular orbits around an earth, between 0.5 and 1.5
+    # earth-moon distances, as initial conditions for a Cluster
+    rng = np.random.default_rng(seed)
+    r = Distance * rng.uniform(0.5, 1.5, n)
+    a = rng.uniform(0, 2*np.pi, n)
+    v = np.sqrt(G*Earth_Mass / r)
+    pos = np.zeros((n + 1, 2))
+    vel = np.zeros((n + 1, 2))
+    pos[1:] = np.stack([r*np.cos(a), r*np.sin(a)], axis=1)
+    vel[1:] = np.stack([-v*np.sin(a), v*np.cos(a)], axis=1)
+    masses = np.concatenate([[Earth_Mass], np.full(n, Moon_Mass / n)])
+    return pos, vel, masses
+
+def ball(n, seed=0):
+    # n equal bodies of 1e26 kg thrown together within about 1e9 m, with
+    # random velocities of about half the virial speed: a dense cluster full
+    # of close encounters, as initial conditions for a Cluster
+    rng = np.random.default_rng(seed)
+    R, M = 1e9, 1e26
+    sigma = np.sqrt(G*M*n / R) / 2
+    return rng.normal(0, R, (n, 2)), rng.normal(0, sigma, (n, 2)), np.full(n, M)
+
+def main():
+    # error of a single precision run against the same run in double precision
+    parser = argparse.ArgumentParser(description='Precision report of a batched n-body run')
+    parser.add_argument('--bodies', type=int, default=200)
+    parser.add_argument('--steps', type=int, default=20)
+    parser.add_argument('--dt', type=float, default=600., help='step in seconds')
+    parser.add_argument('--method', choices=fixedstep.METHODS, default='rk4')
+    parser.add_argument('--precision', choices=tuple(precision.POLICIES), default='float32')
+    opts = parser.parse_args()
+
+    pos, vel, masses = disk(opts.bodies)
+    run = Cluster(pos, vel, masses, opts.method, opts.precision)
+    reference = Cluster(pos, vel, masses, opts.method, 'float64')
+    report = precision.ErrorReport(run.policy, run.state.nbytes)
+    # close encounters amplify any difference, the rounding errors included,
+    # so over long runs the error grows well past the rounding error
+    for _ in range(opts.steps):
+        run.step(opts.dt)
+        reference.step(opts.dt)
+        report.update('position', run.state[:, 0:2], reference.state[:, 0:2])
+        report.update('velocity', run.state[:, 2:4], reference.state[:, 2:4])
+    report.update('energy', run.invariants()[0][0], reference.invariants()[0][0])
+    print(report.report())
+
+if __name__ == '__main__':
+    main()
@@ -8,14 +8,25 @@ license: BSD
 # The need to use initial velocity [0, 1000] to achieve a decent orbit.  
 # They can check if the orbit is stable by plotting the distance between the moon and the earth over time. 
 
+import math
+import os
 import pygame
 import sys
-import matplotlib.pyplot as plt
 import numpy as np
-from scipy.integrate import ode
 import random
 from datetime import datetime
 
+import nbody
+from nbody import G, Earth_Mass, Moon_Mass, Distance
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common import invariants, options
+from common.capture import FrameRecorder
+from common.profiling import profiler as prof
+from common.dirty import DirtyScreen
+from common.pointsprites import PointRenderer
+from diagnostics import OrbitDiagnostics
+
 # set up the colors
 BLACK = (0, 0, 0)
 WHITE = (255, 255, 255)
@@ -23,26 +34,16 @@ RED = (255, 0, 0)
 GREEN = (0, 255, 0)
 BLUE = (0, 0, 255)
 
-# constants
-G = 6.674e-11 # N kg-2 m^2
-Earth_Mass = 5.972e24 # kg
-Moon_Mass = 7.34767309e22 # kg
-Distance = 384400000. # m
-
-
-# clock object that ensure that animation has the same speed
-# on all machines, regardless of the actual machine speed.
-clock = pygame.time.Clock()
-
 # in case we need to load an image
 def load_image(name):
     image = pygame.image.load(name)
     return image
 
-class HeavenlyBody(pygame.sprite.Sprite):
+class HeavenlyBody(nbody.Body, pygame.sprite.DirtySprite):
     
-    def __init__(self, name, mass, color=WHITE, radius=0, imagefile=None):
-        pygame.sprite.Sprite.__init__(self)
+    def __init__(self, name, mass, color=WHITE, radius=0, imagefile=None, integrator='dop853', softening=0.):
+        pygame.sprite.DirtySprite.__init__(self)
+        nbody.Body.__init__(self, name, mass, integrator, softening)
 
         if imagefile:
             self.image = load_image(imagefile)
@@ -52,91 +53,44 @@ class HeavenlyBody(pygame.sprite.Sprite):
             pygame.draw.circle(self.image, color, (radius, radius), radius)
 
         self.rect = self.image.get_rect()
-        self.pos = np.array([0,0])
-        self.vel = np.array([0,0])
-        self.mass = mass
+        self.color = color
         self.radius = radius
-        self.name = name
-        self.G = G
-        self.distances = []
-        self.xpos = []
-        self.ypos = []
-        self.yvel = []
-        self.solver = ode(f=self.dSdt)
-        self.solver.set_integrator('dop853')
-    
-    def dSdt(self, t, state, F):
-        
-        x, y, vx, vy = state
-        fgx, fgy = F
-        
-        dx = vx
-        dy = vy
-        dvx = fgx/self.mass
-        dvy = fgy/self.mass
-        
-        return [dx, dy, dvx, dvy]
-
-    def setup(self, pos=[0,0], vel=[0,0]):
-        self.pos = np.array(pos)
-        self.vel = np.array(vel)
-        self.solver.set_initial_value([self.pos[0], self.pos[1], self.vel[0], self.vel[1]], 0)
-
-    def update1(self, objects, t):
-        
-        for o in objects:
-            if o != self.name:
-                other = objects[o]
-
-                d = (other.pos - self.pos)
-                r = np.linalg.norm(d)
-                u = d / r
-                f = u * G * self.mass * other.mass / (r*r)
-
-                if False: # Set this to True to print the following values
-                    print ('Force on', self.name, ' from', other.name, '=', f)
-                    print ('Mass-1', self.mass, 'mass-2', other.mass)
-                    print ('G', self.G)
-                    print ('Distance', r)
-                    print ('Vel', self.vel)
-
-                if(self.solver.successful()):
-                    self.solver.set_f_params(f)
-                    self.solver.integrate(t)
-                    self.pos[0] = self.solver.y[0]
-                    self.pos[1] = self.solver.y[1]
-                    self.vel[0] = self.solver.y[2]
-                    self.vel[1] = self.solver.y[3]
-                else:
-                    print(f"Something went wrong during the integration at time {t}")
-
-                if self.name == 'earth':
-                    self.distances.append(r)
-                    self.xpos.append(self.pos[0])
-                    self.ypos.append(self.pos[1])
-                    self.yvel.append(self.vel[1])
-
-class Universe:
+
+class Universe(nbody.Universe):
     def __init__(self):
+        nbody.Universe.__init__(self)
         self.w, self.h = 2.6*Distance, 2.6*Distance 
-        self.objects_dict = {}
         self.objects = pygame.sprite.Group()
-        self.dt = 2
-        self.curr_time = 0
 
     def add_body(self, body):
-        self.objects_dict[body.name] = body
+        nbody.Universe.add_body(self, body)
         self.objects.add(body)
 
     def to_screen(self, pos):
         return [int((pos[0] + 1.3*Distance)*640//self.w), int((pos[1] + 1.3*Distance)*640.//self.h)]
 
+    def to_screen_array(self, pos):
+        # to_screen for an (n, 2) array of positions
+        pos = np.asarray(pos, dtype=float)
+        out = np.empty(pos.shape, dtype=np.intp)
+        out[:, 0] = (pos[:, 0] + 1.3*Distance)*640//self.w
+        out[:, 1] = (pos[:, 1] + 1.3*Distance)*640.//self.h
+        return out
+
+    def colors(self):
+        return np.array([b.color for b in self.objects_dict.values()], dtype=np.uint8)
+
     def update(self):
-        self.curr_time += self.dt
+        nbody.Universe.update(self)
+        self.place_sprites()
+
+    def advance(self, interval, rtol=1e-10):
+        nbody.Universe.advance(self, interval, rtol)
+        self.place_sprites()
+
+    def place_sprites(self):
         for o in self.objects_dict:
-            # Compute positions for screen
             obj = self.objects_dict[o]
-            obj.update1(self.objects_dict, self.curr_time)
             p = self.to_screen(obj.pos)
 
             if False: # Set this to True to print the following values
@@ -145,14 +99,31 @@ class Universe:
                 print ('Position on screen', p)
 
             # Update sprite locations
-            obj.rect.x, obj.rect.y = p[0]-obj.radius, p[1]-obj.radius
-        self.objects.update()
+            if (obj.rect.x, obj.rect.y) != (p[0]-obj.radius, p[1]-obj.radius):
+                obj.rect.x, obj.rect.y = p[0]-obj.radius, p[1]-obj.radius
+                obj.dirty = 1
+        with prof.phase('sprites'):
+            self.objects.update()
 
     def draw(self, screen):
         self.objects.draw(screen)
 
 def main():
 
+    def extra(parser):
+        parser.add_argument('--output-every', type=float, default=0, metavar='SECONDS',
+                            help='integrate in intervals of this many simulated seconds, sampling and '
+                                 'drawing only at the end of each (default: dt = 2 s steps)')
+        parser.add_argument('--points', action='store_true',
+                            help='draw the bodies as points with fading trails instead of sprites')
+        parser.add_argument('--softening', type=float, default=0, metavar='METERS',
+                            help='Plummer softening length of gravity, keeps close approaches finite (default 0)')
+        parser.add_argument('--kepler', action='store_true',
+                            help='move the earth and the moon along the exact two-body orbit instead of integrating')
+
+    opts = options.parse('Heavenly Bodies', extra=extra)
+    if opts.kepler and opts.softening:
+        sys.exit('--kepler follows the exact orbit of unsoftened gravity, it can not be used with --softening')
     print ('Press q to quit')
 
     random.seed(0)
@@ -166,24 +137,75 @@ def main():
 
     # Create a Universe object, which will hold our heavenly bodies (planets, stars, moons, etc.)
     universe = Universe()
+    universe.softening = opts.softening
 
-    earth = HeavenlyBody('earth', Earth_Mass, radius=32, imagefile='earth-northpole.jpg')
+    earth = HeavenlyBody('earth', Earth_Mass, BLUE, radius=32, imagefile='earth-northpole.jpg',
+                         softening=opts.softening)
     earth.setup(vel=[0, -np.sqrt(G*Moon_Mass/Distance)])
-    moon = HeavenlyBody('moon', Moon_Mass, WHITE, radius=10)
+    moon = HeavenlyBody('moon', Moon_Mass, WHITE, radius=10, softening=opts.softening)
     moon.setup([int(Distance), 0], [0, np.sqrt(G*Earth_Mass/Distance)])
 
     universe.add_body(earth)
     universe.add_body(moon)
-
-    total_frames = 1000000
+    if opts.kepler:
+        universe.use_kepler()
+
+    # live stability metrics of the moon's orbit around the earth
+    diagnostics = OrbitDiagnostics(G*(Earth_Mass + Moon_Mass))
+
+    # drift of the conserved quantities, e.g. to find the largest safe dt
+    monitor = None
+    if opts.drift is not None:
+        monitor = invariants.DriftMonitor(universe.invariants, invariants.NBODY,
+                                          opts.drift or None, opts.on_drift)
+        monitor.reset()
+
+    def diagnose():
+        with prof.phase('diagnostics'):
+            diagnostics.update(universe.curr_time, moon.pos - earth.pos, moon.vel - earth.vel)
+            if monitor and not monitor.check() and opts.on_drift == 'downshift':
+                # only the fixed dt loop has a dt to shift, advance() is adaptive
+                universe.dt = monitor.downshift(universe.dt)
+
+    # in dirty rect mode only the regions that changed are redrawn
+    if opts.dirty:
+        dirty_screen = DirtyScreen(screen, BLACK, universe.objects.sprites())
+
+    # or, for many bodies, all of them written into the screen at once
+    if opts.points:
+        points = PointRenderer(screen, size=3, fade=0.98, background=BLACK)
+
+    recorder = None
+    if opts.record:
+        recorder = FrameRecorder(opts.record, screen.get_size(), fps=30)
+
+    total_frames = opts.frames or 1000000
     iter_per_frame = 500
 
-    frame = 0
-    while frame < total_frames:
-        if False:
-            print ('Frame number', frame)        
-
-        event = pygame.event.poll()
+    def draw():
+        if opts.points:
+            with prof.phase('draw'):
+                points.draw(universe.to_screen_array(universe.positions()), universe.colors())
+            with prof.phase('display'):
+                pygame.display.flip()
+        elif opts.dirty:
+            with prof.phase('draw'):
+                dirty_screen.begin()
+            with prof.phase('display'):
+                dirty_screen.end()
+        else:
+            with prof.phase('draw'):
+                screen.fill(BLACK) # clear the background
+                universe.draw(screen)
+            with prof.phase('display'):
+                pygame.display.flip()
+        if recorder:
+            with prof.phase('capture'):
+                recorder.capture(screen)
+
+    def poll():
+        with prof.phase('event.poll'):
+            event = pygame.event.poll()
         if event.type == pygame.QUIT:
             pygame.quit()
             sys.exit(0)
@@ -193,27 +215,57 @@ def main():
         else:
             pass
 
-        universe.update()
-        if frame % iter_per_frame == 0:
-            screen.fill(BLACK) # clear the background
-            universe.draw(screen)
-            pygame.display.flip()
-        if frame % 500000 == 0:
-            print(f"{(frame/total_frames)*100}% complete")
-        frame += 1
-
+    if opts.output_every:
+        # same physical run (total_frames steps of dt), but the integrator
+        # covers output_every seconds per call and everything else
+        # (diagnostics, drawing) only happens once per interval
+        # (the last interval is cut short where the run ends)
+        duration = total_frames * universe.dt
+        samples = math.ceil(duration / opts.output_every)
+        for sample in range(samples):
+            poll()
+            universe.advance(min(opts.output_every, duration - sample*opts.output_every))
+            diagnose()
+            draw()
+            if sample % max(1, samples // 2) == 0:
+                print(f"{(sample/samples)*100}% complete")
+                print(diagnostics.report())
+    else:
+        frame = 0
+        while frame < total_frames:
+            if False:
+                print ('Frame number', frame)        
+
+            poll()
+
+            universe.update()
+            diagnose()
+            if frame % iter_per_frame == 0:
+                draw()
+            if frame % 500000 == 0:
+                print(f"{(frame/total_frames)*100}% complete")
+                print(diagnostics.report())
+            frame += 1
+
+    if recorder:
+        recorder.close()
     pygame.quit()
 
+    print(diagnostics.report())
+    if monitor:
+        print(monitor.report())
+
+    import matplotlib.pyplot as plt
     plt.figure(1)
     plt.plot(earth.distances)
-    plt.xlabel('frame')
+    plt.xlabel('sample' if opts.output_every else 'frame')
     plt.ylabel('distance')
     plt.title('Distance between the earth and the moon')
     plt.show()
     
     plt.figure(1)
     plt.plot(earth.xpos)
-    plt.xlabel('frame')
+    plt.xlabel('sample' if opts.output_every else 'frame')
     plt.ylabel('x position')
     plt.title('Wobble of the Earth along x axis')
     plt.show()
@@ -0,0 +1,183 @@
+"""
+The two mass spring model of double-mass-spring-system.py, without
+pygame, so that it can be imported by batch jobs and benchmarks.
+"""
+
+import os
+import sys
+import math
+import numpy as np
+from scipy.integrate import ode
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common import fixedstep, invariants, multirate
+
+# --------------------- Simulation Parameters ---------------------
+MASS1 = 1.0
+MASS2 = 10.0
+K1 = 10.0
+K2 = 50.0
+C1 = 0.2
+C2 = 0.2
+REST_LENGTH1 = 10.0
+REST_LENGTH2 = 10.0
+GRAVITY = 9.81
+DT = 0.02
+
+# --------------------- Simulation Class --------------------------
+class Simulation:
+
+    def __init__(self, init_state, integrator="dop853"):
+        # State: [x1, y1, x2, y2, vx1, vy1, vx2, vy2]
+        self.state = init_state[:]
+        self.t = 0.0
+        self.params = (MASS1, MASS2, K1, K2, C1, C2, REST_LENGTH1, REST_LENGTH2)
+        self.dissipated = 0.0  # energy taken out by the dampers so far
+        self.solver = None
+        self.stepper = None
+        if integrator == "dop853":
+            self.solver = ode(self.f)
+            self.solver.set_integrator("dop853")
+            self.solver.set_initial_value(self.state, self.t)
+            self.solver.set_f_params(self.params)
+        elif integrator == "multirate":
+            # mass 1 on its stiff springs takes two steps for every one of
+            # mass 2, see timescales().  More accurate than rk4 at the same
+            # dt, but with two masses the bookkeeping costs more than the
+            # evaluations it saves
+            self.state = np.array(init_state, dtype=np.float64)
+            groups = multirate.levels(self.timescales())
+            self.stepper = multirate.Multirate(self.f_into, 8, groups, params=(self.params,))
+        else:
+            # allocation free fixed step path ("euler", "rk2" or "rk4")
+            self.state = np.array(init_state, dtype=np.float64)
+            self.stepper = fixedstep.FixedStepper(self.f_into, 8, integrator, params=(self.params,))
+
+    def f(self, t, state, params):
+        return self.f_into(t, state, np.empty(8), params)
+
+    def timescales(self):
+        # period / 2 pi of each mass on its springs with the other held,
+        # per component of the state
+        m1, m2, k1, k2 = self.params[:4]
+        t1 = math.sqrt(m1 / (k1 + k2))
+        t2 = math.sqrt(m2 / k2)
+        return [t1, t1, t2, t2, t1, t1, t2, t2]
+
+    def f_into(self, t, state, out, params, rows=None):
+        # rows (for the multirate steps) is ignored, the two masses share
+        # spring 2 and both cost about as much as one
+
+        m1, m2, k1, k2, c1, c2, L1, L2 = params
+        x1 = state[0]
+        y1 = state[1]
+        x2 = state[2]
+        y2 = state[3]
+        vx1 = state[4]
+        vy1 = state[5]
+        vx2 = state[6]
+        vy2 = state[7]
+
+        # --- Spring 1: Origin to Mass 1 ---
+        dx1, dy1 = x1, y1
+        r1 = math.sqrt(dx1**2 + dy1**2)  # avoid division by zero
+        deform1 = r1 - L1
+        # unit components in direction of spring1 forces
+        ux1, uy1 = dx1 / r1, dy1 / r1 
+        # Spring force and damping on mass1 from spring1:
+        Fx1_spring = -k1 * deform1 * ux1
+        Fy1_spring = -k1 * deform1 * uy1
+        Fx1_damp = -c1 * vx1
+        Fy1_damp = -c1 * vy1
+        F1_origin_x = Fx1_spring + Fx1_damp
+        F1_origin_y = Fy1_spring + Fy1_damp
+
+        # --- Spring 2: Mass 1 to Mass 2 ---
+        dx2 = x2 - x1
+        dy2 = y2 - y1
+        r2 = math.sqrt(dx2**2 + dy2**2)
+        deform2 = r2 - L2
+        # unit components in direction of spring2 forces
+        ux2, uy2 = dx2 / r2, dy2 / r2 
+        # relative velocity between mass 1 and 2
+        rvx = vx2 - vx1
+        rvy = vy2 - vy1
+        Fx2_spring = -k2 * deform2 * ux2
+        Fy2_spring = -k2 * deform2 * uy2
+        Fx2_damp = -c2 * rvx
+        Fy2_damp = -c2 * rvy
+        F2_total_x = Fx2_spring + Fx2_damp
+        F2_total_y = Fy2_spring + Fy2_damp
+
+        # Force on mass1 from spring2 is the negative of that on mass2:
+        F1_mass2_x = -F2_total_x
+        F1_mass2_y = -F2_total_y
+
+        # --- Net Forces on Mass 1 and Mass 2 ---
+        Fx1_total = F1_origin_x + F1_mass2_x
+        Fy1_total = F1_origin_y + F1_mass2_y
+        Fx2_total = F2_total_x
+        Fy2_total = F2_total_y
+
+        # Add gravitational effects to both masses (positive-y is upwards)
+        ay1_gravity = -GRAVITY
+        ay2_gravity = -GRAVITY
+
+        # Accelerations (F = m * a)
+        ax1 = Fx1_total / m1
+        ay1 = Fy1_total / m1 + ay1_gravity
+        ax2 = Fx2_total / m2
+        ay2 = Fy2_total / m2 + ay2_gravity
+
+        out[0] = vx1
+        out[1] = vy1
+        out[2] = vx2
+        out[3] = vy2
+        out[4] = ax1
+        out[5] = ay1
+        out[6] = ax2
+        out[7] = ay2
+
+        return out
+
+
+    def update(self, dt):
+        power = self.damping_power()
+        if self.stepper is not None:
+            self.stepper.step(self.t, self.state, dt)
+            self.t += dt
+        elif self.solver.successful():
+            self.solver.integrate(self.solver.t + dt)
+            self.state = self.solver.y
+            self.t = self.solver.t
+        # trapezoidal estimate of the work done by the dampers over the step
+        self.dissipated += 0.5 * dt * (power + self.damping_power())
+
+    def damping_power(self):
+        c1, c2 = self.params[4], self.params[5]
+        vx1, vy1, vx2, vy2 = self.state[4:8]
+        return c1*(vx1**2 + vy1**2) + c2*((vx2 - vx1)**2 + (vy2 - vy1)**2)
+
+    def invariants(self):
+        # mechanical energy plus what the dampers took out
+        m1, m2, k1, k2, c1, c2, L1, L2 = self.params
+        s = self.state
+        e, scale = invariants.springs([s[0], s[1], s[2], s[3]], [s[4], s[5], s[6], s[7]],
+                                      [m1, m2], [k1, k2], [L1, L2], GRAVITY)
+        return e + self.dissipated, scale + self.dissipated
+
+    def get_state(self):
+        return self.state
+
+def find_dt(init_state, integrator, threshold, dt=0.16, duration=20.0, min_dt=1e-4):
+    # Largest of dt, dt/2, dt/4, ... for which a trial run of duration
+    # seconds keeps the drift of the energy balance within threshold.
+    def trial(dt):
+        sim = Simulation(init_state, integrator)
+        monitor = invariants.DriftMonitor(sim.invariants, invariants.SPRINGS)
+        monitor.reset()
+        for _ in range(int(math.ceil(duration / dt))):
+            sim.update(dt)
+            monitor.check()
+        return monitor.max_drift.max()
+    return invariants.safe_dt(trial, dt, threshold, min_dt=min_dt)
@@ -0,0 +1,120 @@
+"""
+FixedStepper does not allocate per step, for the f_into of every model, and
+the symplectic methods keep the energy of an orbit bounded.
+
+    python -m pytest tests
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common import fixedstep, memcheck
+from common.loader import load_module
+
+# name -> function returning (f_into, state, params, dt) of the model
+models = {}
+# the models whose state is positions then velocities, for the symplectic methods
+symplectic = set()
+
+def model(name, positions_velocities=True):
+    def register(setup):
+        models[name] = setup
+        if positions_velocities:
+            symplectic.add(name)
+        return setup
+    return register
+
+@model('mass_spring')
+def _():
+    sim = load_module('2d_mass_spring/sim.py').Simulation('test')
+    sim.init(np.array([200, 200, 0, 0], dtype='float32'), mass=10., k=10, l=200.)
+    return sim.f_into, np.array([200., 150., 1., 2.]), (), 0.1
+
+@model('mass_spring.rk4.100')
+def _():
+    sim = load_module('2d_mass_spring/sim_rk4.py').Simulation('test')
+    sim.init(np.zeros((100, 4)) + [200, 150, 1, 2], mass=10., k=np.linspace(1, 10, 100), l=200.)
+    return sim.f_into, sim.state.copy(), (), 0.1
+
+@model('projectile')
+def _():
+    sim = load_module('lab2/projectile_sim.py').Simulation('rk4')
+    return sim.f_into, np.array([0., 0., 30., 30.]), (sim.gamma, sim.gravity), 0.01
+
+@model('double_spring')
+def _():
+    sim = load_module('lab4/double_spring.py').Simulation([10.0, 10.0, 20.0, -2.0, 0.0, 0.0, 0.0, 0.0], 'rk4')
+    return sim.f_into, sim.state.copy(), (sim.params,), 0.02
+
+@model('rigid_body', positions_velocities=False)
+def _():
+    rb = load_module('box_falling/rigid_body.py').RigidBody([0, -1, 0], [0, 0, 0.1], 'rk4')
+    return rb.f_into, rb.state.copy(), (rb.force, rb.torque, rb.IbodyInv), 0.1
+
+@model('orbits.body')
+def _():
+    nbody = load_module('lab3/nbody.py')
+    body = nbody.Body('moon', nbody.Moon_Mass, 'rk4')
+    return body.dSdt_into, np.array([nbody.Distance, 0., 0., 1000.]), (np.array([-1e20, 0.]),), 2.
+
+@model('cluster')
+def _():
+    nbody = load_module('lab3/nbody.py')
+    c = nbody.Cluster(*nbody.disk(50))
+    return c.f_into, c.state.copy(), (), 60.
+
+@pytest.mark.parametrize('name, method', [(name, method) for name in models
+                                           for method in fixedstep.METHODS + fixedstep.SYMPLECTIC
+                                           if method in fixedstep.METHODS or name in symplectic])
+def test_step_retains_nothing(name, method):
+    f_into, y, params, dt = models[name]()
+    stepper = fixedstep.FixedStepper(f_into, y.shape, method, params)
+    t = [0.]
+    def step():
+        stepper.step(t[0], y, dt)
+        t[0] += dt
+    retained, peak = memcheck.allocations_per_call(step, calls=1000)
+    # a single object kept per step would be 16 bytes or more, what is
+    # left is tracemalloc's own bookkeeping
+    assert retained < 1, f"{name} keeps {retained:.1f} bytes per {method} step"
+    assert np.all(np.isfinite(y))
+
+def kepler_f_into(t, y, out):
+    # a body around a unit mass at the origin, G = 1
+    x, yy = y[0], y[1]
+    r3 = (x*x + yy*yy)**1.5
+    out[0] = y[2]
+    out[1] = y[3]
+    out[2] = -x / r3
+    out[3] = -yy / r3
+    return out
+
+def kepler_energy(y):
+    return 0.5*(y[2]**2 + y[3]**2) - 1/np.hypot(y[0], y[1])
+
+@pytest.mark.parametrize('method', fixedstep.SYMPLECTIC + ('rk4',))
+def test_orbit_energy(method):
+    # 200 periods of an orbit of eccentricity 0.5 (period 2 pi), 200 steps
+    # per period.  The energy error of the symplectic methods oscillates
+    # over an orbit but does not grow, that of rk4 keeps growing.
+    y = np.array([0.5, 0., 0., np.sqrt(3.)])
+    e0 = kepler_energy(y)
+    stepper = fixedstep.FixedStepper(kepler_f_into, 4, method)
+    dt = 2*np.pi / 200
+    error = []
+    for period in range(200):
+        worst = 0.
+        for i in range(200):
+            stepper.step(0., y, dt)
+            worst = max(worst, abs(kepler_energy(y) - e0))
+        error.append(worst)
+    first, last = max(error[:10]), max(error[-10:])
+    if method in fixedstep.SYMPLECTIC:
+        assert last < 1.5 * first
+        assert last < 0.1 * abs(e0)     # first order, symplectic euler is at 5%
+    else:
+        assert last > 10 * first
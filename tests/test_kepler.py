@@ -0,0 +1,60 @@
+"""
+The universal-variable Kepler solver against a numerical reference.
+
+    python -m pytest tests
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+from scipy.integrate import solve_ivp
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.loader import load_module
+
+kepler = load_module('lab3/kepler.py')
+
+MU = 3.986e14       # the earth
+
+def reference(r0, v0, dt):
+    # dop853 at the tightest tolerances it takes
+    def f(t, y):
+        return np.concatenate([y[2:], -MU * y[:2] / np.linalg.norm(y[:2])**3])
+    sol = solve_ivp(f, (0, dt), np.concatenate([r0, v0]), method='DOP853', rtol=1e-13, atol=1e-9)
+    return sol.y[:2, -1], sol.y[2:, -1]
+
+# hyperbolae a day and ten days on, and an ellipse for comparison
+@pytest.mark.parametrize('v0, dt', [
+    ([300., 15000.], 86400.),
+    ([300., 13000.], 86400.),
+    ([300., 13000.], 864000.),
+    ([300., 13000.], -86400.),
+    ([300., 9000.], 86400.),
+])
+def test_propagate_matches_reference(v0, dt):
+    r0 = np.array([7e6, 0.])
+    v0 = np.array(v0)
+    r_ref, v_ref = reference(r0, v0, dt)
+    r, v = kepler.propagate(r0, v0, MU, dt)
+    assert np.linalg.norm(r - r_ref) < 1e-9 * np.linalg.norm(r_ref)
+    assert np.linalg.norm(v - v_ref) < 1e-9 * np.linalg.norm(v_ref)
+    assert np.allclose(kepler.propagate1(*r0, *v0, MU, dt), np.concatenate([r, v]), rtol=1e-12)
+
+def test_open_orbits_converge():
+    # hyperbolae, near parabolae and ellipses over up to 30 years
+    rng = np.random.default_rng(0)
+    r0 = rng.normal(size=(2000, 2)) * 7e6
+    v0 = rng.normal(size=(2000, 2)) * 12000
+    dt = 10**rng.uniform(0, 9, 2000) * rng.choice([-1, 1], 2000)
+    r, v = kepler.propagate(r0, v0, MU, dt)
+    e0 = (v0**2).sum(axis=-1)/2 - MU/np.linalg.norm(r0, axis=-1)
+    e1 = (v**2).sum(axis=-1)/2 - MU/np.linalg.norm(r, axis=-1)
+    assert np.all(np.abs(e1 - e0) < 1e-8 * np.abs(e0))
+
+def test_no_convergence_raises():
+    with pytest.raises(RuntimeError):
+        kepler.propagate([7e6, 0.], [300., 13000.], MU, 86400., max_iter=1)
+    with pytest.raises(RuntimeError):
+        kepler.propagate1(7e6, 0., 300., 13000., MU, 86400., max_iter=1)